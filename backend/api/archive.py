@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+
+from .audit import audit_batch, record
+from .models import Approval, ArchivedApproval, ArchivedPurchaseRequest, PurchaseRequest
+
+# Pending requests are still being worked on and never leave the hot table
+ARCHIVABLE_STATUSES = ['approved', 'rejected']
+
+def _copy(source, target_model):
+    """Build a target_model instance from the matching columns of source"""
+    values = {}
+    for field in target_model._meta.concrete_fields:
+        if not hasattr(source, field.attname):
+            continue
+        value = getattr(source, field.attname)
+        values[field.attname] = value.name if isinstance(value, FieldFile) else value
+    return target_model(**values)
+
+def archivable_requests(cutoff):
+    return PurchaseRequest.objects.filter(created_at__lt=cutoff, status__in=ARCHIVABLE_STATUSES)
+
+def archive_batch(cutoff, batch_size):
+    """
+    Move up to batch_size finished requests created before cutoff, with their
+    approvals, into the archive tables in one transaction
+    Line items, search vectors and duplicate fingerprints of the moved requests are
+    dropped with them; spend rollups are kept
+    Returns: number of requests archived
+    """
+    # The batch's audit events are inserted together, in the same transaction as the move
+    with transaction.atomic(), audit_batch():
+        batch = list(
+            archivable_requests(cutoff)
+            .order_by('created_at', 'id')
+            # Rows a request is busy with are left for the next run
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        ids = [purchase_request.id for purchase_request in batch]
+        ArchivedPurchaseRequest.objects.bulk_create([
+            _copy(purchase_request, ArchivedPurchaseRequest) for purchase_request in batch
+        ])
+        ArchivedApproval.objects.bulk_create([
+            _copy(approval, ArchivedApproval) for approval in Approval.objects.filter(request_id__in=ids)
+        ])
+        PurchaseRequest.objects.filter(id__in=ids).delete()
+        for purchase_request in batch:
+            record('archived', purchase_request.id, changes={'status': purchase_request.status})
+
+    return len(batch)
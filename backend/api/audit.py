@@ -0,0 +1,99 @@
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+class _Batch:
+    def __init__(self):
+        self.events = []
+        # Opened inside a transaction: flushed before that transaction commits
+        self.in_transaction = connection.in_atomic_block
+
+# The innermost audit_batch(), or None outside one
+_batch = ContextVar('audit_batch', default=None)
+
+def _actor_id(actor):
+    if actor is None or not getattr(actor, 'is_authenticated', False):
+        return None
+    return actor.pk
+
+def record(action, request_id, actor=None, changes=None):
+    """
+    Record an audit event for a purchase request
+    An event recorded inside a transaction is inserted in that transaction, so it
+    commits or rolls back together with the change it describes. Inside audit_batch()
+    (every API request, see AuditMiddleware) events are instead written together by
+    one bulk_create when the batch ends, if that still happens in the same transaction.
+    """
+    event = AuditEvent(
+        request_id=request_id,
+        actor_id=_actor_id(actor),
+        action=action,
+        changes=changes or {},
+        created_at=timezone.now()
+    )
+
+    batch = _batch.get()
+    if batch is not None and (batch.in_transaction or not connection.in_atomic_block):
+        batch.events.append(event)
+    else:
+        event.save()
+
+def _payload(event):
+    return {
+        'request_id': event.request_id,
+        'actor_id': event.actor_id,
+        'action': event.action,
+        'changes': event.changes,
+        'created_at': event.created_at.isoformat(),
+    }
+
+@contextmanager
+def audit_batch():
+    """
+    Collect the events recorded in this block and insert them in one statement at the end
+    Opened inside a transaction (archive_batch), a failed insert raises so the whole
+    transaction rolls back. Opened outside one (AuditMiddleware), the changes have
+    already committed, so a failure is logged with the events for replay instead
+    """
+    batch = _Batch()
+    token = _batch.set(batch)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        if not batch.in_transaction:
+            _write_committed(batch.events)
+
+    if batch.in_transaction and batch.events:
+        AuditEvent.objects.bulk_create(batch.events)
+
+def _write_committed(events):
+    """Insert events for changes that have already committed; log them if that fails"""
+    if not events:
+        return
+    try:
+        AuditEvent.objects.bulk_create(events)
+    except Exception:
+        logger.exception(
+            'Error writing audit events: %s',
+            json.dumps([_payload(event) for event in events], default=str)
+        )
+
+def field_changes(before, after):
+    """
+    Diff two {field: value} snapshots
+    Returns: {field: [old, new]} for the fields that changed
+    """
+    return {
+        field: [before.get(field), value]
+        for field, value in after.items()
+        if before.get(field) != value
+    }
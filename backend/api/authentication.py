@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from rest_framework import authentication, exceptions
+
+FILE_TOKEN_SALT = 'api.media.file-token'
+PREVIEW_TOKEN_SALT = 'api.previews.token'
+
+def make_file_token(user, purchase_request_id, field):
+    """Sign a short-lived token granting user access to one file of one request"""
+    signer = signing.TimestampSigner(salt=FILE_TOKEN_SALT)
+    return signer.sign_object({'u': user.pk, 'r': purchase_request_id, 'f': field})
+
+class SignedFileTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticate file downloads from a ?token= signed by make_file_token
+    Lets plain <a href> links carry auth; the token only works for the file it was issued for
+    """
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+
+        try:
+            payload = signing.TimestampSigner(salt=FILE_TOKEN_SALT).unsign_object(
+                token, max_age=settings.MEDIA_TOKEN_MAX_AGE
+            )
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed('Invalid or expired file token')
+
+        kwargs = request.parser_context.get('kwargs', {}) if request.parser_context else {}
+        if str(payload.get('r')) != str(kwargs.get('pk')) or payload.get('f') != kwargs.get('field'):
+            raise exceptions.AuthenticationFailed('File token does not match this file')
+
+        user = get_user_model().objects.filter(pk=payload.get('u'), is_active=True).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed('User not found')
+
+        return (user, payload)
+
+def make_preview_token(user, purchase_request_id, field, digest):
+    """Sign a short-lived token granting user the previews of one document of one request"""
+    signer = signing.TimestampSigner(salt=PREVIEW_TOKEN_SALT)
+    return signer.sign_object({'u': user.pk, 'r': purchase_request_id, 'f': field, 'd': digest})
+
+class PreviewTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticate preview images from a ?token= signed by make_preview_token
+    The token only works for the content hash it was issued for; the view still
+    checks that the request holds that document and that the user may view it
+    """
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+
+        try:
+            payload = signing.TimestampSigner(salt=PREVIEW_TOKEN_SALT).unsign_object(
+                token, max_age=settings.MEDIA_TOKEN_MAX_AGE
+            )
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed('Invalid or expired preview token')
+
+        kwargs = request.parser_context.get('kwargs', {}) if request.parser_context else {}
+        if payload.get('d') != kwargs.get('digest'):
+            raise exceptions.AuthenticationFailed('Preview token does not match this document')
+
+        user = get_user_model().objects.filter(pk=payload.get('u'), is_active=True).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed('User not found')
+
+        return (user, payload)
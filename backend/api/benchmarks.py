@@ -0,0 +1,354 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from rest_framework.test import APIClient
+
+from services.document_processor import simple_text_extraction
+from services.po_generator import generate_purchase_order
+from services.receipt_validator import extract_amount_from_receipt, validate_receipt
+
+from .load_data import seed_requests
+from .models import Approval, PurchaseRequest
+
+User = get_user_model()
+
+# name -> (function, takes_size); registered with @benchmark
+BENCHMARKS = {}
+
+SAMPLE_PROFORMA_TEXT = '\n'.join(
+    ['Acme Office Supplies Ltd', 'Proforma Invoice #4821', 'Date: 2024-03-01']
+    + [f'Item number {index} widget pack {index * 3 + 5}.50' for index in range(1, 40)]
+    + ['Subtotal 1234.50', 'Tax 185.18', 'Grand Total 1419.68']
+)
+
+# Libraries only document work should load; API workers that import them at boot pay for it
+DOCUMENT_LIBRARIES = ('pdfplumber', 'pdfminer', 'pytesseract', 'PIL.Image', 'reportlab', 'pypdfium2')
+
+# Boots Django like a web worker (settings, apps, URLconf and with it the views) in a
+# fresh interpreter and prints what that cost
+STARTUP_SCRIPT = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.conf import settings
+__import__(settings.ROOT_URLCONF)
+elapsed = time.perf_counter() - started
+try:
+    # Current RSS; ru_maxrss on Linux can carry the parent's peak over fork/exec
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform == 'darwin' else 1)
+print(json.dumps({
+    'boot_ms': round(elapsed * 1000, 1),
+    'rss_mb': round(rss_kb / 1024, 1),
+    'document_libraries': [name for name in %r if name in sys.modules],
+}))
+''' % (DOCUMENT_LIBRARIES,)
+
+def benchmark(name, sized=False):
+    """
+    Register a benchmark case
+    The function receives the dataset size (when sized) and returns run, or
+    (run, setup): setup() is called untimed before each run(setup_result)
+    """
+    def decorator(func):
+        BENCHMARKS[name] = (func, sized)
+        return func
+    return decorator
+
+def benchmark_users():
+    """One user per role, created on first use"""
+    users = {}
+    for role in ['staff', 'approver_level_1', 'approver_level_2', 'finance']:
+        users[role], _ = User.objects.get_or_create(
+            username=f'bench_{role}',
+            defaults={'role': role, 'email': f'bench_{role}@example.com'}
+        )
+    return users
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+def checked(response):
+    """Fail the run instead of timing an error response"""
+    if response.status_code >= 400:
+        raise RuntimeError(f'Benchmark request failed with {response.status_code}: {response.content[:200]!r}')
+    return response
+
+def seed_dataset(count, seed=0):
+    """Replace all purchase requests with count deterministic rows"""
+    users = benchmark_users()
+    PurchaseRequest.objects.all().delete()
+    seed_requests(count, {role: [user.id] for role, user in users.items()}, seed=seed, batch_size=1000)
+    return users
+
+@contextmanager
+def mocked_openai():
+    """Take the OpenAI code paths without network access"""
+    with mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'benchmark'}), \
+            mock.patch('services.document_processor.extract_with_openai', side_effect=simple_text_extraction), \
+            mock.patch('services.receipt_validator.validate_with_openai', return_value={'is_valid': True, 'errors': []}):
+        yield
+
+@contextmanager
+def benchmark_environment():
+    """
+    Run against a throwaway test database and media directory, with OpenAI mocked
+    and background preview rendering disabled so it doesn't skew timings
+    """
+    from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+    media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(MEDIA_ROOT=media_root, PERF_TRACE_SAMPLE_RATE=0.0), \
+                mock.patch('api.views.schedule_previews'), \
+                mocked_openai():
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'database': connection.vendor,
+    }
+
+def measure(run, setup=None, repeat=10, warmup=2):
+    """
+    Time repeat calls of run (after warmup untimed calls)
+    Returns: dict with timings in milliseconds
+    """
+    samples = []
+    for iteration in range(warmup + repeat):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        if setup:
+            run(argument)
+        else:
+            run()
+        elapsed = (time.perf_counter() - started) * 1000
+        if iteration >= warmup:
+            samples.append(elapsed)
+
+    samples.sort()
+    return {
+        'repeat': repeat,
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+def run_benchmarks(sizes, repeat=10, warmup=2, only=None, log=print):
+    """
+    Run every registered case (sized cases once per dataset size) in a throwaway environment
+    Returns: dict with environment info and results keyed by case name
+    """
+    results = {}
+    with benchmark_environment():
+        for name, (func, sized) in BENCHMARKS.items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            for size in (sizes if sized else [None]):
+                key = f'{name}[{size}]' if sized else name
+                case = func(size) if sized else func()
+                if case is None:
+                    log(f'{key}: skipped')
+                    continue
+                run, setup = case if isinstance(case, tuple) else (case, None)
+                results[key] = measure(run, setup, repeat=repeat, warmup=warmup)
+                log(f'{key}: median {results[key]["median_ms"]} ms, p95 {results[key]["p95_ms"]} ms')
+        environment = environment_info()
+    return {'environment': environment, 'results': results}
+
+def boot_worker(importtime=False):
+    """
+    Run STARTUP_SCRIPT in a new interpreter
+    Returns: (report dict, stderr), stderr holding the -X importtime table when requested
+    """
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP_SCRIPT]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy())
+    if result.returncode != 0:
+        raise RuntimeError(f'Worker boot failed: {result.stderr[-500:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def startup_report(top=10):
+    """
+    Boot cost of one web worker: wall time and RSS after django.setup() and the
+    URLconf import, which document libraries were loaded, and the project modules
+    with the highest cumulative import time
+    Returns: dict
+    """
+    report, importtime = boot_worker(importtime=True)
+
+    imports = []
+    for line in importtime.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        module = module.strip()
+        if cumulative.strip().isdigit() and module.split('.')[0] in ('api', 'services', 'config'):
+            imports.append((module, int(cumulative) / 1000))
+
+    imports.sort(key=lambda item: -item[1])
+    report['slowest_imports_ms'] = {module: round(ms, 1) for module, ms in imports[:top]}
+    return report
+
+def find_regressions(results, baseline, threshold):
+    """
+    Compare medians against a baseline run
+    Returns: list of (case, baseline_ms, current_ms) slower by more than threshold (0.25 = 25%)
+    """
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous and current['median_ms'] > previous['median_ms'] * (1 + threshold):
+            regressions.append((name, previous['median_ms'], current['median_ms']))
+    return regressions
+
+# Cases
+
+@benchmark('startup.worker_boot')
+def bench_worker_boot():
+    """Interpreter start plus django.setup() and URLconf import, as each gunicorn worker does"""
+    return lambda: boot_worker()
+
+@benchmark('requests.list', sized=True)
+def bench_request_list(size):
+    users = seed_dataset(size)
+    client = client_for(users['approver_level_1'])
+    return lambda: checked(client.get('/api/requests/'))
+
+@benchmark('requests.list_filtered', sized=True)
+def bench_request_list_filtered(size):
+    users = seed_dataset(size)
+    client = client_for(users['finance'])
+    return lambda: checked(client.get('/api/requests/', {'status': 'approved'}))
+
+@benchmark('requests.retrieve', sized=True)
+def bench_request_retrieve(size):
+    users = seed_dataset(size)
+    client = client_for(users['approver_level_1'])
+    request_id = PurchaseRequest.objects.filter(status='approved').values_list('id', flat=True).first()
+    return lambda: checked(client.get(f'/api/requests/{request_id}/'))
+
+@benchmark('approval.final_approve')
+def bench_final_approval():
+    """Level 2 approval of a request already approved at level 1, including PO generation"""
+    users = benchmark_users()
+    client = client_for(users['approver_level_2'])
+
+    def setup():
+        purchase_request = PurchaseRequest.objects.create(
+            title='Approval benchmark', description='Benchmark', amount=Decimal('1250.00'),
+            created_by=users['staff'], vendor_name='Acme Office Supplies Ltd',
+            extracted_items=[{'name': 'Chair', 'quantity': 4, 'price': 312.5}]
+        )
+        Approval.objects.create(request=purchase_request, approver=users['approver_level_1'], action='approved', level=1)
+        return purchase_request.id
+
+    return (lambda request_id: checked(client.patch(f'/api/requests/{request_id}/approve/', {'comments': 'ok'}, format='json'))), setup
+
+def _select_one():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+@benchmark('db.query_new_connection')
+def bench_query_new_connection():
+    """Request-path cost with CONN_MAX_AGE=0: connect, query, disconnect"""
+    # Django never really closes an in-memory SQLite database, so there is nothing to measure
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return None
+
+    def run():
+        _select_one()
+        connection.close()
+    return run
+
+@benchmark('db.query_persistent_connection')
+def bench_query_persistent_connection():
+    """Request-path cost with persistent connections: health/age check, then query"""
+    def run():
+        close_old_connections()
+        _select_one()
+    return run
+
+@benchmark('po.generate')
+def bench_generate_purchase_order():
+    users = benchmark_users()
+    purchase_request = PurchaseRequest.objects.create(
+        title='PO benchmark', description='Benchmark', amount=Decimal('1419.68'),
+        created_by=users['staff'], vendor_name='Acme Office Supplies Ltd',
+        extracted_items=[{'name': f'Item {index}', 'quantity': index, 'price': 10.5} for index in range(1, 21)]
+    )
+    return lambda: generate_purchase_order(purchase_request)
+
+@benchmark('text.simple_extraction')
+def bench_simple_text_extraction():
+    return lambda: simple_text_extraction(SAMPLE_PROFORMA_TEXT)
+
+@benchmark('receipt.extract_amount')
+def bench_extract_amount():
+    return lambda: extract_amount_from_receipt(SAMPLE_PROFORMA_TEXT)
+
+def _receipt_fixture(purchase_request, extension):
+    """Write a receipt for purchase_request to a temp file (PDF via the PO renderer, or a PNG)"""
+    # MEDIA_ROOT is the benchmark's scratch directory, removed afterwards
+    handle, path = tempfile.mkstemp(suffix=extension, prefix='receipt-', dir=settings.MEDIA_ROOT)
+    with os.fdopen(handle, 'wb') as output:
+        if extension == '.pdf':
+            output.write(generate_purchase_order(purchase_request).read())
+        else:
+            from PIL import Image, ImageDraw
+            image = Image.new('RGB', (1200, 800), 'white')
+            draw = ImageDraw.Draw(image)
+            for line, text in enumerate(SAMPLE_PROFORMA_TEXT.split('\n')[:25]):
+                draw.text((40, 30 + line * 28), text, fill='black')
+            image.save(output, 'PNG')
+    return path
+
+def _bench_validate_receipt(extension):
+    users = benchmark_users()
+    purchase_request = PurchaseRequest.objects.create(
+        title='Receipt benchmark', description='Benchmark', amount=Decimal('1419.68'),
+        status='approved', created_by=users['staff'], vendor_name='Acme Office Supplies Ltd',
+        extracted_items=[{'name': 'Widget pack', 'quantity': 1, 'price': 1419.68}]
+    )
+    path = _receipt_fixture(purchase_request, extension)
+    return lambda: validate_receipt(path, purchase_request)
+
+@benchmark('receipt.validate_pdf')
+def bench_validate_receipt_pdf():
+    return _bench_validate_receipt('.pdf')
+
+@benchmark('receipt.validate_image')
+def bench_validate_receipt_image():
+    # OCR needs the tesseract binary
+    if not shutil.which('tesseract'):
+        return None
+    return _bench_validate_receipt('.png')
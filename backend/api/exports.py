@@ -0,0 +1,119 @@
+import csv
+import tempfile
+from itertools import islice
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (column header, values() lookup) pairs read straight from the requests table
+REQUEST_COLUMNS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('amount', 'amount'),
+    ('status', 'status'),
+    ('created_by', 'created_by__username'),
+    ('vendor_name', 'vendor_name'),
+    ('vendor', 'vendor__name'),
+    ('receipt_validated', 'receipt_validated'),
+    ('created_at', 'created_at'),
+    ('approved_at', 'approved_at'),
+    ('rejected_at', 'rejected_at'),
+]
+
+APPROVAL_LEVELS = [1, 2]
+APPROVAL_COLUMNS = ['approver', 'action', 'comments', 'created_at']
+
+def export_headers():
+    headers = [header for header, _ in REQUEST_COLUMNS]
+    for level in APPROVAL_LEVELS:
+        headers.extend(f'level_{level}_{column}' for column in APPROVAL_COLUMNS)
+    return headers
+
+# Leading characters a spreadsheet reads as the start of a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _format(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Quote user text so Excel/Sheets show it instead of evaluating it
+        return f"'{value}"
+    return value
+
+def _approvals_by_request(approval_model, request_ids, using='default'):
+    """Fetch the approvals of one chunk of requests, keyed by (request_id, level)"""
+    approvals = (
+        approval_model.objects
+        .using(using)
+        .filter(request_id__in=request_ids)
+        .values('request_id', 'level', 'action', 'comments', 'created_at', 'approver__username')
+    )
+    return {
+        (approval['request_id'], approval['level']): approval
+        for approval in approvals
+    }
+
+def iter_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield flat export rows (lists) for a PurchaseRequest or ArchivedPurchaseRequest queryset
+    Reads plain values in chunks so memory stays constant regardless of row count
+    """
+    approval_model = queryset.model._meta.get_field('approvals').related_model
+    rows = queryset.values(*[lookup for _, lookup in REQUEST_COLUMNS]).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        approvals = _approvals_by_request(approval_model, [row['id'] for row in chunk], using=queryset.db)
+
+        for row in chunk:
+            values = [_format(row[lookup]) for _, lookup in REQUEST_COLUMNS]
+            for level in APPROVAL_LEVELS:
+                approval = approvals.get((row['id'], level))
+                if approval:
+                    values.extend([
+                        _format(approval['approver__username']),
+                        _format(approval['action']),
+                        _format(approval['comments']),
+                        _format(approval['created_at']),
+                    ])
+                else:
+                    values.extend([''] * len(APPROVAL_COLUMNS))
+            yield values
+
+class _Echo:
+    """File-like object whose write() hands the CSV line back to the caller"""
+    def write(self, value):
+        return value
+
+def stream_csv(*querysets, chunk_size=EXPORT_CHUNK_SIZE):
+    """Generate CSV text line by line for StreamingHttpResponse, one queryset after another"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(export_headers())
+    for queryset in querysets:
+        for row in iter_export_rows(queryset, chunk_size=chunk_size):
+            yield writer.writerow(row)
+
+def write_xlsx(*querysets, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write the export to a temporary XLSX file using openpyxl's write-only mode
+    Returns: open temporary file positioned at the start
+    Raises ImportError when openpyxl is not installed
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Purchase Requests')
+    sheet.append(export_headers())
+    for queryset in querysets:
+        for row in iter_export_rows(queryset, chunk_size=chunk_size):
+            sheet.append(row)
+
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(output)
+    output.seek(0)
+    return output
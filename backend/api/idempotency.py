@@ -0,0 +1,154 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Only final outcomes are replayed. Other 2xx codes (206 from receipt submission when
+# validation itself errored) may succeed on retry, so they release the key
+REPLAYABLE_STATUSES = (status.HTTP_200_OK, status.HTTP_201_CREATED)
+
+def request_fingerprint(request):
+    """
+    Hash of what the request asks for: method, path, form/JSON fields and uploaded
+    file contents (the SHA-256 computed while the upload streamed in)
+    """
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+
+    data = request.data
+    items = data.lists() if hasattr(data, 'lists') else data.items()
+    for key, value in sorted((key, value) for key, value in items if key not in request.FILES):
+        digest.update(json.dumps([key, value], sort_keys=True, default=str).encode())
+
+    for key in sorted(request.FILES):
+        for uploaded in request.FILES.getlist(key):
+            digest.update(f'{key}:{getattr(uploaded, "sha256", None) or uploaded.size}\n'.encode())
+
+    return digest.hexdigest()
+
+def _error(message, error, status_code):
+    return Response({
+        'success': False,
+        'message': message,
+        'error': error
+    }, status=status_code)
+
+def _claim(record, fingerprint, now):
+    record.fingerprint = fingerprint
+    record.status = 'processing'
+    record.response_status = None
+    record.response_body = None
+    record.resource_id = None
+    record.locked_at = now
+    record.expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    record.save()
+
+def _begin(view, user, key, fingerprint):
+    """
+    Look up or claim the key under a row lock, so concurrent duplicates are serialised
+    Returns: (record, None) when this request should run, or (None, response) to return instead
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+            user=user,
+            key=key,
+            defaults={
+                'fingerprint': fingerprint,
+                'locked_at': now,
+                'expires_at': now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            }
+        )
+        if created:
+            return record, None
+
+        if record.expires_at <= now:
+            _claim(record, fingerprint, now)
+            return record, None
+
+        if record.fingerprint != fingerprint:
+            return None, _error(
+                'Idempotency-Key was already used for a different request',
+                'idempotency_key_reused',
+                status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        if record.status == 'complete':
+            body = record.response_body
+            if record.resource_id is not None and hasattr(view, 'replay_idempotent'):
+                body = view.replay_idempotent(body, record.resource_id)
+            response = Response(body, status=record.response_status)
+            response['Idempotent-Replayed'] = 'true'
+            return None, response
+
+        if record.locked_at > now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            return None, _error(
+                'A request with this Idempotency-Key is still being processed',
+                'idempotency_key_in_progress',
+                status.HTTP_409_CONFLICT
+            )
+
+        # The first attempt died mid-way (worker killed); let this one take over
+        _claim(record, fingerprint, now)
+        return record, None
+
+def _release(record):
+    """Forget a claimed key so the client can retry; only if nobody re-claimed it since"""
+    IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at, status='processing').delete()
+
+def idempotent(view_method):
+    """
+    Honour an Idempotency-Key header on a view method
+    The first successful (200/201) response is stored and replayed for retries with the
+    same key and request, without running the view again; anything else releases the key
+    A view that sets self.idempotent_resource_id has replays passed through its
+    replay_idempotent(body, resource_id), so time-limited parts (signed file links)
+    are rebuilt from the current object instead of repeated verbatim
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return _error(
+                f'Idempotency-Key cannot be longer than {MAX_KEY_LENGTH} characters',
+                'invalid_idempotency_key',
+                status.HTTP_400_BAD_REQUEST
+            )
+
+        record, response = _begin(self, request.user, key, request_fingerprint(request))
+        if response is not None:
+            return response
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            _release(record)
+            raise
+
+        if response.status_code not in REPLAYABLE_STATUSES or not hasattr(response, 'data'):
+            _release(record)
+            return response
+
+        IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at).update(
+            status='complete',
+            response_status=response.status_code,
+            # Round-trip through the renderer so Decimals/datetimes are stored as the client saw them
+            response_body=json.loads(JSONRenderer().render(response.data)) if response.data is not None else None,
+            resource_id=getattr(self, 'idempotent_resource_id', None),
+        )
+        return response
+    return wrapper
@@ -0,0 +1,330 @@
+import csv
+import io
+import json
+import os
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models import Max
+
+from services.line_items import parse_line_items
+from services.search import update_search_vector
+from services.vendors import resolve_vendor
+
+from .models import Approval, LineItem, PurchaseRequest
+
+User = get_user_model()
+
+# Share of generated users per role
+ROLE_WEIGHTS = {
+    'staff': 0.7,
+    'approver_level_1': 0.1,
+    'approver_level_2': 0.1,
+    'finance': 0.1,
+}
+
+# Share of generated requests per final status
+STATUS_WEIGHTS = {
+    'pending': 0.35,
+    'approved': 0.5,
+    'rejected': 0.15,
+}
+
+VENDORS = [
+    'Acme Office Supplies Ltd', 'Kigali Tech Distributors', 'Global Stationery Co',
+    'Summit Furniture Inc', 'BlueLine Logistics', 'Prime IT Solutions', 'GreenLeaf Catering',
+    'Metro Cleaning Services', 'Apex Electrical Works', 'Nile Printing House',
+]
+
+CATALOG = [
+    ('Laptop', 650, 1800), ('Monitor 27 inch', 180, 450), ('Office chair', 90, 400),
+    ('Desk', 120, 600), ('Printer paper A4 (box)', 20, 45), ('Toner cartridge', 40, 160),
+    ('USB-C dock', 80, 250), ('Projector', 300, 1200), ('Whiteboard', 40, 200),
+    ('Network switch', 150, 900), ('Cleaning supplies', 15, 80), ('Catering (per head)', 8, 30),
+    ('Software license', 50, 2000), ('Keyboard and mouse set', 20, 90), ('Filing cabinet', 100, 350),
+]
+
+TITLES = [
+    'Equipment for new hires', 'Quarterly office supplies', 'Conference room upgrade',
+    'IT infrastructure refresh', 'Team offsite catering', 'Replacement hardware',
+    'Printing for annual report', 'Facility maintenance', 'Software subscriptions',
+]
+
+LOAD_USER_PREFIX = 'load_'
+
+# Generated dates count back from a fixed point rather than the current time, so a
+# seed produces the same rows whenever it is run
+LOAD_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+def seed_end_date(seed):
+    """Latest creation time generated for seed: LOAD_EPOCH shifted by up to a year"""
+    return LOAD_EPOCH + timedelta(days=seed % 365)
+
+def weighted_choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+@contextmanager
+def manual_timestamps(*model_classes):
+    """
+    Let bulk inserts keep the timestamps we generate
+    auto_now/auto_now_add would otherwise stamp every row with the current time
+    """
+    changed = []
+    for model in model_classes:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+def create_users(count, rng, password='password123', batch_size=1000):
+    """
+    Create count users across roles per ROLE_WEIGHTS (at least one per role)
+    The password is hashed once and shared; hashing per user would dominate the run
+    Returns: dict of role -> list of user ids
+    """
+    password_hash = make_password(password)
+    roles = list(ROLE_WEIGHTS) + [weighted_choice(rng, ROLE_WEIGHTS) for _ in range(max(count - len(ROLE_WEIGHTS), 0))]
+
+    users = [
+        User(
+            username=f'{LOAD_USER_PREFIX}{role}_{index:06d}',
+            email=f'{LOAD_USER_PREFIX}{index:06d}@example.com',
+            first_name=role.split('_')[0].title(),
+            last_name=f'{index:06d}',
+            role=role,
+            password=password_hash,
+        )
+        for index, role in enumerate(roles[:max(count, len(ROLE_WEIGHTS))])
+    ]
+    User.objects.bulk_create(users, batch_size=batch_size)
+
+    ids = {role: [] for role in ROLE_WEIGHTS}
+    for user_id, role in User.objects.filter(username__startswith=LOAD_USER_PREFIX).values_list('id', 'role'):
+        ids[role].append(user_id)
+    for role_ids in ids.values():
+        role_ids.sort()
+    return ids
+
+def seed_vendors():
+    """
+    Vendor rows (with aliases) for the generated vendor names, created through the
+    same resolution as extraction so seeded requests group like real ones
+    Returns: dict of vendor name -> vendor id
+    """
+    return {name: resolve_vendor(name).id for name in VENDORS}
+
+def build_request(rng, request_id, user_ids, now, days=365, vendor_ids=None):
+    """
+    One PurchaseRequest (with a preassigned id) plus its Approval rows
+    Approval history is consistent with the final status
+    """
+    items = []
+    for name, low, high in rng.sample(CATALOG, rng.randint(1, 6)):
+        items.append({
+            'name': name,
+            'quantity': rng.choice([1, 1, 1, 2, 3, 5, 10, 20]),
+            'price': round(rng.uniform(low, high), 2),
+        })
+    amount = sum(Decimal(str(item['price'])) * item['quantity'] for item in items).quantize(Decimal('0.01'))
+
+    created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+    status = weighted_choice(rng, STATUS_WEIGHTS)
+    vendor_name = rng.choice(VENDORS)
+
+    purchase_request = PurchaseRequest(
+        id=request_id,
+        title=f'{rng.choice(TITLES)} #{request_id}',
+        description=f'Purchase of {", ".join(item["name"].lower() for item in items)} from {vendor_name}',
+        amount=amount,
+        status=status,
+        created_by_id=rng.choice(user_ids['staff']),
+        vendor_name=vendor_name,
+        vendor_id=(vendor_ids or {}).get(vendor_name),
+        extracted_items=items,
+        created_at=created_at,
+        updated_at=created_at,
+    )
+
+    approvals = []
+    decided_at = created_at
+    def approval(level, action):
+        nonlocal decided_at
+        decided_at = decided_at + timedelta(minutes=rng.randint(10, 4 * 24 * 60))
+        approvals.append(Approval(
+            request_id=request_id,
+            approver_id=rng.choice(user_ids[f'approver_level_{level}']),
+            action=action,
+            level=level,
+            comments='' if action == 'approved' else 'Over budget for this quarter',
+            created_at=decided_at,
+        ))
+
+    if status == 'approved':
+        approval(1, 'approved')
+        approval(2, 'approved')
+        purchase_request.approved_at = decided_at
+    elif status == 'rejected':
+        if rng.random() < 0.5:
+            approval(1, 'rejected')
+        else:
+            approval(1, 'approved')
+            approval(2, 'rejected')
+        purchase_request.rejected_at = decided_at
+    elif rng.random() < 0.4:
+        # Pending with the first level already through
+        approval(1, 'approved')
+
+    purchase_request.updated_at = decided_at
+    return purchase_request, approvals
+
+def _copy_value(field, obj):
+    value = field.value_from_object(obj)
+    if value is None:
+        return r'\N'
+    if isinstance(field, models.JSONField):
+        return json.dumps(value)
+    if isinstance(field, models.FileField):
+        return value.name or ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def copy_objects(model, objects):
+    """Insert objects with PostgreSQL COPY (much faster than INSERT for large batches)"""
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        writer.writerow([_copy_value(field, obj) for field in fields])
+    buffer.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+
+def insert_objects(model, objects, use_copy, batch_size):
+    if not objects:
+        return
+    if use_copy:
+        copy_objects(model, objects)
+    else:
+        model.objects.bulk_create(objects, batch_size=batch_size)
+
+def seed_requests(count, user_ids, seed=0, batch_size=5000, use_copy=False, line_items=False, progress=None, end=None):
+    """
+    Insert count purchase requests with approvals (and optionally LineItem rows) in batches
+    Requests are linked to seeded vendors and get their search vector, as the API would
+    give them. Ids are assigned up front, so approvals never need a round trip for the
+    request id, and the same seed always produces the same rows
+    end: latest creation time (default: seed_end_date(seed))
+    Returns: number of requests created
+    """
+    if use_copy and connection.vendor != 'postgresql':
+        raise ValueError('COPY is only available on PostgreSQL')
+
+    rng = random.Random(seed)
+    now = end or seed_end_date(seed)
+    vendor_ids = seed_vendors()
+    next_id = (PurchaseRequest.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+    created = 0
+
+    with manual_timestamps(PurchaseRequest, Approval):
+        while created < count:
+            requests, approvals, items = [], [], []
+            for _ in range(min(batch_size, count - created)):
+                purchase_request, request_approvals = build_request(rng, next_id, user_ids, now, vendor_ids=vendor_ids)
+                requests.append(purchase_request)
+                approvals.extend(request_approvals)
+                if line_items:
+                    items.extend(
+                        LineItem(request_id=next_id, **row)
+                        for row in parse_line_items(purchase_request.extracted_items)
+                    )
+                next_id += 1
+
+            with transaction.atomic():
+                insert_objects(PurchaseRequest, requests, use_copy, batch_size)
+                insert_objects(Approval, approvals, use_copy, batch_size)
+                insert_objects(LineItem, items, use_copy, batch_size)
+                # One UPDATE per batch; a no-op where full-text search is unavailable
+                update_search_vector([purchase_request.id for purchase_request in requests])
+
+            created += len(requests)
+            if progress:
+                progress(created)
+
+    reset_sequences(PurchaseRequest, Approval, LineItem)
+    return created
+
+def reset_sequences(*model_classes):
+    """Move id sequences past explicitly assigned ids (no-op where the backend needs none)"""
+    statements = connection.ops.sequence_reset_sql(no_style(), list(model_classes))
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+def delete_load_data():
+    """Remove users created by create_users, and (by cascade) their requests and approvals"""
+    return User.objects.filter(username__startswith=LOAD_USER_PREFIX).delete()
+
+def write_fixture_documents(directory, count, seed=0):
+    """
+    Write count proforma-style PDFs and count PNG scans into directory for the
+    document pipeline (extraction, OCR, previews)
+    Returns: list of written paths
+    """
+    from PIL import Image, ImageDraw
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+
+    for index in range(count):
+        vendor = rng.choice(VENDORS)
+        lines = [vendor, f'Proforma Invoice #{10000 + index}', '']
+        total = Decimal('0')
+        for name, low, high in rng.sample(CATALOG, rng.randint(2, 8)):
+            quantity = rng.randint(1, 10)
+            price = Decimal(str(round(rng.uniform(low, high), 2)))
+            total += price * quantity
+            lines.append(f'{name}  x{quantity}  {price}')
+        lines.extend(['', f'Total {total.quantize(Decimal("0.01"))}'])
+
+        pdf_path = os.path.join(directory, f'proforma-{index:05d}.pdf')
+        pdf = canvas.Canvas(pdf_path, pagesize=A4)
+        y = 800
+        for line in lines:
+            pdf.drawString(60, y, line)
+            y -= 18
+        pdf.save()
+        paths.append(pdf_path)
+
+        image_path = os.path.join(directory, f'receipt-{index:05d}.png')
+        image = Image.new('RGB', (1000, 60 + 32 * len(lines)), 'white')
+        draw = ImageDraw.Draw(image)
+        for number, line in enumerate(lines):
+            draw.text((40, 30 + number * 32), line, fill='black')
+        image.save(image_path, 'PNG')
+        paths.append(image_path)
+
+    return paths
@@ -0,0 +1,193 @@
+import asyncio
+import random
+import re
+import time
+from collections import defaultdict
+
+import httpx
+
+ROLES = ['staff', 'approver_level_1', 'approver_level_2', 'finance']
+
+# Ids in URLs are replaced so stats group by endpoint, not by request
+_ID_RE = re.compile(r'/\d+/')
+
+def endpoint_name(method, path):
+    return f'{method} {_ID_RE.sub("/{id}/", path.split("?")[0])}'
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+class Stats:
+    """Latency samples and status codes per endpoint"""
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, seconds, status):
+        self.latencies[name].append(seconds)
+        self.statuses[name][status] += 1
+
+    def report(self, duration):
+        """
+        Summarise the run
+        Returns: list of dicts (one per endpoint, then a TOTAL row) with count, errors,
+        throughput (req/s) and p50/p95/p99 latency in milliseconds
+        """
+        rows = []
+        everything = []
+        for name in sorted(self.latencies):
+            samples = sorted(self.latencies[name])
+            everything.extend(samples)
+            rows.append(self._row(name, samples, self.statuses[name], duration))
+
+        totals = defaultdict(int)
+        for statuses in self.statuses.values():
+            for code, count in statuses.items():
+                totals[code] += count
+        rows.append(self._row('TOTAL', sorted(everything), totals, duration))
+        return rows
+
+    @staticmethod
+    def _row(name, samples, statuses, duration):
+        return {
+            'endpoint': name,
+            'count': len(samples),
+            'errors': sum(count for code, count in statuses.items() if code == 'error' or code >= 400),
+            'statuses': dict(statuses),
+            'throughput': round(len(samples) / duration, 2) if duration else 0.0,
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 1),
+        }
+
+class VirtualUser:
+    """One logged-in client replaying its role's scenario until the deadline"""
+    def __init__(self, client, stats, role, username, password, documents, rng, think_time):
+        self.client = client
+        self.stats = stats
+        self.role = role
+        self.username = username
+        self.password = password
+        self.documents = documents
+        self.rng = rng
+        self.think_time = think_time
+        self.headers = {}
+
+    async def call(self, method, path, **kwargs):
+        name = endpoint_name(method, path)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(name, time.perf_counter() - started, 'error')
+            return None
+        self.stats.record(name, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def login(self):
+        response = await self.call('POST', '/api/auth/login/', json={
+            'username': self.username,
+            'password': self.password,
+        })
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f'Login failed for {self.username}')
+        self.headers = {'Authorization': f'Bearer {response.json()["access"]}'}
+
+    async def list_requests(self, **params):
+        response = await self.call('GET', '/api/requests/', params=params)
+        if response is None or response.status_code != 200:
+            return []
+        body = response.json()
+        # Paginated responses wrap the usual {'success', 'data'} body in 'results'
+        return body.get('results', body).get('data', [])
+
+    async def staff_step(self):
+        name, content, content_type = self.rng.choice(self.documents)
+        await self.call('POST', '/api/requests/', data={
+            'title': f'Load test request {self.rng.randint(1, 10 ** 6)}',
+            'description': 'Created by the load test harness',
+            'amount': f'{self.rng.uniform(50, 5000):.2f}',
+        }, files={'proforma': (name, content, content_type)})
+
+        # Receipts can only be submitted by the request's owner
+        approved = [item for item in await self.list_requests(status='approved') if not item.get('receipt')]
+        if approved:
+            target = self.rng.choice(approved)
+            name, content, content_type = self.rng.choice(self.documents)
+            await self.call(
+                'POST',
+                f'/api/requests/{target["id"]}/submit_receipt/',
+                files={'receipt': (name, content, content_type)}
+            )
+
+    async def approver_step(self, level):
+        requests = await self.list_requests(status='pending')
+        candidates = [
+            item for item in requests
+            if not any(approval['level'] == level for approval in item.get('approvals', []))
+            and (level == 1 or any(
+                approval['level'] == 1 and approval['action'] == 'approved'
+                for approval in item.get('approvals', [])
+            ))
+        ]
+        if candidates:
+            target = self.rng.choice(candidates)
+            await self.call('GET', f'/api/requests/{target["id"]}/')
+            # Other approvers race for the same requests; a 403/400 here is expected contention
+            await self.call('PATCH', f'/api/requests/{target["id"]}/approve/', json={'comments': 'Load test approval'})
+
+    async def finance_step(self):
+        requests = await self.list_requests(status='approved')
+        if requests:
+            target = self.rng.choice(requests)
+            await self.call('GET', f'/api/requests/{target["id"]}/')
+        if self.rng.random() < 0.1:
+            await self.call('GET', '/api/requests/export/', params={'status': 'approved'})
+
+    async def step(self):
+        if self.role == 'staff':
+            await self.staff_step()
+        elif self.role == 'approver_level_1':
+            await self.approver_step(1)
+        elif self.role == 'approver_level_2':
+            await self.approver_step(2)
+        elif self.role == 'finance':
+            await self.finance_step()
+
+    async def run(self, deadline):
+        await self.login()
+        while time.monotonic() < deadline:
+            await self.step()
+            remaining = deadline - time.monotonic()
+            if self.think_time and remaining > 0:
+                # Exponential think time, so users don't move in lock step
+                await asyncio.sleep(min(self.rng.expovariate(1 / self.think_time), remaining))
+
+async def run_load_test(base_url, accounts, documents, duration, think_time=1.0, seed=0, timeout=30.0):
+    """
+    Run virtual users against base_url for duration seconds
+    accounts: list of (role, username, password), one virtual user each
+    documents: list of (filename, bytes, content_type) used for proforma/receipt uploads
+    Returns: Stats.report() rows
+    """
+    stats = Stats()
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=len(accounts) * 2, max_keepalive_connections=len(accounts))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + duration
+        users = [
+            VirtualUser(client, stats, role, username, password, documents, random.Random(rng.random()), think_time)
+            for role, username, password in accounts
+        ]
+        outcomes = await asyncio.gather(*(user.run(deadline) for user in users), return_exceptions=True)
+        elapsed = time.monotonic() - started
+
+    failures = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    if failures and len(failures) == len(users):
+        raise failures[0]
+    return stats.report(elapsed)
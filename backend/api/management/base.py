@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+def _is_postgres(connection):
+    return connection.vendor == 'postgresql' and not settings.DB_PGBOUNCER
+
+def _lift_statement_timeout(sender, connection, **kwargs):
+    if _is_postgres(connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SET statement_timeout = 0')
+
+class MaintenanceCommand(BaseCommand):
+    """
+    Base for long-running maintenance commands (archiving, rollup rebuilds, bulk loads,
+    media GC, re-indexing)
+    Their PostgreSQL sessions run without the request-path DB_STATEMENT_TIMEOUT, which
+    would otherwise cancel a big batch halfway. Behind PgBouncer a session SET would
+    leak to other clients, so there the command must connect as a role without a timeout
+    """
+    def execute(self, *args, **options):
+        connection_created.connect(_lift_statement_timeout)
+        for connection in connections.all(initialized_only=True):
+            if connection.connection is not None:
+                _lift_statement_timeout(type(connection), connection)
+        try:
+            return super().execute(*args, **options)
+        finally:
+            connection_created.disconnect(_lift_statement_timeout)
+            for connection in connections.all(initialized_only=True):
+                # RESET goes back to the timeout set at connect time
+                if connection.connection is not None and _is_postgres(connection):
+                    with connection.cursor() as cursor:
+                        cursor.execute('RESET statement_timeout')
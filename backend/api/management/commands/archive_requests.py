@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from api.archive import archivable_requests, archive_batch
+from api.management.base import MaintenanceCommand
+
+class Command(MaintenanceCommand):
+    help = 'Moves approved and rejected requests older than --older-than days into the archive tables, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=365, help='Archive requests created more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Requests moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many requests would be archived')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0:
+            raise CommandError('--older-than cannot be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+
+        if options['dry_run']:
+            count = archivable_requests(cutoff).count()
+            self.stdout.write(f'{count} requests created before {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        # Short transactions keep row locks brief while the app keeps writing
+        archived = 0
+        while True:
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            archived += moved
+            self.stdout.write(f'  {archived} requests archived')
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} requests created before {cutoff:%Y-%m-%d}'))
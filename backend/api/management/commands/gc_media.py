@@ -0,0 +1,132 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import models
+from django.utils import timezone
+
+from api.management.base import MaintenanceCommand
+from api.models import UploadSession
+from api.storage import BLOB_PREFIX, ContentAddressedStorage, document_storage
+from api.uploads import upload_part_path
+
+class Command(MaintenanceCommand):
+    help = 'Deletes content-addressed blobs no longer referenced by any file field, their previews, and abandoned chunked uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Blobs checked per reference query')
+        parser.add_argument('--min-age', type=int, default=60, help='Only collect blobs older than this many minutes')
+        parser.add_argument('--upload-max-age', type=int, default=24, help='Expire unfinished chunked uploads after this many hours')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting')
+
+    def reference_fields(self):
+        """Every model file field stored in content-addressed storage"""
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                    yield model, field.name
+
+    def iter_blobs(self, cutoff):
+        """Walk the blob tree lazily, yielding storage names of blobs older than cutoff"""
+        root = os.path.join(document_storage.location, BLOB_PREFIX)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if os.stat(path).st_mtime > cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                yield os.path.relpath(path, document_storage.location).replace(os.sep, '/')
+
+    def collect_batch(self, batch, fields, cutoff, dry_run):
+        referenced = set()
+        for model, field_name in fields:
+            referenced.update(
+                model.objects.filter(**{f'{field_name}__in': batch}).values_list(field_name, flat=True)
+            )
+
+        deleted = freed = 0
+        for name in batch:
+            if name in referenced:
+                continue
+            try:
+                # Re-check: a duplicate upload may have claimed the blob since it was listed
+                if os.stat(document_storage.path(name)).st_mtime > cutoff:
+                    continue
+                freed += document_storage.size(name)
+                if not dry_run:
+                    document_storage.delete_blob(name)
+                deleted += 1
+            except FileNotFoundError:
+                continue
+        return deleted, freed
+
+    def blob_exists(self, digest):
+        directory = os.path.join(document_storage.location, BLOB_PREFIX, digest[:2], digest[2:4])
+        try:
+            return any(name.startswith(digest) for name in os.listdir(directory))
+        except FileNotFoundError:
+            return False
+
+    def collect_previews(self, cutoff, dry_run):
+        """Remove preview sets whose source blob is gone"""
+        root = os.path.join(document_storage.location, 'previews')
+        removed = 0
+        for prefix in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+            prefix_dir = os.path.join(root, prefix)
+            for entry in os.scandir(prefix_dir):
+                if not entry.is_dir() or entry.stat().st_mtime > cutoff or self.blob_exists(entry.name):
+                    continue
+                removed += 1
+                if not dry_run:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        return removed
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+        cutoff = time.time() - options['min_age'] * 60
+        fields = list(self.reference_fields())
+
+        scanned = deleted = freed = 0
+        batch = []
+        for name in self.iter_blobs(cutoff):
+            batch.append(name)
+            scanned += 1
+            if len(batch) >= batch_size:
+                count, size = self.collect_batch(batch, fields, cutoff, dry_run)
+                deleted += count
+                freed += size
+                batch = []
+        if batch:
+            count, size = self.collect_batch(batch, fields, cutoff, dry_run)
+            deleted += count
+            freed += size
+
+        previews = self.collect_previews(cutoff, dry_run)
+
+        # Abandoned chunked uploads
+        expired = UploadSession.objects.filter(
+            updated_at__lt=timezone.now() - timedelta(hours=options['upload_max_age'])
+        )
+        expired_count = 0
+        for session in expired.iterator():
+            expired_count += 1
+            if dry_run:
+                continue
+            try:
+                os.remove(upload_part_path(session))
+            except FileNotFoundError:
+                pass
+            session.delete()
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Scanned {scanned} blobs. {verb} {deleted} orphaned blobs '
+                f'({freed / (1024 * 1024):.1f} MB), {previews} preview sets and {expired_count} expired uploads'
+            )
+        )
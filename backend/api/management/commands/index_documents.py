@@ -0,0 +1,51 @@
+from django.db.models import Exists, OuterRef, Q
+
+from api.management.base import MaintenanceCommand
+from api.models import DocumentFingerprint, PurchaseRequest
+from api.storage import blob_digest
+from services.documents import extract_receipt_text
+from services.duplicates import index_document
+
+class Command(MaintenanceCommand):
+    help = 'Fingerprints proformas and receipts uploaded before duplicate detection existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Requests loaded per query')
+        parser.add_argument('--kind', choices=['proforma', 'receipt'], help='Only index this document type')
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else ['proforma', 'receipt']
+        for kind in kinds:
+            indexed = self.index_kind(kind, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} {kind} documents'))
+
+    def index_kind(self, kind, batch_size):
+        missing = (
+            PurchaseRequest.objects
+            .exclude(Q(**{kind: ''}) | Q(**{f'{kind}__isnull': True}))
+            .exclude(Exists(DocumentFingerprint.objects.filter(request=OuterRef('pk'), kind=kind)))
+            .order_by('id')
+        )
+        indexed = 0
+        last_id = 0
+
+        while True:
+            batch = list(missing.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for purchase_request in batch:
+                field_file = getattr(purchase_request, kind)
+                try:
+                    if kind == 'proforma':
+                        text = purchase_request.extracted_text
+                    else:
+                        # Receipt text was never stored; extract it this once
+                        text = extract_receipt_text(field_file.path)
+                    index_document(purchase_request, kind, text, digest=blob_digest(field_file.name))
+                    indexed += 1
+                except Exception as e:
+                    self.stderr.write(f'Request {purchase_request.id}: {e}')
+
+        return indexed
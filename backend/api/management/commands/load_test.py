@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.load_data import LOAD_USER_PREFIX, write_fixture_documents
+from api.loadtest import ROLES, run_load_test
+
+User = get_user_model()
+
+# Accounts from create_test_users, used when no seed_load_data users exist
+DEFAULT_ACCOUNTS = {
+    'staff': 'staff1',
+    'approver_level_1': 'approver1',
+    'approver_level_2': 'approver2',
+    'finance': 'finance1',
+}
+
+class Command(BaseCommand):
+    help = 'Replays role-based scenarios against a running server and reports p50/p95/p99 latency and throughput per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000', help='Server to load (never point this at production)')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+        parser.add_argument('--staff', type=int, default=5, help='Concurrent staff users (create requests with a proforma, submit receipts)')
+        parser.add_argument('--approvers', type=int, default=10, help='Concurrent approvers per level (list, review, approve)')
+        parser.add_argument('--finance', type=int, default=2, help='Concurrent finance users (filter and review approved requests, export)')
+        parser.add_argument('--think-time', type=float, default=1.0, help='Mean pause between scenario steps, seconds')
+        parser.add_argument('--password', default='password123', help='Password of the load test accounts')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for scenario choices')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout, seconds')
+        parser.add_argument('--output', help='Also write the report as JSON to this path')
+
+    def accounts(self, counts, password):
+        """
+        Usernames per role: seed_load_data users when present, otherwise the
+        create_test_users account (shared by all virtual users of that role)
+        """
+        accounts = []
+        for role, count in counts.items():
+            usernames = list(
+                User.objects.filter(username__startswith=LOAD_USER_PREFIX, role=role)
+                .order_by('username').values_list('username', flat=True)[:count]
+            ) or [DEFAULT_ACCOUNTS[role]]
+            accounts.extend((role, usernames[index % len(usernames)], password) for index in range(count))
+        return accounts
+
+    def documents(self):
+        """A few generated proforma PDFs and receipt scans to upload"""
+        with tempfile.TemporaryDirectory() as directory:
+            documents = []
+            for path in write_fixture_documents(directory, 3):
+                content_type = 'application/pdf' if path.endswith('.pdf') else 'image/png'
+                with open(path, 'rb') as handle:
+                    documents.append((os.path.basename(path), handle.read(), content_type))
+        return documents
+
+    def handle(self, *args, **options):
+        if options['duration'] <= 0:
+            raise CommandError('--duration must be positive')
+
+        counts = {
+            'staff': options['staff'],
+            'approver_level_1': options['approvers'],
+            'approver_level_2': options['approvers'],
+            'finance': options['finance'],
+        }
+        accounts = self.accounts({role: counts[role] for role in ROLES if counts[role] > 0}, options['password'])
+        if not accounts:
+            raise CommandError('No virtual users configured')
+
+        self.stdout.write(f'Running {len(accounts)} virtual users against {options["base_url"]} for {options["duration"]:.0f}s')
+        try:
+            report = asyncio.run(run_load_test(
+                options['base_url'],
+                accounts,
+                self.documents(),
+                options['duration'],
+                think_time=options['think_time'],
+                seed=options['seed'],
+                timeout=options['timeout']
+            ))
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        header = f'{"endpoint":<48} {"count":>7} {"errors":>7} {"req/s":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in report:
+            self.stdout.write(
+                f'{row["endpoint"]:<48} {row["count"]:>7} {row["errors"]:>7} {row["throughput"]:>8} '
+                f'{row["p50_ms"]:>9} {row["p95_ms"]:>9} {row["p99_ms"]:>9}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f'Report written to {options["output"]}')
@@ -0,0 +1,9 @@
+from api.management.base import MaintenanceCommand
+from services.analytics import rebuild_rollups
+
+class Command(MaintenanceCommand):
+    help = 'Recomputes the monthly spend rollups behind /api/analytics/ from approved requests, including archived ones'
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} spend rollup rows'))
@@ -0,0 +1,75 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import BENCHMARKS, find_regressions, run_benchmarks, startup_report
+
+class Command(BaseCommand):
+    help = 'Runs the API/service benchmark suite on a throwaway database (OpenAI mocked) and compares against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000', help='Comma-separated dataset sizes for list/retrieve cases')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed runs per case')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed runs per case before timing')
+        parser.add_argument('--only', action='append', help='Only run cases whose name contains this (repeatable)')
+        parser.add_argument('--output', help='Write results as JSON to this path (e.g. to use as a baseline)')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+        parser.add_argument('--threshold', type=float, default=0.25, help='Allowed median slowdown vs baseline (0.25 = 25%%)')
+        parser.add_argument('--list', action='store_true', help='List the available cases and exit')
+        parser.add_argument('--startup', action='store_true', help='Also report worker boot memory and import times (python -X importtime)')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name, (_, sized) in BENCHMARKS.items():
+                self.stdout.write(f'{name}{" (sized)" if sized else ""}')
+            return
+
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read baseline: {e}')
+
+        results = run_benchmarks(
+            sizes,
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+            only=options['only'],
+            log=self.stdout.write
+        )
+
+        if options['startup']:
+            results['startup'] = startup_report()
+            startup = results['startup']
+            self.stdout.write(f'Worker boot: {startup["boot_ms"]} ms, RSS {startup["rss_mb"]} MB')
+            self.stdout.write(f'Document libraries loaded at boot: {", ".join(startup["document_libraries"]) or "none"}')
+            for module, ms in startup['slowest_imports_ms'].items():
+                self.stdout.write(f'  {module}: {ms} ms')
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is None:
+            return
+
+        if baseline.get('environment') != results['environment']:
+            self.stdout.write(self.style.WARNING('Baseline was recorded in a different environment; comparisons may be noisy'))
+
+        regressions = find_regressions(results, baseline, options['threshold'])
+        for name, previous, current in regressions:
+            self.stdout.write(self.style.ERROR(f'{name}: {previous} ms -> {current} ms (+{(current / previous - 1) * 100:.0f}%)'))
+        if regressions:
+            raise CommandError(f'{len(regressions)} benchmark(s) regressed beyond {options["threshold"] * 100:.0f}%')
+
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
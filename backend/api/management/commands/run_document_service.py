@@ -0,0 +1,47 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from services.document_service import WorkerPool, serve
+
+class Command(BaseCommand):
+    help = 'Runs the document worker pool that API workers send proforma, receipt and PO jobs to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.DOCUMENT_SERVICE_SOCKET, help='Unix socket path (default: DOCUMENT_SERVICE_SOCKET)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Worker processes')
+        parser.add_argument('--max-tasks-per-child', type=int, default=100, help='Jobs a worker runs before it is replaced')
+        parser.add_argument('--queue-size', type=int, default=None, help='Jobs allowed to wait for a worker (default: 2 per worker)')
+        parser.add_argument('--timeout', type=int, default=settings.DOCUMENT_SERVICE_TIMEOUT, help='Seconds a job may run before its worker is killed')
+        parser.add_argument('--queue-wait', type=int, default=settings.DOCUMENT_SERVICE_QUEUE_WAIT, help='Seconds a job waits for a free slot before being refused')
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError('Set DOCUMENT_SERVICE_SOCKET or pass --socket')
+        if options['workers'] < 1 or options['max_tasks_per_child'] < 1:
+            raise CommandError('--workers and --max-tasks-per-child must be at least 1')
+        queue_size = options['queue_size'] if options['queue_size'] is not None else 2 * options['workers']
+
+        # Workers open their own database connections
+        connections.close_all()
+
+        pool = WorkerPool(
+            workers=options['workers'],
+            max_tasks=options['max_tasks_per_child'],
+            queue_size=queue_size,
+            timeout=options['timeout'],
+            queue_wait=options['queue_wait']
+        )
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(
+            f'Document service listening on {options["socket"]} '
+            f'({options["workers"]} workers, queue {queue_size}, timeout {options["timeout"]}s)'
+        ))
+        try:
+            serve(options['socket'], pool)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown()
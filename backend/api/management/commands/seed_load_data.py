@@ -0,0 +1,79 @@
+import random
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection
+
+from api.load_data import LOAD_USER_PREFIX, create_users, delete_load_data, seed_requests, write_fixture_documents
+from api.management.base import MaintenanceCommand
+from services.analytics import rebuild_rollups
+
+User = get_user_model()
+
+class Command(MaintenanceCommand):
+    help = 'Generates deterministic synthetic users, purchase requests and approvals for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Users to create across roles')
+        parser.add_argument('--requests', type=int, default=100000, help='Purchase requests to create')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed produces the same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per insert batch')
+        parser.add_argument('--copy', action='store_true', help='Insert with COPY instead of bulk_create (PostgreSQL only)')
+        parser.add_argument('--line-items', action='store_true', help='Also create LineItem rows from the generated items')
+        parser.add_argument('--reset', action='store_true', help='Delete previously generated load data first')
+        parser.add_argument('--fixtures', type=int, default=0, help='Also write this many fixture PDFs and PNG scans')
+        parser.add_argument('--fixtures-dir', default='load_fixtures', help='Directory for fixture documents')
+        parser.add_argument('--end-date', help='Latest creation date (YYYY-MM-DD, UTC); default is fixed per seed')
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        end = None
+        if options['end_date']:
+            try:
+                end = datetime.strptime(options['end_date'], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                raise CommandError('--end-date must be YYYY-MM-DD')
+
+        if options['reset']:
+            deleted, _ = delete_load_data()
+            self.stdout.write(f'Deleted {deleted} rows of earlier load data')
+        elif User.objects.filter(username__startswith=LOAD_USER_PREFIX).exists():
+            raise CommandError('Load data already exists; run with --reset to replace it')
+
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
+        user_ids = create_users(options['users'], rng, batch_size=options['batch_size'])
+        self.stdout.write('Users: ' + ', '.join(f'{role}={len(ids)}' for role, ids in user_ids.items()))
+
+        total = options['requests']
+        def progress(created):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {created}/{total} requests ({created / max(elapsed, 0.001):.0f}/s)')
+
+        created = seed_requests(
+            total,
+            user_ids,
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            use_copy=options['copy'],
+            line_items=options['line_items'],
+            progress=progress,
+            end=end
+        )
+
+        # Bulk inserts bypass the approval flow that maintains the spend rollups
+        rebuild_rollups()
+
+        if options['fixtures']:
+            paths = write_fixture_documents(options['fixtures_dir'], options['fixtures'], seed=options['seed'])
+            self.stdout.write(f'Wrote {len(paths)} fixture documents to {options["fixtures_dir"]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} purchase requests in {time.monotonic() - started:.1f}s'
+        ))
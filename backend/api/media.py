@@ -0,0 +1,135 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+
+from .storage import blob_digest
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def file_etag(stat):
+    """ETag built from size and mtime; cheap and stable across workers"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header
+    Returns: (start, end) inclusive, None when absent/unsupported, or False when unsatisfiable
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = handle.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+def _offload_response(name, path):
+    """Let the front proxy send the file (nginx X-Accel-Redirect / Apache X-Sendfile)"""
+    mode = settings.MEDIA_ACCEL_REDIRECT
+    response = HttpResponse()
+    if mode == 'nginx':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(name)
+    elif mode == 'sendfile':
+        response['X-Sendfile'] = path
+    else:
+        return None
+    # Let the proxy compute these from the real file
+    del response['Content-Type']
+    return response
+
+def serve_file(request, field_file, filename=None, cache_control='private, max-age=3600'):
+    """Serve a stored FieldFile; content-addressed blobs use their digest as ETag"""
+    digest = blob_digest(field_file.name)
+    return serve_path(
+        request,
+        field_file.path,
+        field_file.name,
+        filename=filename,
+        etag=f'"{digest}"' if digest else None,
+        cache_control=cache_control
+    )
+
+def serve_path(request, path, name, filename=None, etag=None, cache_control='private, max-age=3600'):
+    """
+    Serve a file under MEDIA_ROOT with conditional GET and single Range support
+    name is the path relative to MEDIA_ROOT, used for X-Accel-Redirect.
+    The body is handed to the proxy when MEDIA_ACCEL_REDIRECT is set, or streamed
+    through wsgi.file_wrapper (sendfile) otherwise
+    """
+    stat = os.stat(path)
+    etag = etag or file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = cache_control
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return finish(conditional)
+
+    offloaded = _offload_response(name, path)
+    if offloaded is not None:
+        offloaded['Content-Disposition'] = f'inline; filename="{filename}"'
+        return finish(offloaded)
+
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+
+    # If-Range: only honour the range when the client's copy is still current
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if byte_range and if_range and etag not in parse_etags(if_range) and if_range != http_date(last_modified):
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return finish(response)
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(length)
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        return finish(response)
+
+    response = FileResponse(open(path, 'rb'), content_type=content_type, filename=filename)
+    return finish(response)
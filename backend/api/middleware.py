@@ -0,0 +1,147 @@
+import cProfile
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from services import metrics
+from services.tracing import end_trace, query_timer, start_trace
+
+from .audit import audit_batch
+from .profiling import acquire_slot, profile_requested, profiling_user, save_profile
+
+logger = logging.getLogger('api.performance')
+
+class PerformanceTracingMiddleware:
+    """
+    Time a sample of requests end to end with a SQL / service breakdown
+    Sampled responses get a Server-Timing header and one JSON log line on
+    the api.performance logger. PERF_TRACE_SAMPLE_RATE controls the share traced
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = settings.PERF_TRACE_SAMPLE_RATE
+        if sample_rate <= 0 or random.random() >= sample_rate:
+            return self.get_response(request)
+
+        trace, token = start_trace()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(query_timer))
+                response = self.get_response(request)
+        finally:
+            end_trace(token)
+
+        total_ms = trace.elapsed * 1000
+        db_ms = trace.db_time * 1000
+        spans = {
+            name: {'ms': round(duration * 1000, 2), 'count': count}
+            for name, (duration, count) in trace.spans.items()
+        }
+
+        timings = [
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={db_ms:.1f};desc="{trace.db_queries} queries"',
+        ]
+        timings.extend(f'{name};dur={values["ms"]:.1f}' for name, values in spans.items())
+        response['Server-Timing'] = ', '.join(timings)
+
+        # Streaming bodies are produced after this point and are not included in total_ms
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user_id': getattr(getattr(request, 'user', None), 'pk', None),
+            'total_ms': round(total_ms, 2),
+            'db_queries': trace.db_queries,
+            'db_ms': round(db_ms, 2),
+            'spans': spans,
+        }))
+
+        return response
+
+def view_labels(request):
+    """Bounded (view, action) labels for a request: viewset class and action, or URL name"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', ''
+
+    cls = getattr(match.func, 'cls', None)
+    if cls is not None:
+        actions = getattr(match.func, 'actions', None) or {}
+        return cls.__name__, actions.get(request.method.lower(), '')
+    return match.url_name or getattr(match.func, '__name__', 'view'), ''
+
+class MetricsMiddleware:
+    """Record API latency per view/action in the http_request_duration_seconds histogram"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+
+        view, action = view_labels(request)
+        metrics.observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - started,
+            view=view,
+            action=action,
+            method=request.method,
+            status=response.status_code,
+        )
+        return response
+
+class AuditMiddleware:
+    """Write all audit events recorded while handling a request with one bulk insert"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with audit_batch():
+            return self.get_response(request)
+
+class ProfilingMiddleware:
+    """
+    Run a single request under cProfile when a superuser asks for it
+    (X-Profile: 1 header or ?profile=1). The stats are saved under PROFILING_DIR
+    and the response carries X-Profile-Id; download via /api/profiles/{id}/
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profile_requested(request):
+            return self.get_response(request)
+
+        user = profiling_user(request)
+        if user is None or not acquire_slot(user):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this process
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - started
+
+        try:
+            response['X-Profile-Id'] = save_profile(profiler, request, user, response, duration)
+        except OSError:
+            logger.exception('Error saving profile')
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.26 on 2026-10-19 10:35
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('name', models.CharField(max_length=255)),
+                ('normalized_name', models.CharField(db_index=True, max_length=255)),
+                ('quantity', models.DecimalField(decimal_places=3, default=Decimal('1'), max_digits=12)),
+                ('unit_price', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='api.purchaserequest')),
+            ],
+            options={
+                'db_table': 'line_items',
+                'ordering': ['request', 'position'],
+                'indexes': [models.Index(fields=['request', 'position'], name='line_item_request_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 4.2.26 on 2026-10-19 10:35
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Frozen copy of services.line_items.parse_line_items as of this migration, so later
+# changes to the service do not change what this backfill does
+MAX_NAME_LENGTH = 255
+MAX_VALUE = Decimal('1000000000')
+MAX_TOTAL = Decimal('1000000000000')
+
+
+def normalize_item_name(name):
+    text = re.sub(r'[^\w\s]', ' ', str(name or '').lower())
+    return ' '.join(text.split())[:MAX_NAME_LENGTH]
+
+
+def _to_decimal(value, default):
+    try:
+        number = Decimal(str(value).replace(',', ''))
+    except (InvalidOperation, TypeError, ValueError):
+        return default
+    return number if number.is_finite() else default
+
+
+def parse_line_items(items):
+    rows = []
+
+    if not isinstance(items, list):
+        return rows
+
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+
+        name = str(item.get('name') or '').strip()[:MAX_NAME_LENGTH]
+        normalized_name = normalize_item_name(name)
+        if not normalized_name:
+            continue
+
+        quantity = _to_decimal(item.get('quantity', 1), Decimal('1')).quantize(Decimal('0.001'))
+        unit_price = _to_decimal(item.get('price', 0), Decimal('0')).quantize(Decimal('0.01'))
+        total = (quantity * unit_price).quantize(Decimal('0.01'))
+        if not (0 <= quantity < MAX_VALUE and 0 <= unit_price < MAX_VALUE and total < MAX_TOTAL):
+            continue
+
+        rows.append({
+            'position': position,
+            'name': name,
+            'normalized_name': normalized_name,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total': total,
+        })
+
+    return rows
+
+
+def backfill_line_items(apps, schema_editor):
+    PurchaseRequest = apps.get_model('api', 'PurchaseRequest')
+    LineItem = apps.get_model('api', 'LineItem')
+
+    # Walk requests in primary key order so each batch is a cheap range scan
+    last_id = 0
+    while True:
+        batch = list(
+            PurchaseRequest.objects
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'extracted_items')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        line_items = []
+        for request_id, items in batch:
+            for row in parse_line_items(items):
+                line_items.append(LineItem(request_id=request_id, **row))
+
+        LineItem.objects.bulk_create(line_items, batch_size=BATCH_SIZE)
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_line_items'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_line_items, migrations.RunPython.noop),
+    ]
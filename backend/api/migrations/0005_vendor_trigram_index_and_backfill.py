@@ -0,0 +1,83 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:02
+
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Frozen copy of services.vendors.normalize_vendor_name as of this migration, so later
+# changes to the service do not change what this backfill does
+MAX_NAME_LENGTH = 255
+LEGAL_SUFFIXES = {
+    'co', 'company', 'corp', 'corporation', 'inc', 'incorporated',
+    'limited', 'llc', 'ltd', 'plc', 'sarl', 'gmbh',
+}
+
+
+def normalize_vendor_name(name):
+    words = re.sub(r'[^\w\s]', ' ', str(name or '').lower()).split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)[:MAX_NAME_LENGTH]
+
+
+def create_trigram_index(apps, schema_editor):
+    # SQLite has no pg_trgm; services.vendors falls back to Python scoring there
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS vendor_alias_trgm_idx '
+        'ON vendor_aliases USING gin (normalized_alias gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS vendor_alias_trgm_idx')
+
+
+def backfill_vendors(apps, schema_editor):
+    PurchaseRequest = apps.get_model('api', 'PurchaseRequest')
+    Vendor = apps.get_model('api', 'Vendor')
+    VendorAlias = apps.get_model('api', 'VendorAlias')
+
+    # Exact normalized matches only; fuzzy merging is left to extraction and admins
+    names = (
+        PurchaseRequest.objects
+        .exclude(vendor_name='')
+        .order_by('vendor_name')
+        .values_list('vendor_name', flat=True)
+        .distinct()
+    )
+    for name in names.iterator(chunk_size=BATCH_SIZE):
+        normalized = normalize_vendor_name(name)
+        if not normalized:
+            continue
+
+        alias = VendorAlias.objects.filter(normalized_alias=normalized).first()
+        if alias:
+            vendor_id = alias.vendor_id
+        else:
+            vendor, _ = Vendor.objects.get_or_create(
+                normalized_name=normalized,
+                defaults={'name': name.strip()[:255]}
+            )
+            VendorAlias.objects.create(vendor=vendor, alias=name.strip()[:255], normalized_alias=normalized)
+            vendor_id = vendor.id
+
+        PurchaseRequest.objects.filter(vendor_name=name, vendor__isnull=True).update(vendor_id=vendor_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_vendors'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+        migrations.RunPython(backfill_vendors, migrations.RunPython.noop),
+    ]
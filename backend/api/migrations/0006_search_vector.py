@@ -0,0 +1,72 @@
+# Generated by Django 4.2.26 on 2026-10-19 10:37
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def build_search_vector():
+    # Frozen copy of services.search.build_search_vector as of this migration, so
+    # later changes to the search document do not change this backfill
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('title', weight='A', config='english') +
+        SearchVector('vendor_name', weight='A', config='english') +
+        SearchVector('description', weight='B', config='english') +
+        SearchVector('extracted_text', weight='C', config='english')
+    )
+
+
+def create_search_index(apps, schema_editor):
+    # SQLite has no tsvector; services.search falls back to icontains there
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS purchase_request_search_idx '
+        'ON purchase_requests USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS purchase_request_search_idx')
+
+
+def backfill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    PurchaseRequest = apps.get_model('api', 'PurchaseRequest')
+
+    # Update in primary key ranges to keep each statement's lock footprint small
+    last_id = 0
+    max_id = PurchaseRequest.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    while last_id < max_id:
+        PurchaseRequest.objects.filter(id__gt=last_id, id__lte=last_id + BATCH_SIZE).update(
+            search_vector=build_search_vector()
+        )
+        last_id += BATCH_SIZE
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_vendor_trigram_index_and_backfill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='extracted_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
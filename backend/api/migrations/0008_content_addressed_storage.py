@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-19 10:42
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchaserequest',
+            name='proforma',
+            field=models.FileField(blank=True, db_index=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='proformas/'),
+        ),
+        migrations.AlterField(
+            model_name='purchaserequest',
+            name='purchase_order',
+            field=models.FileField(blank=True, db_index=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='purchase_orders/'),
+        ),
+        migrations.AlterField(
+            model_name='purchaserequest',
+            name='receipt',
+            field=models.FileField(blank=True, db_index=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='receipts/'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.26 on 2026-10-19 10:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('proforma', 'Proforma'), ('receipt', 'Receipt')], max_length=20)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('image_hash', models.CharField(blank=True, max_length=16)),
+                ('minhash', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='api.purchaserequest')),
+            ],
+            options={
+                'db_table': 'document_fingerprints',
+            },
+        ),
+        migrations.CreateModel(
+            name='FingerprintBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(max_length=24)),
+                ('fingerprint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='api.documentfingerprint')),
+            ],
+            options={
+                'db_table': 'fingerprint_bands',
+                'indexes': [models.Index(fields=['bucket'], name='fingerprint_band_bucket_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentfingerprint',
+            constraint=models.UniqueConstraint(fields=('request', 'kind'), name='document_fingerprint_request_kind_unique'),
+        ),
+    ]
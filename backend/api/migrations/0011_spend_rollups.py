@@ -0,0 +1,33 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:02
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_document_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('vendor', 'Vendor'), ('requester', 'Requester')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=64)),
+                ('period', models.DateField()),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('request_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'spend_rollups',
+                'indexes': [models.Index(fields=['dimension', 'period'], name='spend_rollup_period_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='spendrollup',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key', 'period'), name='spend_rollup_dimension_key_period_unique'),
+        ),
+    ]
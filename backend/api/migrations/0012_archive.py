@@ -0,0 +1,85 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:03
+
+import api.storage
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_spend_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedApproval',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('approved', 'Approved'), ('rejected', 'Rejected')], max_length=20)),
+                ('level', models.IntegerField()),
+                ('comments', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'archived_approvals',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPurchaseRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], max_length=20)),
+                ('proforma', models.FileField(blank=True, db_index=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='proformas/')),
+                ('purchase_order', models.FileField(blank=True, db_index=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='purchase_orders/')),
+                ('receipt', models.FileField(blank=True, db_index=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='receipts/')),
+                ('vendor_name', models.CharField(blank=True, max_length=255)),
+                ('extracted_items', models.JSONField(blank=True, default=list)),
+                ('extracted_text', models.TextField(blank=True)),
+                ('receipt_validated', models.BooleanField(default=False)),
+                ('validation_errors', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('rejected_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'archived_purchase_requests',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='purchaserequest',
+            index=models.Index(fields=['created_at'], name='purchase_request_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedpurchaserequest',
+            name='created_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedpurchaserequest',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_requests', to='api.vendor'),
+        ),
+        migrations.AddField(
+            model_name='archivedapproval',
+            name='approver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_approvals_given', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedapproval',
+            name='request',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='approvals', to='api.archivedpurchaserequest'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpurchaserequest',
+            index=models.Index(fields=['created_by', 'created_at'], name='archived_request_owner_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_postgres_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Events arrive in time order, so a BRIN index covers time-range scans at a tiny size
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS audit_event_created_brin_idx '
+        'ON audit_events USING brin (created_at)'
+    )
+    # Enforce append-only in the database, not just in the model
+    schema_editor.execute(
+        'CREATE OR REPLACE FUNCTION audit_events_append_only() RETURNS trigger AS $$ '
+        "BEGIN RAISE EXCEPTION 'audit_events is append-only'; END; "
+        '$$ LANGUAGE plpgsql'
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER audit_events_append_only BEFORE UPDATE OR DELETE ON audit_events '
+        'FOR EACH ROW EXECUTE FUNCTION audit_events_append_only()'
+    )
+
+
+def drop_postgres_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TRIGGER IF EXISTS audit_events_append_only ON audit_events')
+    schema_editor.execute('DROP FUNCTION IF EXISTS audit_events_append_only()')
+    schema_editor.execute('DROP INDEX IF EXISTS audit_event_created_brin_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.BigIntegerField()),
+                ('action', models.CharField(max_length=50)),
+                ('changes', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'audit_events',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['request_id', '-created_at', '-id'], name='audit_event_request_idx')],
+            },
+        ),
+        migrations.RunPython(create_postgres_objects, drop_postgres_objects),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:06
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # Serves the word-start contains filter on ?item= / items?name=; SQLite scans instead
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS line_item_name_trgm_idx '
+        'ON line_items USING gin (normalized_name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS line_item_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_audit_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_line_item_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpurchaserequest',
+            name='proforma_truncated_reason',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='archivedpurchaserequest',
+            name='receipt_truncated_reason',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='proforma_truncated_reason',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='receipt_truncated_reason',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_extraction_truncated_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='resource_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from config.db_router import choose_replica, reset_read_alias, set_read_alias
+
+def _pin_key(user):
+    return f'db-primary-pin:{user.pk}'
+
+def pin_to_primary(user):
+    """Keep user's reads on the primary until replicas have caught up with their write"""
+    cache.set(_pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+def is_pinned_to_primary(user):
+    return bool(cache.get(_pin_key(user)))
+
+class ReplicaReadMixin:
+    """
+    Route reads of replica_read_actions to a read replica
+    Any write pins the user to the primary for REPLICA_PIN_SECONDS, so they
+    always see their own changes (read-your-writes) despite replication lag
+    """
+    replica_read_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        user = request.user
+        if request.method not in SAFE_METHODS:
+            if user.is_authenticated:
+                pin_to_primary(user)
+            return
+
+        if self.action in self.replica_read_actions and not (user.is_authenticated and is_pinned_to_primary(user)):
+            alias = choose_replica()
+            if alias:
+                self._read_alias_token = set_read_alias(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_alias_token', None)
+        if token is not None:
+            self._read_alias_token = None
+            reset_read_alias(token)
+        return super().finalize_response(request, response, *args, **kwargs)
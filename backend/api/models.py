@@ -1,7 +1,11 @@
+import uuid
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+from .storage import document_storage
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -15,6 +19,32 @@ class User(AbstractUser):
     class Meta:
         db_table = 'users'
 
+class Vendor(models.Model):
+    name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'vendors'
+        ordering = ['name']
+        
+    def __str__(self):
+        return self.name
+
+class VendorAlias(models.Model):
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=255)
+    # Trigram (pg_trgm) index on this column is created by migration on PostgreSQL
+    normalized_alias = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'vendor_aliases'
+        ordering = ['normalized_alias']
+        
+    def __str__(self):
+        return f"{self.alias} -> {self.vendor.name}"
+
 class PurchaseRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -34,18 +64,26 @@ class PurchaseRequest(models.Model):
     # Relations
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='requests')
     
-    # Files
-    proforma = models.FileField(upload_to='proformas/', null=True, blank=True)
-    purchase_order = models.FileField(upload_to='purchase_orders/', null=True, blank=True)
-    receipt = models.FileField(upload_to='receipts/', null=True, blank=True)
+    # Files (content-addressed: stored once per SHA-256, indexed for gc_media reference checks)
+    proforma = models.FileField(upload_to='proformas/', storage=document_storage, db_index=True, null=True, blank=True)
+    purchase_order = models.FileField(upload_to='purchase_orders/', storage=document_storage, db_index=True, null=True, blank=True)
+    receipt = models.FileField(upload_to='receipts/', storage=document_storage, db_index=True, null=True, blank=True)
     
     # Extracted data from proforma
     vendor_name = models.CharField(max_length=255, blank=True)
+    vendor = models.ForeignKey(Vendor, on_delete=models.SET_NULL, null=True, blank=True, related_name='requests')
     extracted_items = models.JSONField(default=list, blank=True)
+    extracted_text = models.TextField(blank=True)
+    # Extraction budget that cut the document short (pages/pixels/time/memory), '' if read in full
+    proforma_truncated_reason = models.CharField(max_length=20, blank=True)
+    
+    # Full-text search document; GIN index is created by migration on PostgreSQL
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
     
     # Receipt validation
     receipt_validated = models.BooleanField(default=False)
     validation_errors = models.JSONField(default=list, blank=True)
+    receipt_truncated_reason = models.CharField(max_length=20, blank=True)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -56,6 +94,10 @@ class PurchaseRequest(models.Model):
     class Meta:
         db_table = 'purchase_requests'
         ordering = ['-created_at']
+        indexes = [
+            # Newest-first listing and the archive_requests cutoff scan
+            models.Index(fields=['created_at'], name='purchase_request_created_idx'),
+        ]
         
     def __str__(self):
         return f"{self.title} - {self.status}"
@@ -79,4 +121,243 @@ class Approval(models.Model):
         unique_together = ['request', 'level']
         
     def __str__(self):
-        return f"{self.approver.username} - {self.action} - Level {self.level}"
\ No newline at end of file
+        return f"{self.approver.username} - {self.action} - Level {self.level}"
+
+class LineItem(models.Model):
+    request = models.ForeignKey(PurchaseRequest, on_delete=models.CASCADE, related_name='line_items')
+    position = models.PositiveIntegerField(default=0)
+    name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, db_index=True)
+    quantity = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal('1'))
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    
+    class Meta:
+        db_table = 'line_items'
+        ordering = ['request', 'position']
+        indexes = [
+            models.Index(fields=['request', 'position'], name='line_item_request_idx'),
+        ]
+        
+    def __str__(self):
+        return f"{self.name} x {self.quantity}"
+
+
+class UploadSession(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Filled in once the last chunk arrives
+    sha256 = models.CharField(max_length=64, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'upload_sessions'
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"{self.filename} ({self.received_size}/{self.total_size})"
+
+class IdempotencyKey(models.Model):
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('complete', 'Complete'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # Hash of the request the key was first used with; reuse for a different request is rejected
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    
+    # Stored first response, replayed for retries
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    # Object the response describes; replays re-serialize it so signed links are fresh
+    resource_id = models.BigIntegerField(null=True, blank=True)
+    
+    locked_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        db_table = 'idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_user_key_unique'),
+        ]
+        
+    def __str__(self):
+        return f"{self.user_id}:{self.key} ({self.status})"
+
+class DocumentFingerprint(models.Model):
+    KIND_CHOICES = [
+        ('proforma', 'Proforma'),
+        ('receipt', 'Receipt'),
+    ]
+    
+    request = models.ForeignKey(PurchaseRequest, on_delete=models.CASCADE, related_name='fingerprints')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    # dHash (hex) of the image or first rendered page, MinHash of the extracted text
+    image_hash = models.CharField(max_length=16, blank=True)
+    minhash = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'document_fingerprints'
+        constraints = [
+            models.UniqueConstraint(fields=['request', 'kind'], name='document_fingerprint_request_kind_unique'),
+        ]
+        
+    def __str__(self):
+        return f"{self.kind} of request {self.request_id}"
+
+class FingerprintBand(models.Model):
+    """Locality-sensitive hash bucket of a fingerprint (see services.duplicates.lsh_buckets)"""
+    fingerprint = models.ForeignKey(DocumentFingerprint, on_delete=models.CASCADE, related_name='bands')
+    bucket = models.CharField(max_length=24)
+    
+    class Meta:
+        db_table = 'fingerprint_bands'
+        indexes = [
+            models.Index(fields=['bucket'], name='fingerprint_band_bucket_idx'),
+        ]
+        
+    def __str__(self):
+        return self.bucket
+
+class SpendRollup(models.Model):
+    """Approved spend per calendar month, overall and per vendor / requester (see services.analytics)"""
+    DIMENSION_CHOICES = [
+        ('total', 'Total'),
+        ('vendor', 'Vendor'),
+        ('requester', 'Requester'),
+    ]
+    
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    # Vendor or user id; '' for the total and for requests without a vendor
+    key = models.CharField(max_length=64, blank=True)
+    period = models.DateField()  # first day of the month
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    request_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'spend_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key', 'period'], name='spend_rollup_dimension_key_period_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'period'], name='spend_rollup_period_idx'),
+        ]
+        
+    def __str__(self):
+        return f"{self.dimension}:{self.key} {self.period:%Y-%m} {self.total_amount}"
+
+class ArchivedPurchaseRequest(models.Model):
+    """
+    Finished purchase request moved out of the hot table by `manage.py archive_requests`
+    Keeps the original id and the same columns (minus the search vector), so it can
+    be served by the retrieve, files and export endpoints unchanged
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=PurchaseRequest.STATUS_CHOICES)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_requests')
+    
+    # Still references the shared blobs, so gc_media keeps them
+    proforma = models.FileField(upload_to='proformas/', storage=document_storage, db_index=True, null=True, blank=True)
+    purchase_order = models.FileField(upload_to='purchase_orders/', storage=document_storage, db_index=True, null=True, blank=True)
+    receipt = models.FileField(upload_to='receipts/', storage=document_storage, db_index=True, null=True, blank=True)
+    
+    vendor_name = models.CharField(max_length=255, blank=True)
+    vendor = models.ForeignKey(Vendor, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_requests')
+    extracted_items = models.JSONField(default=list, blank=True)
+    extracted_text = models.TextField(blank=True)
+    proforma_truncated_reason = models.CharField(max_length=20, blank=True)
+    receipt_validated = models.BooleanField(default=False)
+    validation_errors = models.JSONField(default=list, blank=True)
+    receipt_truncated_reason = models.CharField(max_length=20, blank=True)
+    
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    approved_at = models.DateTimeField(null=True, blank=True)
+    rejected_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'archived_purchase_requests'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'created_at'], name='archived_request_owner_idx'),
+        ]
+        
+    def __str__(self):
+        return f"{self.title} - {self.status} (archived)"
+
+class ArchivedApproval(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    request = models.ForeignKey(ArchivedPurchaseRequest, on_delete=models.CASCADE, related_name='approvals')
+    approver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_approvals_given')
+    action = models.CharField(max_length=20, choices=Approval.ACTION_CHOICES)
+    level = models.IntegerField()
+    comments = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'archived_approvals'
+        ordering = ['created_at']
+        
+    def __str__(self):
+        return f"{self.approver.username} - {self.action} - Level {self.level} (archived)"
+
+class AuditEvent(models.Model):
+    """
+    Append-only history of a purchase request, written through api.audit.record
+    request_id is a plain column so the history outlives deletion and archiving
+    """
+    request_id = models.BigIntegerField()
+    # No FK constraint: the event keeps the actor's id even after the user is deleted
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    action = models.CharField(max_length=50)
+    changes = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'audit_events'
+        ordering = ['-created_at', '-id']
+        # A BRIN index on created_at for time-range scans is added by migration on PostgreSQL
+        indexes = [
+            models.Index(fields=['request_id', '-created_at', '-id'], name='audit_event_request_idx'),
+        ]
+        
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Audit events are append-only')
+        super().save(*args, **kwargs)
+        
+    def delete(self, *args, **kwargs):
+        raise ValueError('Audit events are append-only')
+        
+    def __str__(self):
+        return f"{self.action} on request {self.request_id}"
@@ -0,0 +1,8 @@
+from rest_framework.pagination import CursorPagination
+
+class AuditEventPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), so deep pages cost the same as the first"""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
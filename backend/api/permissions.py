@@ -18,6 +18,19 @@ class IsFinance(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role == 'finance'
 
+class IsAdmin(permissions.BasePermission):
+    """Allow only superusers"""
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_superuser
+
+class CanViewAnalytics(permissions.BasePermission):
+    """Allow approvers, finance and superusers"""
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and (
+            request.user.is_superuser or
+            request.user.role in ['approver_level_1', 'approver_level_2', 'finance']
+        )
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """Allow owners to edit, others can only read"""
     def has_object_permission(self, request, view, obj):
@@ -0,0 +1,49 @@
+import os
+
+from django.db import transaction
+from django.urls import reverse
+
+from services.background import submit
+from services.documents import generate_previews
+from services.preview_generator import load_manifest, preview_dir
+
+from .authentication import make_preview_token
+from .storage import blob_digest
+
+PREVIEW_FIELDS = ['proforma', 'purchase_order', 'receipt']
+
+def preview_url(token, digest, name=None):
+    """token: from make_preview_token, bound to the user, request, field and digest"""
+    if name:
+        url = reverse('preview-image', kwargs={'digest': digest, 'name': name})
+    else:
+        url = reverse('preview-detail', kwargs={'digest': digest})
+    return f'{url}?token={token}'
+
+def preview_urls(field_file, request=None):
+    """
+    Thumbnail and manifest URLs for a stored document, or None if it can't be previewed
+    The URLs carry a token for the requesting user that expires after MEDIA_TOKEN_MAX_AGE
+    """
+    digest = blob_digest(field_file.name) if field_file else None
+    user = getattr(request, 'user', None)
+    if not digest or user is None or not user.is_authenticated:
+        return None
+
+    token = make_preview_token(user, field_file.instance.pk, field_file.field.name, digest)
+    return {
+        'thumbnail': request.build_absolute_uri(preview_url(token, digest, 'thumb')),
+        'pages': request.build_absolute_uri(preview_url(token, digest)),
+    }
+
+def preview_file_path(digest, name):
+    return os.path.join(preview_dir(digest), f'{name}.webp')
+
+def schedule_previews(field_file):
+    """Render previews in the background once the surrounding transaction commits"""
+    digest = blob_digest(field_file.name) if field_file else None
+    if not digest or load_manifest(digest) is not None:
+        return
+
+    path = field_file.path
+    transaction.on_commit(lambda: submit(generate_previews, digest, path))
@@ -0,0 +1,129 @@
+import fcntl
+import glob
+import json
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = 'profile'
+
+PROFILE_ID_RE = r'[0-9a-f]{32}'
+
+def profile_requested(request):
+    flag = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_QUERY_PARAM)
+    return flag in ('1', 'true', 'yes')
+
+def profiling_user(request):
+    """
+    Authenticate the JWT ourselves: middleware runs before DRF does
+    Returns: the user if they may profile (superusers only), else None
+    """
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except exceptions.APIException:
+        return None
+
+    user = result[0] if result else None
+    if user is None or not user.is_superuser:
+        return None
+    return user
+
+def acquire_slot(user):
+    """
+    Count this profile against the user's PROFILING_RATE_LIMIT per PROFILING_RATE_WINDOW
+    The count lives in the shared cache (settings.CACHES), so the limit holds across
+    workers; a lock file in PROFILING_DIR makes the read-modify-write atomic, which
+    the database cache's incr() is not
+    """
+    window = settings.PROFILING_RATE_WINDOW
+    key = f'profiling-rate:{user.pk}:{int(time.time() // window)}'
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    with open(os.path.join(settings.PROFILING_DIR, 'rate.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        count = (cache.get(key) or 0) + 1
+        cache.set(key, count, window)
+    return count <= settings.PROFILING_RATE_LIMIT
+
+def profile_path(profile_id):
+    return os.path.join(settings.PROFILING_DIR, f'{profile_id}.prof')
+
+def _meta_path(profile_id):
+    return os.path.join(settings.PROFILING_DIR, f'{profile_id}.json')
+
+def save_profile(profiler, request, user, response, duration):
+    """
+    Dump profiler stats (pstats format: snakeviz, flameprof, gprof2dot) plus a small
+    metadata file, then trim old profiles
+    Returns: the profile id
+    """
+    profile_id = uuid.uuid4().hex
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id))
+
+    with open(_meta_path(profile_id), 'w') as handle:
+        json.dump({
+            'id': profile_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user_id': user.pk,
+            'duration_ms': round(duration * 1000, 2),
+            'created_at': time.time(),
+        }, handle)
+
+    enforce_retention()
+    return profile_id
+
+def load_profile_meta(profile_id):
+    try:
+        with open(_meta_path(profile_id)) as handle:
+            meta = json.load(handle)
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        meta['size'] = os.path.getsize(profile_path(profile_id))
+    except FileNotFoundError:
+        return None
+    return meta
+
+def list_profiles():
+    """Metadata of stored profiles, newest first"""
+    profiles = []
+    for path in glob.glob(os.path.join(settings.PROFILING_DIR, '*.prof')):
+        meta = load_profile_meta(os.path.splitext(os.path.basename(path))[0])
+        if meta is not None:
+            profiles.append(meta)
+    return sorted(profiles, key=lambda meta: meta['created_at'], reverse=True)
+
+def delete_profile(profile_id):
+    for path in (profile_path(profile_id), _meta_path(profile_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def enforce_retention():
+    """Delete the oldest profiles beyond PROFILING_MAX_FILES or PROFILING_MAX_BYTES"""
+    entries = []
+    for path in glob.glob(os.path.join(settings.PROFILING_DIR, '*.prof')):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, os.path.splitext(os.path.basename(path))[0]))
+
+    entries.sort(reverse=True)
+    kept_files = 0
+    kept_bytes = 0
+    for _mtime, size, profile_id in entries:
+        if kept_files < settings.PROFILING_MAX_FILES and kept_bytes + size <= settings.PROFILING_MAX_BYTES:
+            kept_files += 1
+            kept_bytes += size
+        else:
+            delete_profile(profile_id)
@@ -1,6 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import PurchaseRequest, Approval
+from django.conf import settings
+from django.urls import reverse
+from .authentication import make_file_token
+from .models import PurchaseRequest, Approval, ArchivedApproval, ArchivedPurchaseRequest, AuditEvent, UploadSession
+from .previews import PREVIEW_FIELDS, preview_urls
+from .uploads import CompletedUpload, uploaded_content_type
+
+DOCUMENT_CONTENT_TYPES = ['application/pdf', 'image/jpeg', 'image/png']
 
 User = get_user_model()
 
@@ -18,27 +25,64 @@ class ApprovalSerializer(serializers.ModelSerializer):
         fields = ['id', 'approver', 'action', 'level', 'comments', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+class ProtectedFileField(serializers.FileField):
+    """Represent a request document as its authorized download URL instead of the raw media URL"""
+    def to_representation(self, value):
+        if not value:
+            return None
+        
+        url = reverse('purchaserequest-files', kwargs={'pk': value.instance.pk, 'field': self.source})
+        request = self.context.get('request', None)
+        if request is None:
+            return url
+        
+        if request.user and request.user.is_authenticated:
+            url = f"{url}?token={make_file_token(request.user, value.instance.pk, self.source)}"
+        return request.build_absolute_uri(url)
+
 class PurchaseRequestSerializer(serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
     approvals = ApprovalSerializer(many=True, read_only=True)
-    proforma = serializers.FileField(required=False)
-    receipt = serializers.FileField(required=False)
+    proforma = ProtectedFileField(required=False)
+    purchase_order = ProtectedFileField(read_only=True)
+    receipt = ProtectedFileField(required=False)
+    previews = serializers.SerializerMethodField()
+    # Whether extraction stopped early; the *_reason fields say which budget ran out
+    proforma_truncated = serializers.SerializerMethodField()
+    receipt_truncated = serializers.SerializerMethodField()
     
     class Meta:
         model = PurchaseRequest
         fields = [
             'id', 'title', 'description', 'amount', 'status',
             'created_by', 'proforma', 'purchase_order', 'receipt',
-            'vendor_name', 'extracted_items', 'receipt_validated',
-            'validation_errors', 'approvals', 'created_at', 
-            'updated_at', 'approved_at', 'rejected_at'
+            'vendor_name', 'vendor', 'extracted_items', 'proforma_truncated',
+            'proforma_truncated_reason', 'receipt_validated', 'validation_errors',
+            'receipt_truncated', 'receipt_truncated_reason', 'approvals', 'previews',
+            'created_at', 'updated_at', 'approved_at', 'rejected_at'
         ]
         read_only_fields = [
-            'id', 'status', 'purchase_order', 'vendor_name', 
-            'extracted_items', 'receipt_validated', 'validation_errors',
+            'id', 'status', 'purchase_order', 'vendor_name', 'vendor',
+            'extracted_items', 'proforma_truncated_reason', 'receipt_validated',
+            'validation_errors', 'receipt_truncated_reason',
             'created_at', 'updated_at', 'approved_at', 'rejected_at'
         ]
     
+    def get_proforma_truncated(self, obj):
+        return bool(obj.proforma_truncated_reason)
+    
+    def get_receipt_truncated(self, obj):
+        return bool(obj.receipt_truncated_reason)
+    
+    def get_previews(self, obj):
+        request = self.context.get('request', None)
+        previews = {}
+        for field in PREVIEW_FIELDS:
+            urls = preview_urls(getattr(obj, field), request)
+            if urls:
+                previews[field] = urls
+        return previews
+    
     def validate_amount(self, value):
         if value <= 0:
             raise serializers.ValidationError("Amount must be greater than zero")
@@ -52,15 +96,94 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
             )
         return data
 
+class ArchivedApprovalSerializer(ApprovalSerializer):
+    class Meta(ApprovalSerializer.Meta):
+        model = ArchivedApproval
+
+class ArchivedPurchaseRequestSerializer(PurchaseRequestSerializer):
+    """Read-only representation of an archived request, in the same shape as a live one"""
+    approvals = ArchivedApprovalSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = ArchivedPurchaseRequest
+        fields = PurchaseRequestSerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    actor = UserSerializer(read_only=True)
+    
+    class Meta:
+        model = AuditEvent
+        fields = ['id', 'request_id', 'action', 'actor', 'actor_id', 'changes', 'created_at']
+        read_only_fields = fields
+
+def resolve_upload_session(serializer, upload_id):
+    """Turn a completed chunked upload id into a file the model can save"""
+    request = serializer.context.get('request', None)
+    session = UploadSession.objects.filter(
+        id=upload_id,
+        user=getattr(request, 'user', None),
+        status='complete'
+    ).first()
+    
+    if session is None:
+        raise serializers.ValidationError("Upload not found or not complete")
+    
+    if session.content_type not in DOCUMENT_CONTENT_TYPES:
+        raise serializers.ValidationError(
+            "Only PDF and image files (JPEG, PNG) are allowed"
+        )
+    
+    serializer.upload_session = session
+    serializer.completed_upload = CompletedUpload(session)
+    return serializer.completed_upload
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'total_size', 'received_size', 'status',
+            'sha256', 'content_type', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'received_size', 'status', 'sha256', 'content_type',
+            'created_at', 'updated_at'
+        ]
+    
+    def validate_total_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be greater than zero")
+        if value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"File size cannot exceed {settings.CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)}MB"
+            )
+        return value
+
 class PurchaseRequestCreateSerializer(serializers.ModelSerializer):
+    proforma_upload = serializers.UUIDField(required=False, write_only=True)
+    
     class Meta:
         model = PurchaseRequest
-        fields = ['title', 'description', 'amount', 'proforma']
+        fields = ['title', 'description', 'amount', 'proforma', 'proforma_upload']
         
     def validate_amount(self, value):
         if value <= 0:
             raise serializers.ValidationError("Amount must be greater than zero")
         return value
+    
+    def validate(self, data):
+        # A large proforma can be sent in chunks first and referenced by id
+        upload_id = data.pop('proforma_upload', None)
+        if upload_id:
+            if data.get('proforma'):
+                raise serializers.ValidationError("Send either proforma or proforma_upload, not both")
+            data['proforma'] = resolve_upload_session(self, upload_id)
+        return data
+    
+    def to_representation(self, instance):
+        # Respond with the full request as the read endpoints do, so file links go
+        # through the authorized files endpoint rather than the (unserved) media URL
+        return PurchaseRequestSerializer(instance, context=self.context).data
 
 class ApprovalActionSerializer(serializers.Serializer):
     action = serializers.ChoiceField(choices=['approve', 'reject'])
@@ -74,18 +197,31 @@ class ApprovalActionSerializer(serializers.Serializer):
         return data
 
 class ReceiptUploadSerializer(serializers.Serializer):
-    receipt = serializers.FileField()
+    receipt = serializers.FileField(required=False)
+    receipt_upload = serializers.UUIDField(required=False)
     
     def validate_receipt(self, value):
         # Validate file size (max 10MB)
         if value.size > 10 * 1024 * 1024:
             raise serializers.ValidationError("File size cannot exceed 10MB")
         
-        # Validate file type
-        allowed_types = ['application/pdf', 'image/jpeg', 'image/png', 'image/jpg']
-        if value.content_type not in allowed_types:
+        # Validate file type from its content, not the client's header
+        if uploaded_content_type(value) not in DOCUMENT_CONTENT_TYPES:
             raise serializers.ValidationError(
                 "Only PDF and image files (JPEG, PNG) are allowed"
             )
         
-        return value
\ No newline at end of file
+        return value
+    
+    def validate(self, data):
+        # Large multi-page scans can be sent in chunks first and referenced by id
+        upload_id = data.pop('receipt_upload', None)
+        if upload_id:
+            if data.get('receipt'):
+                raise serializers.ValidationError("Send either receipt or receipt_upload, not both")
+            data['receipt'] = resolve_upload_session(self, upload_id)
+        
+        if not data.get('receipt'):
+            raise serializers.ValidationError({'receipt': 'No file was submitted.'})
+        
+        return data
\ No newline at end of file
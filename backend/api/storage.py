@@ -0,0 +1,74 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = 'blobs'
+
+BLOB_NAME_RE = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?P<ext>\.[a-z0-9]{1,8})?$')
+
+def content_digest(content):
+    """SHA-256 of a File, reusing the digest computed while it was uploaded"""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return hasher.hexdigest()
+
+def blob_name(digest, original_name):
+    ext = os.path.splitext(original_name or '')[1].lower()
+    if not re.match(r'^\.[a-z0-9]{1,8}$', ext):
+        ext = ''
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+def blob_digest(name):
+    """SHA-256 encoded in a stored name, or None for files saved before content addressing"""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group('digest') if match else None
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file by the SHA-256 of its content
+    Saving content that is already stored is a no-op that returns the existing name,
+    so duplicate uploads and identical regenerated documents share one blob.
+    Unreferenced blobs are reclaimed by `manage.py gc_media`.
+    """
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        target = blob_name(content_digest(content), name)
+        if self.exists(target):
+            # Refresh mtime so gc_media's min-age grace period protects the new reference
+            os.utime(self.path(target))
+            return target
+
+        saved = self._save(target, content)
+        if saved != target:
+            # Lost a race with an identical upload; keep the first copy
+            self.delete(saved)
+        return target
+
+    def delete(self, name):
+        # Blobs are shared between references; only gc_media removes them
+        if blob_digest(name):
+            return
+        super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+document_storage = ContentAddressedStorage()
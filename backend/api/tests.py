@@ -1,3 +1,1230 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from multiprocessing.connection import Listener
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.db_router import ReplicaRouter, read_from_replica
+
+from api.archive import archive_batch
+from api.audit import audit_batch, record
+from api.authentication import make_file_token
+from api.load_data import VENDORS, create_users, delete_load_data, seed_end_date, seed_requests
+from api.loadtest import Stats, endpoint_name, percentile, run_load_test
+from api.management.base import MaintenanceCommand
+from api.mixins import is_pinned_to_primary, pin_to_primary
+from api.models import (
+    Approval, ArchivedApproval, ArchivedPurchaseRequest, AuditEvent, DocumentFingerprint, LineItem, PurchaseRequest,
+    SpendRollup, UploadSession, User,
+)
+from api.storage import blob_digest
+from api.uploads import (
+    CompletedUpload, HashingTemporaryFileUploadHandler, finalize_upload, sniff_content_type, upload_part_path,
+    uploaded_content_type,
+)
+from services import document_service, documents, metrics
+from services.analytics import rebuild_rollups, spend_series
+from services.document_service import WorkerPool, _Worker
+from services.duplicates import find_duplicates
+from services.extraction_budget import ExtractionBudget, extract_pdf_text
+from services.line_items import item_name_filter, sync_line_items
+from services.preview_generator import generate_previews
+from services.vendors import resolve_vendor
+
+class IsolatedTestCase(TestCase):
+    """
+    Points MEDIA_ROOT (blobs, previews, chunked uploads), METRICS_DIR and PROFILING_DIR
+    at a scratch directory per test class, so test runs never write into the real ones
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls._scratch = tempfile.mkdtemp()
+        cls._scratch_settings = override_settings(
+            MEDIA_ROOT=os.path.join(cls._scratch, 'media'),
+            CHUNKED_UPLOAD_DIR=os.path.join(cls._scratch, 'media', 'chunked_uploads'),
+            METRICS_DIR=os.path.join(cls._scratch, 'metrics'),
+            PROFILING_DIR=os.path.join(cls._scratch, 'profiles'),
+        )
+        cls._scratch_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._scratch_settings.disable()
+        shutil.rmtree(cls._scratch, ignore_errors=True)
+
+class RebuildRollupsTests(IsolatedTestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+
+    def approve(self, amount):
+        return PurchaseRequest.objects.create(
+            title='Laptop',
+            description='For the new hire',
+            amount=Decimal(amount),
+            created_by=self.staff,
+            status='approved',
+            approved_at=timezone.now()
+        )
+
+    def test_archived_spend_survives_rebuild(self):
+        purchase_request = self.approve('1500.00')
+        PurchaseRequest.objects.filter(id=purchase_request.id).update(created_at=timezone.now() - timedelta(days=2))
+
+        call_command('archive_requests', '--older-than', '1', stdout=StringIO())
+        self.assertFalse(PurchaseRequest.objects.exists())
+        self.assertTrue(ArchivedPurchaseRequest.objects.filter(id=purchase_request.id).exists())
+
+        rebuild_rollups()
+
+        self.assertEqual(spend_series(months=1)[0]['total'], Decimal('1500.00'))
+        self.assertEqual(
+            SpendRollup.objects.get(dimension='requester', key=str(self.staff.id)).request_count, 1
+        )
+
+    def test_live_and_archived_spend_are_summed(self):
+        archived = self.approve('1500.00')
+        PurchaseRequest.objects.filter(id=archived.id).update(created_at=timezone.now() - timedelta(days=2))
+        call_command('archive_requests', '--older-than', '1', stdout=StringIO())
+        self.approve('250.00')
+
+        rebuild_rollups()
+
+        month = spend_series(months=1)[0]
+        self.assertEqual(month['total'], Decimal('1750.00'))
+        self.assertEqual(month['count'], 2)
+
+class FindDuplicatesTests(IsolatedTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='staff1', password='pass', role='staff')
+        self.other = User.objects.create_user(username='staff2', password='pass', role='staff')
+
+    def fingerprint(self, user, title):
+        purchase_request = PurchaseRequest.objects.create(
+            title=title, description='d', amount=Decimal('10.00'), created_by=user
+        )
+        return DocumentFingerprint.objects.create(
+            request=purchase_request, kind='proforma', sha256='a' * 64, minhash=[], image_hash=''
+        )
+
+    def test_matches_outside_visible_requests_are_redacted(self):
+        self.fingerprint(self.owner, 'T')
+        own = self.fingerprint(self.other, 'Mine')
+        fingerprint = self.fingerprint(self.other, 'New')
+
+        duplicates = find_duplicates(fingerprint, PurchaseRequest.objects.filter(created_by=self.other))
+
+        matches = sorted(((d['request_id'] or 0), d['title']) for d in duplicates)
+        self.assertEqual(matches, [(0, None), (own.request_id, 'Mine')])
+
+REPLICA = 'replica_0'
+
+class ReplicaRoutingTests(IsolatedTestCase):
+    """
+    Routing against two local databases: the test database and an in-memory SQLite
+    replica. The replica is added after TestCase has set up its own databases, so it
+    is not wrapped in the per-test transaction; setUp clears it instead
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        replica = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        with warnings.catch_warnings():
+            # Overriding DATABASES only affects the router's replica list here
+            warnings.simplefilter('ignore')
+            cls._databases = override_settings(DATABASES={**settings.DATABASES, REPLICA: replica})
+            cls._databases.enable()
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': connections.settings['default'],
+            REPLICA: dict(replica),
+        })[REPLICA]
+
+        # The router keeps migrations off replicas; build this one's schema directly
+        with mock.patch.object(ReplicaRouter, 'allow_migrate', return_value=True):
+            call_command('migrate', database=REPLICA, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        # In-memory SQLite ignores close(); dropping the wrapper discards the database
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls._databases.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        PurchaseRequest.objects.using(REPLICA).all().delete()
+        User.objects.using(REPLICA).all().delete()
+
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.staff.save(using=REPLICA)
+        # Different rows on each side show which database answered
+        PurchaseRequest.objects.create(title='On primary', description='d', amount=Decimal('10.00'), created_by=self.staff)
+        PurchaseRequest(title='On replica', description='d', amount=Decimal('10.00'), created_by=self.staff).save(using=REPLICA)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def titles(self):
+        response = self.client.get('/api/requests/')
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.json()['results']['data']]
+
+    def test_replica_read_actions_use_the_replica(self):
+        self.assertEqual(self.titles(), ['On replica'])
+
+    def test_writes_go_to_the_primary(self):
+        response = self.client.post('/api/requests/', {'title': 'New', 'description': 'd', 'amount': '5.00'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(PurchaseRequest.objects.using('default').filter(title='New').exists())
+        self.assertFalse(PurchaseRequest.objects.using(REPLICA).filter(title='New').exists())
+        self.assertEqual(ReplicaRouter().db_for_write(PurchaseRequest), 'default')
+
+    def test_pin_is_kept_in_the_shared_database_cache(self):
+        pin_to_primary(self.staff)
+
+        # Stored where every worker reads it, and read from the primary even while
+        # the request's reads are routed to the replica
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_cache')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        with read_from_replica():
+            self.assertTrue(is_pinned_to_primary(self.staff))
+
+    def test_reads_after_a_write_are_pinned_to_the_primary(self):
+        self.client.post('/api/requests/', {'title': 'New', 'description': 'd', 'amount': '5.00'})
+
+        self.assertEqual(sorted(self.titles()), ['New', 'On primary'])
+
+        cache.clear()
+        self.assertEqual(self.titles(), ['On replica'])
+
+def png_bytes():
+    output = BytesIO()
+    Image.new('RGB', (64, 64), 'white').save(output, format='PNG')
+    return output.getvalue()
+
+class CreateResponseTests(IsolatedTestCase):
+    def test_proforma_link_uses_the_files_endpoint(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        proforma = SimpleUploadedFile('quote.png', png_bytes(), content_type='image/png')
+        with mock.patch('api.views.process_proforma', return_value={'vendor_name': '', 'items': []}), \
+                mock.patch('api.views.schedule_previews'):
+            response = client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma': proforma
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()['data']
+        purchase_request = PurchaseRequest.objects.get()
+        self.assertEqual(data['id'], purchase_request.id)
+        self.assertIn(f'/api/requests/{purchase_request.id}/files/proforma/', data['proforma'])
+        self.assertNotIn('/media/', data['proforma'])
+
+    def test_failed_extraction_is_logged_and_the_request_still_created(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        proforma = SimpleUploadedFile('quote.png', png_bytes(), content_type='image/png')
+        with mock.patch('api.views.process_proforma', side_effect=RuntimeError('corrupt PDF')), \
+                mock.patch('api.views.schedule_previews'), \
+                self.assertLogs('api.views', 'ERROR') as logs:
+            response = client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma': proforma
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(f'Error processing proforma for request {response.json()["data"]["id"]}', logs.output[0])
+        self.assertIn('RuntimeError: corrupt PDF', logs.output[0])
+
+    def test_chunked_upload_is_closed_after_the_request(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        content = png_bytes()
+        session = UploadSession.objects.create(
+            user=staff, filename='quote.png', total_size=len(content), received_size=len(content), status='complete'
+        )
+        os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+        with open(upload_part_path(session), 'wb') as part:
+            part.write(content)
+        finalize_upload(session)
+        session.save()
+
+        opened = []
+        class TrackedUpload(CompletedUpload):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                opened.append(self)
+
+        with mock.patch('api.serializers.CompletedUpload', TrackedUpload), \
+                mock.patch('api.views.process_proforma', return_value={'vendor_name': '', 'items': []}), \
+                mock.patch('api.views.schedule_previews'):
+            response = client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma_upload': str(session.id)
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+        self.assertFalse(UploadSession.objects.filter(id=session.id).exists())
+
+    def test_idempotent_replay_re_serializes_the_request(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        def create(token):
+            proforma = SimpleUploadedFile('quote.png', png_bytes(), content_type='image/png')
+            with mock.patch('api.serializers.make_file_token', return_value=token), \
+                    mock.patch('api.views.process_proforma', return_value={'vendor_name': '', 'items': []}), \
+                    mock.patch('api.views.schedule_previews'):
+                return client.post('/api/requests/', {
+                    'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma': proforma
+                }, format='multipart', HTTP_IDEMPOTENCY_KEY='create-1')
+
+        first = create('first-token')
+        PurchaseRequest.objects.update(title='Laptop (edited)')
+        replay = create('second-token')
+
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(PurchaseRequest.objects.count(), 1)
+        data = replay.json()['data']
+        self.assertIn('token=first-token', first.json()['data']['proforma'])
+        self.assertIn('token=second-token', data['proforma'])
+        self.assertEqual(data['title'], 'Laptop (edited)')
+        self.assertEqual(data['duplicates'], [])
+
+    def test_truncated_extraction_is_reported(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        proforma = SimpleUploadedFile('quote.png', png_bytes(), content_type='image/png')
+        extracted = {'vendor_name': '', 'items': [], 'text': 'Page 1', 'truncated': True, 'truncated_reason': 'pages'}
+        with mock.patch('api.views.process_proforma', return_value=extracted), \
+                mock.patch('api.views.schedule_previews'):
+            response = client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma': proforma
+            }, format='multipart')
+
+        data = response.json()['data']
+        self.assertEqual((data['proforma_truncated'], data['proforma_truncated_reason']), (True, 'pages'))
+        data = client.get(f"/api/requests/{data['id']}/").json()['data']
+        self.assertEqual((data['proforma_truncated'], data['proforma_truncated_reason']), (True, 'pages'))
+        self.assertFalse(data['receipt_truncated'])
+
+class SeedLoadDataTests(IsolatedTestCase):
+    def seed(self):
+        user_ids = create_users(8, random.Random(7))
+        seed_requests(25, user_ids, seed=7, batch_size=10)
+        return list(PurchaseRequest.objects.order_by('id').values_list('amount', 'created_at', 'vendor__name'))
+
+    def test_same_seed_gives_the_same_rows(self):
+        first = self.seed()
+        delete_load_data()
+        second = self.seed()
+
+        self.assertEqual(first, second)
+        self.assertTrue(all(created_at <= seed_end_date(7) for _, created_at, _ in first))
+
+    def test_requests_are_linked_to_vendors(self):
+        self.seed()
+
+        self.assertFalse(PurchaseRequest.objects.filter(vendor__isnull=True).exists())
+        self.assertEqual(
+            set(PurchaseRequest.objects.values_list('vendor__name', flat=True)) - set(VENDORS), set()
+        )
+
+class SearchTests(IsolatedTestCase):
+    def test_query_matches_requester_username(self):
+        alice = User.objects.create_user(username='alice', password='pass', role='staff')
+        bob = User.objects.create_user(username='bob', password='pass', role='staff')
+        approver = User.objects.create_user(username='approver', password='pass', role='approver_level_1')
+        PurchaseRequest.objects.create(title='Laptop', description='d', amount=Decimal('10.00'), created_by=alice)
+        PurchaseRequest.objects.create(title='Chairs', description='d', amount=Decimal('10.00'), created_by=bob)
+
+        client = APIClient()
+        client.force_authenticate(approver)
+        response = client.get('/api/requests/', {'q': 'ali'})
+
+        self.assertEqual([row['title'] for row in response.json()['results']['data']], ['Laptop'])
+
+class SyncLineItemsTests(IsolatedTestCase):
+    def setUp(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.purchase_request = PurchaseRequest.objects.create(
+            title='Office', description='d', amount=Decimal('10.00'), created_by=staff,
+            extracted_items=[
+                {'name': 'Laptop', 'quantity': 1, 'price': 900},
+                {'name': 'Monitor', 'quantity': 2, 'price': 200},
+                {'name': 'Desk', 'quantity': 1, 'price': 300},
+            ]
+        )
+        sync_line_items(self.purchase_request)
+        self.ids = {item.name: item.id for item in self.purchase_request.line_items.all()}
+
+    def resync(self, items):
+        self.purchase_request.extracted_items = items
+        return sync_line_items(self.purchase_request)
+
+    def test_inserting_an_item_only_adds_it(self):
+        changes = self.resync([
+            {'name': 'Docking station', 'quantity': 1, 'price': 150},
+            {'name': 'Laptop', 'quantity': 1, 'price': 900},
+            {'name': 'Monitor', 'quantity': 2, 'price': 200},
+            {'name': 'Desk', 'quantity': 1, 'price': 300},
+        ])
+
+        self.assertEqual(changes, {'added': 1, 'changed': 0, 'moved': 3, 'removed': 0})
+        items = list(self.purchase_request.line_items.order_by('position'))
+        self.assertEqual([item.name for item in items], ['Docking station', 'Laptop', 'Monitor', 'Desk'])
+        self.assertEqual({item.name: item.id for item in items[1:]}, self.ids)
+
+    def test_item_filter_matches_word_starts(self):
+        self.resync([
+            {'name': 'Dell Laptop', 'quantity': 1, 'price': 900},
+            {'name': 'Laptop stand', 'quantity': 1, 'price': 40},
+            {'name': 'Overlaptop', 'quantity': 1, 'price': 1},
+        ])
+        client = APIClient()
+        client.force_authenticate(self.purchase_request.created_by)
+
+        response = client.get('/api/requests/items/', {'name': 'lapt'})
+        names = sorted(row['normalized_name'] for row in response.json()['results']['data'])
+        self.assertEqual(names, ['dell laptop', 'laptop stand'])
+
+        response = client.get('/api/requests/', {'item': 'laptop'})
+        self.assertEqual([row['id'] for row in response.json()['results']['data']], [self.purchase_request.id])
+
+    def test_punctuation_only_item_filter_is_ignored(self):
+        self.assertIsNone(item_name_filter(' -- '))
+
+        client = APIClient()
+        client.force_authenticate(self.purchase_request.created_by)
+        response = client.get('/api/requests/', {'item': '?!'})
+        self.assertEqual([row['id'] for row in response.json()['results']['data']], [self.purchase_request.id])
+
+    def test_price_change_updates_the_matching_row(self):
+        changes = self.resync([
+            {'name': 'Laptop', 'quantity': 1, 'price': 950},
+            {'name': 'Desk', 'quantity': 1, 'price': 300},
+        ])
+
+        self.assertEqual(changes, {'added': 0, 'changed': 1, 'moved': 1, 'removed': 1})
+        laptop = self.purchase_request.line_items.get(name='Laptop')
+        self.assertEqual((laptop.id, laptop.unit_price), (self.ids['Laptop'], Decimal('950.00')))
+
+class MetricsCompactionTests(IsolatedTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        directory = override_settings(METRICS_DIR=self.directory)
+        directory.enable()
+        self.addCleanup(directory.disable)
+        # Compact only when the test asks to
+        interval = mock.patch.object(metrics, 'COMPACT_INTERVAL', float('inf'))
+        interval.start()
+        self.addCleanup(interval.stop)
+
+    def write(self, pid, values):
+        with open(os.path.join(self.directory, f'{pid}-0.json'), 'w') as handle:
+            json.dump({'pid': pid, 'values': values}, handle)
+
+    def exited_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def test_exited_processes_are_folded_into_the_archive(self):
+        histogram = [[1] + [0] * (len(metrics.DURATION_BUCKETS) - 1), 0.001, 1]
+        for _ in range(2):
+            self.write(self.exited_pid(), [
+                ['llm_errors_total', {}, 2],
+                ['ocr_seconds', {'file_type': 'png'}, histogram],
+                ['background_queue_depth', {}, 5],
+            ])
+        self.write(os.getppid(), [['llm_errors_total', {}, 1]])
+        before = metrics.collect()
+
+        self.assertEqual(metrics.compact(), 2)
+
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([
+            f'{os.getppid()}-0.json', f'{os.getpid()}-{int(metrics._started)}.json', 'archive.json', 'archive.lock'
+        ]))
+        after = metrics.collect()
+        self.assertEqual(after, before)
+        self.assertEqual(after[('llm_errors_total', ())], 5)
+        self.assertEqual(after[('ocr_seconds', (('file_type', 'png'),))][2], 2)
+        self.assertNotIn(('background_queue_depth', ()), after)
+
+        # Nothing left to fold; totals stay put
+        self.assertEqual(metrics.compact(), 0)
+        self.assertEqual(metrics.collect(), before)
+
+class MetricsEndpointTests(IsolatedTestCase):
+    def test_refused_without_a_token_unless_debugging(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+
+        metrics.inc('llm_errors_total')
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE llm_errors_total counter', response.content.decode())
+
+class MaintenanceCommandTests(IsolatedTestCase):
+    def test_statement_timeout_is_lifted_for_the_command(self):
+        statements = []
+
+        class Command(MaintenanceCommand):
+            def handle(self, *args, **options):
+                statements.append('handle')
+
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.execute.side_effect = statements.append
+        connection.ensure_connection()
+        with mock.patch('api.management.base._is_postgres', return_value=True), \
+                mock.patch.object(connection, 'cursor', return_value=cursor):
+            call_command(Command())
+
+        self.assertEqual(statements, ['SET statement_timeout = 0', 'handle', 'RESET statement_timeout'])
+
+class IdempotencyTests(IsolatedTestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.purchase_request = PurchaseRequest.objects.create(
+            title='Laptop', description='d', amount=Decimal('10.00'), created_by=self.staff, status='approved'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def submit_receipt(self):
+        receipt = SimpleUploadedFile('receipt.png', png_bytes(), content_type='image/png')
+        return self.client.post(
+            f'/api/requests/{self.purchase_request.id}/submit_receipt/', {'receipt': receipt},
+            format='multipart', HTTP_IDEMPOTENCY_KEY='receipt-1'
+        )
+
+    def test_partial_result_is_not_replayed(self):
+        validated = {'is_valid': True, 'errors': [], 'text': ''}
+        with mock.patch('api.views.validate_receipt', side_effect=[RuntimeError('OCR crashed'), validated]) as validate, \
+                mock.patch('api.views.schedule_previews'):
+            first = self.submit_receipt()
+            retry = self.submit_receipt()
+
+        self.assertEqual(first.status_code, 206)
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(validate.call_count, 2)
+
+    def test_success_is_replayed(self):
+        validated = {'is_valid': True, 'errors': [], 'text': ''}
+        with mock.patch('api.views.validate_receipt', return_value=validated) as validate, \
+                mock.patch('api.views.schedule_previews'):
+            self.submit_receipt()
+            replay = self.submit_receipt()
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(validate.call_count, 1)
+        self.assertEqual(replay.json()['data']['request']['id'], self.purchase_request.id)
+
+class PreviewTests(IsolatedTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.other = User.objects.create_user(username='staff2', password='pass', role='staff')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+        proforma = SimpleUploadedFile('quote.png', png_bytes(), content_type='image/png')
+        with mock.patch('api.views.process_proforma', return_value={'vendor_name': '', 'items': []}), \
+                mock.patch('api.views.schedule_previews'):
+            data = self.client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma': proforma
+            }, format='multipart').json()['data']
+        self.purchase_request = PurchaseRequest.objects.get(id=data['id'])
+        self.digest = blob_digest(self.purchase_request.proforma.name)
+        generate_previews(self.digest, self.purchase_request.proforma.path)
+
+    def preview_links(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f'/api/requests/{self.purchase_request.id}/').json()['data']['previews']['proforma']
+
+    def test_token_link_serves_pages_without_other_auth(self):
+        links = self.preview_links(self.owner)
+        anonymous = APIClient()
+
+        manifest = anonymous.get(links['pages'])
+        self.assertEqual(manifest.status_code, 200)
+        self.assertEqual(manifest.json()['data']['page_count'], 1)
+        self.assertEqual(anonymous.get(links['thumbnail']).status_code, 200)
+        self.assertEqual(anonymous.get(manifest.json()['data']['pages'][0]).status_code, 200)
+
+    def test_links_without_a_valid_token_are_refused(self):
+        links = self.preview_links(self.owner)
+        anonymous = APIClient()
+        base = links['thumbnail'].split('?')[0]
+
+        self.assertIn(anonymous.get(base).status_code, (401, 403))
+        self.assertIn(anonymous.get(f'{base}?token=forged').status_code, (401, 403))
+        with override_settings(MEDIA_TOKEN_MAX_AGE=-1):
+            self.assertIn(anonymous.get(links['thumbnail']).status_code, (401, 403))
+
+        # A token only opens the document it was issued for
+        other_digest = 'f' * 64
+        self.assertIn(anonymous.get(links['thumbnail'].replace(self.digest, other_digest)).status_code, (401, 403))
+
+    def test_access_ends_when_the_user_can_no_longer_view_the_request(self):
+        links = self.preview_links(self.owner)
+        PurchaseRequest.objects.filter(id=self.purchase_request.id).update(created_by=self.other)
+
+        self.assertEqual(APIClient().get(links['thumbnail']).status_code, 403)
+
+class AuditTests(IsolatedTestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_history_lists_changes_newest_first(self):
+        request_id = self.client.post('/api/requests/', {
+            'title': 'Laptop', 'description': 'd', 'amount': '10.00'
+        }).json()['data']['id']
+        self.client.patch(f'/api/requests/{request_id}/', {'amount': '12.50'})
+
+        response = self.client.get(f'/api/requests/{request_id}/history/')
+
+        events = response.json()['results']['data']
+        self.assertEqual([event['action'] for event in events], ['updated', 'created'])
+        self.assertEqual(events[0]['changes'], {'amount': ['10.00', '12.50']})
+        self.assertEqual(events[0]['actor']['username'], 'staff')
+
+    def test_events_roll_back_with_their_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            record('updated', 1, self.staff, {'amount': ['1', '2']})
+            raise RuntimeError('approval failed')
+
+        self.assertFalse(AuditEvent.objects.exists())
+
+    def test_batch_inside_a_transaction_is_written_before_commit(self):
+        with transaction.atomic():
+            with audit_batch():
+                record('archived', 1)
+                record('archived', 2)
+            # Already in the table while the transaction is still open
+            self.assertEqual(AuditEvent.objects.count(), 2)
+
+    def test_failed_write_after_commit_is_logged_with_the_events(self):
+        with mock.patch('api.audit.connection') as audit_connection, \
+                mock.patch.object(AuditEvent.objects, 'bulk_create', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('api.audit', 'ERROR') as logs:
+            audit_connection.in_atomic_block = False
+            with audit_batch():
+                record('deleted', 7, self.staff, {'status': 'pending'})
+
+        self.assertIn('"request_id": 7', logs.output[0])
+        self.assertIn('"action": "deleted"', logs.output[0])
+
+class ProfilingTests(IsolatedTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', email='a@example.com')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def test_profile_is_saved_and_downloadable(self):
+        response = self.client.get('/api/requests/', HTTP_X_PROFILE='1')
+
+        profile_id = response['X-Profile-Id']
+        download = self.client.get(f'/api/profiles/{profile_id}/')
+        self.assertEqual(download.status_code, 200)
+        self.assertGreater(len(b''.join(download.streaming_content)), 0)
+        download.close()
+
+    def test_non_superusers_are_not_profiled(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(staff)}')
+
+        self.assertNotIn('X-Profile-Id', client.get('/api/requests/', HTTP_X_PROFILE='1'))
+
+    @override_settings(PROFILING_RATE_LIMIT=2)
+    def test_rate_limit_is_kept_in_the_shared_cache(self):
+        profiled = [
+            'X-Profile-Id' in self.client.get('/api/requests/', HTTP_X_PROFILE='1')
+            for _ in range(3)
+        ]
+
+        self.assertEqual(profiled, [True, True, False])
+        # Another worker reads the same count from the database cache table
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_cache WHERE cache_key LIKE %s', ['%profiling-rate%'])
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+class ExportTests(IsolatedTestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        PurchaseRequest.objects.create(
+            title='=HYPERLINK("http://evil")', description='-2+3', amount=Decimal('-5.00'), created_by=self.staff
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_csv_quotes_cells_that_start_a_formula(self):
+        response = self.client.get('/api/requests/export/')
+
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'description'])
+        self.assertEqual(rows[1][1:4], ['\'=HYPERLINK("http://evil")', "'-2+3", '-5.00'])
+
+    def test_xlsx_rows_match_the_csv(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/api/requests/export/', {'export_format': 'xlsx'})
+
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][1], 'title')
+        self.assertEqual(rows[1][1], '\'=HYPERLINK("http://evil")')
+
+    def test_xlsx_without_openpyxl_is_a_clear_400(self):
+        with mock.patch.dict(sys.modules, {'openpyxl': None}):
+            response = self.client.get('/api/requests/export/', {'export_format': 'xlsx'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'XLSX export requires openpyxl to be installed')
+
+def pdf_bytes(width, height, text):
+    from reportlab.pdfgen import canvas
+
+    output = BytesIO()
+    pdf = canvas.Canvas(output, pagesize=(width, height))
+    pdf.drawString(20, height - 40, text)
+    pdf.save()
+    return output.getvalue()
+
+class ExtractionBudgetTests(IsolatedTestCase):
+    def write_pdf(self, width, height, text):
+        path = os.path.join(self._scratch, 'page.pdf')
+        with open(path, 'wb') as handle:
+            handle.write(pdf_bytes(width, height, text))
+        return path
+
+    @override_settings(EXTRACTION_MAX_PIXELS=1_000_000)
+    def test_large_pdf_pages_keep_their_text_layer(self):
+        path = self.write_pdf(2000, 2000, 'Invoice total 42')
+        budget = ExtractionBudget()
+
+        self.assertIn('Invoice total 42', extract_pdf_text(path, budget))
+        self.assertFalse(budget.truncated)
+
+    @override_settings(EXTRACTION_MAX_PIXELS=1_000_000)
+    def test_preview_pages_are_rendered_within_the_pixel_budget(self):
+        path = self.write_pdf(100, 5000, 'Receipt')
+
+        self.assertEqual(generate_previews('ab' * 32, path), {'page_count': 1})
+        with Image.open(os.path.join(settings.MEDIA_ROOT, 'previews', 'ab', 'ab' * 32, 'page-1.webp')) as page:
+            # 800 px wide would be 800x40000; pdfium rounds the clamped size up to whole pixels
+            self.assertAlmostEqual(page.width * page.height, 1_000_000, delta=10_000)
+
+class VendorTests(IsolatedTestCase):
+    def test_spellings_resolve_to_one_vendor(self):
+        vendor = resolve_vendor('Acme Office Supplies Ltd')
+
+        self.assertEqual(resolve_vendor('ACME office supplies, Inc.'), vendor)
+        # Near match: joins the vendor and is remembered as another alias
+        self.assertEqual(resolve_vendor('Acme Office Suplies'), vendor)
+        self.assertEqual(
+            sorted(vendor.aliases.values_list('normalized_alias', flat=True)),
+            ['acme office suplies', 'acme office supplies']
+        )
+        self.assertNotEqual(resolve_vendor('Globex'), vendor)
+        self.assertIsNone(resolve_vendor(' - '))
+
+    def test_search_returns_each_vendor_once(self):
+        acme = resolve_vendor('Acme Office Supplies')
+        resolve_vendor('Acme Office Suplies')
+        resolve_vendor('Globex')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='staff', password='pass', role='staff'))
+
+        response = client.get('/api/vendors/search/', {'q': 'acme off'})
+
+        self.assertEqual([vendor['id'] for vendor in response.json()['data']], [acme.id])
+
+class MediaServingTests(IsolatedTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        self.content = png_bytes()
+
+        proforma = SimpleUploadedFile('quote.png', self.content, content_type='image/png')
+        with mock.patch('api.views.process_proforma', return_value={'vendor_name': '', 'items': []}), \
+                mock.patch('api.views.schedule_previews'):
+            data = client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma': proforma
+            }, format='multipart').json()['data']
+        self.purchase_request = PurchaseRequest.objects.get(id=data['id'])
+        self.url = data['proforma']
+        self.etag = f'"{blob_digest(self.purchase_request.proforma.name)}"'
+        # The token link is all a browser needs
+        self.client = APIClient()
+
+    def body(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_full_download_carries_the_content_hash_as_etag(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), self.content)
+
+    def test_range_returns_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(self.content)}')
+        self.assertEqual(self.body(response), self.content[:10])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(self.body(response), self.content[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_conditional_requests(self):
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag).status_code, 304)
+
+        # A stale If-Range gets the whole file instead of a range of the new one
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.status_code, 206)
+        response.close()
+
+    def test_token_only_opens_the_file_it_was_issued_for(self):
+        token = make_file_token(self.owner, self.purchase_request.id, 'proforma')
+        base = f'/api/requests/{self.purchase_request.id}/files'
+
+        self.assertEqual(self.client.get(f'{base}/receipt/', {'token': token}).status_code, 401)
+        self.assertEqual(self.client.get(f'{base}/proforma/', {'token': token + 'x'}).status_code, 401)
+        self.assertEqual(self.client.get(f'{base}/proforma/').status_code, 401)
+
+    def test_token_of_a_user_who_cannot_view_is_refused(self):
+        other = User.objects.create_user(username='staff2', password='pass', role='staff')
+        token = make_file_token(other, self.purchase_request.id, 'proforma')
+
+        response = self.client.get(f'/api/requests/{self.purchase_request.id}/files/proforma/', {'token': token})
+
+        # Staff only see their own requests, so the request does not exist for them
+        self.assertEqual(response.status_code, 404)
+
+class UploadHandlerTests(IsolatedTestCase):
+    def test_handler_hashes_and_sniffs_while_streaming(self):
+        content = png_bytes()
+        handler = HashingTemporaryFileUploadHandler()
+        handler.new_file('proforma', 'quote.pdf', 'application/pdf', len(content))
+        for start in range(0, len(content), 7):
+            handler.receive_data_chunk(content[start:start + 7], start)
+
+        uploaded = handler.file_complete(len(content))
+
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(uploaded.sniffed_content_type, 'image/png')
+        self.assertEqual(uploaded_content_type(uploaded), 'image/png')
+        # Small files go to disk too, never into worker memory
+        self.assertTrue(os.path.exists(uploaded.temporary_file_path()))
+        uploaded.close()
+
+    def test_sniffing_ignores_the_file_name_and_header(self):
+        self.assertEqual(sniff_content_type(b'\r\n%PDF-1.7\n'), 'application/pdf')
+        self.assertEqual(sniff_content_type(b'\xff\xd8\xff\xe0JFIF'), 'image/jpeg')
+        self.assertEqual(sniff_content_type(b'MZ\x90\x00'), 'application/octet-stream')
+
+    def test_stored_blob_is_named_by_the_upload_hash(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        client = APIClient()
+        client.force_authenticate(staff)
+        content = png_bytes()
+
+        proforma = SimpleUploadedFile('quote.png', content, content_type='image/png')
+        with mock.patch('api.views.process_proforma', return_value={'vendor_name': '', 'items': []}), \
+                mock.patch('api.views.schedule_previews'), \
+                mock.patch('api.storage.hashlib') as storage_hashlib:
+            response = client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma': proforma
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(blob_digest(PurchaseRequest.objects.get().proforma.name), hashlib.sha256(content).hexdigest())
+        # Storage reused the digest computed while the upload streamed in
+        storage_hashlib.sha256.assert_not_called()
+
+    def test_receipt_type_is_checked_from_its_content(self):
+        staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        purchase_request = PurchaseRequest.objects.create(
+            title='Laptop', description='d', amount=Decimal('10.00'), created_by=staff, status='approved'
+        )
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        receipt = SimpleUploadedFile('receipt.pdf', b'MZ\x90\x00 not a pdf', content_type='application/pdf')
+        with mock.patch('api.views.validate_receipt') as validate:
+            response = client.post(
+                f'/api/requests/{purchase_request.id}/submit_receipt/', {'receipt': receipt}, format='multipart'
+            )
+
+        self.assertEqual(response.status_code, 400)
+        validate.assert_not_called()
+
+class ChunkedUploadTests(IsolatedTestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.content = png_bytes()
+        self.upload = self.client.post('/api/uploads/', {
+            'filename': 'quote.png', 'total_size': len(self.content)
+        }, format='json').json()['data']
+        self.url = f"/api/uploads/{self.upload['id']}/"
+
+    def send(self, start, end, offset=None):
+        return self.client.patch(
+            self.url, self.content[start:end], content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(start if offset is None else offset)
+        )
+
+    def test_upload_resumes_from_the_received_offset(self):
+        middle = len(self.content) // 2
+        self.assertEqual(self.send(0, middle).json()['data']['received_size'], middle)
+
+        # A retried chunk from the wrong offset is refused with the offset to resume from
+        mismatch = self.send(0, middle)
+        self.assertEqual(mismatch.status_code, 409)
+        self.assertEqual(mismatch.json()['data']['received_size'], middle)
+        self.assertEqual(self.client.get(self.url).json()['data']['received_size'], middle)
+
+        data = self.send(middle, len(self.content)).json()['data']
+        self.assertEqual(data['status'], 'complete')
+        self.assertEqual(data['sha256'], hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(data['content_type'], 'image/png')
+        self.assertEqual(self.send(0, 1, offset=len(self.content)).status_code, 409)
+
+    def test_chunk_past_the_declared_size_is_refused(self):
+        response = self.client.patch(
+            self.url, self.content + b'extra', content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UploadSession.objects.get().received_size, 0)
+
+    def test_sessions_are_private_to_their_user(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='staff2', password='pass', role='staff'))
+
+        self.assertEqual(other.get(self.url).status_code, 404)
+        self.assertEqual(other.patch(
+            self.url, self.content, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0'
+        ).status_code, 404)
+
+    def test_completed_upload_becomes_the_proforma(self):
+        self.send(0, len(self.content))
+
+        with mock.patch('api.views.process_proforma', return_value={'vendor_name': '', 'items': []}), \
+                mock.patch('api.views.schedule_previews'):
+            response = self.client.post('/api/requests/', {
+                'title': 'Laptop', 'description': 'd', 'amount': '10.00', 'proforma_upload': self.upload['id']
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        proforma = PurchaseRequest.objects.get().proforma
+        self.assertEqual(blob_digest(proforma.name), hashlib.sha256(self.content).hexdigest())
+        with proforma.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertFalse(os.listdir(settings.CHUNKED_UPLOAD_DIR))
+
+class LoadTestHarnessTests(IsolatedTestCase):
+    def run_against(self, handler, accounts, duration=0.2):
+        transport = httpx.MockTransport(handler)
+        client_class = httpx.AsyncClient
+        with mock.patch('api.loadtest.httpx.AsyncClient', lambda **kwargs: client_class(transport=transport, **kwargs)):
+            return asyncio.run(run_load_test(
+                'http://testserver', accounts, [('quote.png', png_bytes(), 'image/png')], duration, think_time=0.01
+            ))
+
+    def test_endpoints_are_grouped_without_ids(self):
+        self.assertEqual(endpoint_name('PATCH', '/api/requests/42/approve/?x=1'), 'PATCH /api/requests/{id}/approve/')
+
+    def test_percentiles_use_nearest_rank(self):
+        samples = [i / 1000 for i in range(1, 101)]
+
+        self.assertEqual(percentile(samples, 0.50), 0.05)
+        self.assertEqual(percentile(samples, 0.99), 0.099)
+        self.assertEqual(percentile([], 0.95), 0.0)
+
+    def test_report_counts_statuses_per_endpoint_and_in_total(self):
+        stats = Stats()
+        stats.record('GET /api/requests/', 0.010, 200)
+        stats.record('GET /api/requests/', 0.030, 500)
+        stats.record('POST /api/requests/', 0.020, 'error')
+
+        rows = {row['endpoint']: row for row in stats.report(2.0)}
+
+        self.assertEqual(rows['GET /api/requests/']['errors'], 1)
+        self.assertEqual(rows['POST /api/requests/']['errors'], 1)
+        self.assertEqual(rows['TOTAL']['count'], 3)
+        self.assertEqual(rows['TOTAL']['throughput'], 1.5)
+        self.assertEqual(rows['TOTAL']['p50_ms'], 20.0)
+
+    def test_virtual_users_replay_their_role_scenarios(self):
+        def handler(request):
+            if request.url.path == '/api/auth/login/':
+                return httpx.Response(200, json={'access': 'token'})
+            self.assertEqual(request.headers['Authorization'], 'Bearer token')
+            if request.method == 'GET' and request.url.path == '/api/requests/':
+                return httpx.Response(200, json={'results': {'data': [{'id': 7, 'approvals': []}]}})
+            return httpx.Response(200, json={'success': True})
+
+        rows = self.run_against(handler, [('staff', 'staff1', 'pw'), ('approver_level_1', 'approver1', 'pw')])
+
+        endpoints = {row['endpoint'] for row in rows}
+        self.assertTrue({
+            'POST /api/auth/login/', 'POST /api/requests/', 'POST /api/requests/{id}/submit_receipt/',
+            'PATCH /api/requests/{id}/approve/', 'TOTAL',
+        } <= endpoints)
+        self.assertEqual(rows[-1]['errors'], 0)
+
+    def test_run_fails_when_no_user_can_log_in(self):
+        with self.assertRaisesRegex(RuntimeError, 'Login failed for staff1'):
+            self.run_against(lambda request: httpx.Response(401), [('staff', 'staff1', 'wrong')])
+
+class DocumentLoadingTests(IsolatedTestCase):
+    def test_api_workers_do_not_import_document_libraries(self):
+        script = (
+            'import sys, django; django.setup(); import api.urls; '
+            'print(",".join(name for name in ("pdfplumber", "pytesseract", "pypdfium2", "reportlab", "PIL.Image") '
+            'if name in sys.modules))'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings'}, check=True
+        )
+
+        self.assertEqual(result.stdout.strip(), '')
+
+    @override_settings(DOCUMENT_SERVICE_SOCKET='')
+    def test_jobs_run_in_process_without_a_service(self):
+        with mock.patch('services.document_processor.process_proforma', return_value={'items': []}) as process:
+            self.assertEqual(documents.process_proforma('/tmp/quote.pdf', stream=b'%PDF-'), {'items': []})
+
+        process.assert_called_once_with('/tmp/quote.pdf', stream=b'%PDF-')
+
+class FakeWorker:
+    """Stands in for a document worker process in WorkerPool tests"""
+    def __init__(self, reply=('ok', None), release=None):
+        self.reply = reply
+        self.release = release
+        self.jobs = 0
+        self.dead = False
+        self.process = mock.Mock(**{'is_alive.return_value': True})
+        self.stop = mock.Mock()
+
+    def run(self, job, args, kwargs, timeout):
+        self.jobs += 1
+        if self.release is not None:
+            self.release.wait(5)
+        return self.reply
+
+class DocumentServiceTests(IsolatedTestCase):
+    def pool(self, workers, queue_size=0, max_tasks=10):
+        return WorkerPool(workers=workers, max_tasks=max_tasks, queue_size=queue_size, timeout=1, queue_wait=0.1)
+
+    def test_unavailable_service_falls_back_only_when_allowed(self):
+        missing = os.path.join(self._scratch, 'missing.sock')
+        with override_settings(DOCUMENT_SERVICE_SOCKET=missing, DOCUMENT_SERVICE_FALLBACK=True), \
+                mock.patch('services.document_processor.process_proforma', return_value={'items': []}), \
+                self.assertLogs('services.documents', 'WARNING'):
+            self.assertEqual(documents.process_proforma('/tmp/quote.pdf'), {'items': []})
+
+        with override_settings(DOCUMENT_SERVICE_SOCKET=missing, DOCUMENT_SERVICE_FALLBACK=False), \
+                self.assertRaises(document_service.DocumentServiceUnavailable):
+            documents.process_proforma('/tmp/quote.pdf')
+
+    def test_client_and_server_speak_over_the_socket(self):
+        address = os.path.join(self._scratch, 'documents.sock')
+        pool = mock.Mock(**{'submit.return_value': ('ok', {'vendor_name': 'Acme'})})
+        listener = Listener(address, family='AF_UNIX', authkey=document_service._authkey())
+
+        def reply(job, *args):
+            # One connection per job, handled as serve() does
+            accepting = threading.Thread(target=lambda: document_service._handle(pool, listener.accept()))
+            accepting.start()
+            try:
+                return document_service.call(job, *args)
+            finally:
+                accepting.join(5)
+
+        try:
+            with override_settings(DOCUMENT_SERVICE_SOCKET=address):
+                self.assertEqual(reply('process_proforma', '/tmp/quote.pdf'), {'vendor_name': 'Acme'})
+                pool.submit.assert_called_once_with('process_proforma', ('/tmp/quote.pdf',), {})
+
+                with self.assertRaisesRegex(document_service.DocumentJobFailed, 'Unknown document job'):
+                    reply('os.system', 'true')
+
+                pool.submit.return_value = ('busy', 'at capacity')
+                with self.assertRaises(document_service.DocumentServiceBusy):
+                    reply('validate_receipt', '/tmp/receipt.png', None)
+        finally:
+            listener.close()
+
+    def test_full_pool_refuses_jobs_after_the_queue_wait(self):
+        pool = self.pool(workers=1)
+        release = threading.Event()
+        pool.idle.put(FakeWorker(release=release))
+
+        running = threading.Thread(target=pool.submit, args=('process_proforma', (), {}))
+        running.start()
+        time.sleep(0.05)
+        status, message = pool.submit('validate_receipt', (), {})
+        release.set()
+        running.join()
+
+        self.assertEqual(status, 'busy')
+        self.assertIn('validate_receipt was not queued', message)
+        self.assertEqual(pool.submit('process_proforma', (), {}), ('ok', None))
+
+    def test_workers_are_replaced_after_max_tasks(self):
+        pool = self.pool(workers=1, max_tasks=2)
+        worker, replacement = FakeWorker(), FakeWorker()
+        pool.idle.put(worker)
+
+        with mock.patch.object(pool, '_spawn', return_value=replacement):
+            pool.submit('process_proforma', (), {})
+            pool.submit('process_proforma', (), {})
+            self.assertIs(pool.idle.get(timeout=5), replacement)
+
+        worker.stop.assert_called_once()
+
+    def test_stuck_job_is_killed_after_the_timeout(self):
+        parent, child = multiprocessing.Pipe()
+        process = mock.Mock(exitcode=None)
+        worker = _Worker(process, parent)
+
+        status, message = worker.run('process_proforma', ('/tmp/quote.pdf',), {}, timeout=0.1)
+
+        self.assertEqual(status, 'timeout')
+        self.assertTrue(worker.dead)
+        process.kill.assert_called_once()
+        self.assertEqual(child.recv(), ('process_proforma', ('/tmp/quote.pdf',), {}))
+        child.close()
+        parent.close()
+
+class ArchiveTests(IsolatedTestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass', role='staff')
+        approver = User.objects.create_user(username='approver', password='pass', role='approver_level_1')
+        old = timezone.now() - timedelta(days=400)
+        self.old = []
+        for index, request_status in enumerate(['approved', 'rejected', 'approved', 'pending']):
+            purchase_request = PurchaseRequest.objects.create(
+                title=f'Old {index}', description='d', amount=Decimal('10.00'), created_by=self.staff,
+                status=request_status, extracted_items=[{'name': 'Laptop', 'quantity': 1, 'price': 10}]
+            )
+            sync_line_items(purchase_request)
+            Approval.objects.create(request=purchase_request, approver=approver, action='approved', level=1)
+            self.old.append(purchase_request)
+        PurchaseRequest.objects.filter(id__in=[request.id for request in self.old]).update(created_at=old)
+        self.recent = PurchaseRequest.objects.create(
+            title='Recent', description='d', amount=Decimal('10.00'), created_by=self.staff, status='approved'
+        )
+        self.cutoff = timezone.now() - timedelta(days=365)
+
+    def test_batch_moves_finished_requests_with_their_approvals(self):
+        self.assertEqual(archive_batch(self.cutoff, 2), 2)
+        self.assertEqual(archive_batch(self.cutoff, 2), 1)
+        self.assertEqual(archive_batch(self.cutoff, 2), 0)
+
+        archived_ids = [request.id for request in self.old[:3]]
+        self.assertEqual(sorted(ArchivedPurchaseRequest.objects.values_list('id', flat=True)), archived_ids)
+        self.assertEqual(ArchivedApproval.objects.filter(request_id__in=archived_ids).count(), 3)
+        self.assertEqual(set(PurchaseRequest.objects.values_list('id', flat=True)), {self.old[3].id, self.recent.id})
+        self.assertFalse(LineItem.objects.filter(request_id__in=archived_ids).exists())
+        self.assertEqual(
+            sorted(AuditEvent.objects.filter(action='archived').values_list('request_id', flat=True)), archived_ids
+        )
+
+    def test_failed_batch_leaves_everything_in_place(self):
+        with mock.patch.object(ArchivedApproval.objects, 'bulk_create', side_effect=RuntimeError('disk full')), \
+                self.assertRaises(RuntimeError):
+            archive_batch(self.cutoff, 10)
+
+        self.assertFalse(ArchivedPurchaseRequest.objects.exists())
+        self.assertEqual(PurchaseRequest.objects.count(), 5)
+        self.assertFalse(AuditEvent.objects.exists())
+
+    def test_archived_requests_are_still_served(self):
+        call_command('archive_requests', older_than=365, batch_size=2, stdout=StringIO())
+        client = APIClient()
+        client.force_authenticate(self.staff)
+
+        response = client.get(f'/api/requests/{self.old[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['title'], 'Old 0')
+
+        export = client.get('/api/requests/export/')
+        titles = [row[1] for row in csv.reader(StringIO(b''.join(export.streaming_content).decode()))][1:]
+        self.assertEqual(sorted(titles), ['Old 0', 'Old 1', 'Old 2', 'Old 3', 'Recent'])
+
+    def test_dry_run_only_counts(self):
+        output = StringIO()
+        call_command('archive_requests', older_than=365, dry_run=True, stdout=output)
+
+        self.assertIn('3 requests created before', output.getvalue())
+        self.assertFalse(ArchivedPurchaseRequest.objects.exists())
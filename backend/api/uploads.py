@@ -0,0 +1,150 @@
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+SNIFF_BYTES = 2048
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Leading bytes of the document types the pipeline understands
+MAGIC_NUMBERS = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+]
+
+def sniff_content_type(head):
+    """Detect the content type from the first bytes of a file, ignoring client headers"""
+    # PDF allows leading junk before the header within the first 1 KB
+    if b'%PDF-' in head[:1024]:
+        return 'application/pdf'
+    for magic, content_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    return 'application/octet-stream'
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream every upload straight to a temporary file (never to worker memory),
+    computing its SHA-256 and sniffing its content type while the chunks arrive
+    """
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        uploaded.sniffed_content_type = sniff_content_type(self.head)
+        return uploaded
+
+def uploaded_content_type(uploaded_file):
+    """Sniffed content type when available, otherwise the client-supplied one"""
+    return getattr(uploaded_file, 'sniffed_content_type', None) or uploaded_file.content_type
+
+@contextmanager
+def document_stream(uploaded_file, fallback_path):
+    """
+    Yield a read-only memory map over an upload for the extraction stage
+    The temporary upload keeps its descriptor after storage moves it into place,
+    so the file is not opened or copied a second time
+    """
+    handle = getattr(uploaded_file, 'file', None)
+    mapped = None
+    try:
+        if handle is not None and hasattr(handle, 'fileno') and uploaded_file.size:
+            handle.flush()
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        mapped = None
+
+    if mapped is None:
+        with open(fallback_path, 'rb') as stored:
+            yield stored
+        return
+
+    try:
+        yield mapped
+    finally:
+        mapped.close()
+
+# Resumable chunked uploads
+
+def upload_part_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{session.id}.part')
+
+def append_upload_chunk(session, stream, length):
+    """
+    Append up to length bytes from stream to the session's part file
+    Returns: number of bytes written
+    """
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    written = 0
+    with open(upload_part_path(session), 'ab') as part:
+        # Discard anything left by a previously interrupted chunk
+        part.truncate(session.received_size)
+        part.seek(session.received_size)
+        while written < length:
+            block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            part.write(block)
+            written += len(block)
+    return written
+
+def finalize_upload(session):
+    """Hash and sniff a fully received upload in one streaming pass"""
+    hasher = hashlib.sha256()
+    head = b''
+    with open(upload_part_path(session), 'rb') as part:
+        for block in iter(lambda: part.read(STREAM_BLOCK_SIZE), b''):
+            if not head:
+                head = block[:SNIFF_BYTES]
+            hasher.update(block)
+    session.sha256 = hasher.hexdigest()
+    session.content_type = sniff_content_type(head)
+
+def discard_upload(session):
+    """Drop a consumed upload session and its part file if storage did not move it"""
+    try:
+        os.remove(upload_part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+def close_upload(serializer):
+    """
+    Close the CompletedUpload a serializer resolved, if any
+    Its descriptor outlives the move into storage so extraction can map it; call this
+    once the request is done with it
+    """
+    upload = getattr(serializer, 'completed_upload', None)
+    if upload is not None:
+        upload.close()
+
+class CompletedUpload(File):
+    """
+    A finished chunked upload, usable wherever an UploadedFile is expected
+    temporary_file_path() lets FileSystemStorage move the part file into place instead of copying it
+    The part file stays open until close_upload()
+    """
+    def __init__(self, session):
+        super().__init__(open(upload_part_path(session), 'rb'), name=session.filename)
+        self.size = session.total_size
+        self.content_type = session.content_type
+        self.sniffed_content_type = session.content_type
+        self.sha256 = session.sha256
+
+    def temporary_file_path(self):
+        return self.file.name
@@ -1,11 +1,24 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import PurchaseRequestViewSet, CustomTokenObtainPairView
+from .views import (
+    PurchaseRequestViewSet,
+    VendorViewSet,
+    UploadSessionViewSet,
+    DocumentPreviewViewSet,
+    ProfileViewSet,
+    AnalyticsViewSet,
+    CustomTokenObtainPairView
+)
 
 
 router = DefaultRouter()
 router.register(r'requests', PurchaseRequestViewSet, basename='purchaserequest')
+router.register(r'vendors', VendorViewSet, basename='vendor')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+router.register(r'previews', DocumentPreviewViewSet, basename='preview')
+router.register(r'profiles', ProfileViewSet, basename='profile')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
     # JWT Authentication
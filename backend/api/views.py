@@ -1,34 +1,68 @@
+import logging
+import os
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.db.models import Count, Sum
 
-from .models import PurchaseRequest, Approval
+from .models import PurchaseRequest, Approval, ArchivedPurchaseRequest, AuditEvent, LineItem, Vendor, UploadSession
 from .serializers import (
     PurchaseRequestSerializer,
+    ArchivedPurchaseRequestSerializer,
+    AuditEventSerializer,
     PurchaseRequestCreateSerializer,
     ApprovalActionSerializer,
-    ReceiptUploadSerializer
+    ReceiptUploadSerializer,
+    UploadSessionSerializer
 )
+from .audit import field_changes, record
+from .authentication import PreviewTokenAuthentication, SignedFileTokenAuthentication
+from .exports import stream_csv, write_xlsx
+from .idempotency import idempotent
+from .media import serve_file, serve_path
+from .mixins import ReplicaReadMixin
+from .pagination import AuditEventPagination
+from .profiling import PROFILE_ID_RE, list_profiles, load_profile_meta, profile_path
+from .previews import PREVIEW_FIELDS, preview_file_path, preview_url, schedule_previews
+from .storage import blob_digest
+from .uploads import append_upload_chunk, close_upload, discard_upload, document_stream, finalize_upload
 from .permissions import (
     IsStaff,
     IsApprover,
     IsFinance,
+    IsAdmin,
     CanApproveRequest,
+    CanViewAnalytics,
     CanViewRequest
 )
 
 # Import AI services
-from services.document_processor import process_proforma
-from services.po_generator import generate_purchase_order
-from services.receipt_validator import validate_receipt
+from services import metrics
+from services.analytics import DIMENSIONS, record_approved_spend, spend_series, top_spend
+from services.documents import generate_purchase_order, process_proforma, validate_receipt
+from services.duplicates import find_duplicates, index_document
+from services.extraction_budget import TRANSIENT_REASONS
+from services.line_items import item_name_filter, sync_line_items
+from services.vendors import resolve_vendor, search_vendors
+from services.search import search_requests, update_search_vector
+from services.preview_generator import load_manifest
 
 
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+logger = logging.getLogger(__name__)
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -48,19 +82,33 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
-class PurchaseRequestViewSet(viewsets.ModelViewSet):
+class PurchaseRequestViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = PurchaseRequest.objects.all()
     serializer_class = PurchaseRequestSerializer
     permission_classes = [IsAuthenticated]
+    replica_read_actions = ('list', 'retrieve', 'items', 'export', 'duplicates', 'history')
+    # Detail actions that also look in the archive (see api.archive)
+    archive_fallback_actions = ('retrieve', 'files', 'history')
     
     def get_serializer_class(self):
         if self.action == 'create':
             return PurchaseRequestCreateSerializer
         return PurchaseRequestSerializer
     
-    def get_queryset(self):
+    def _filter_visible(self, queryset):
+        """Restrict a live or archived request queryset to what the user may see"""
+        queryset = self._scope_to_user(queryset)
+        
+        # Filter by status if provided
+        status_filter = self.request.query_params.get('status', None)
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        
+        return queryset
+    
+    def _scope_to_user(self, queryset):
+        """Restrict a request queryset by the user's role alone"""
         user = self.request.user
-        queryset = PurchaseRequest.objects.all()
         
         # Staff can only see their own requests
         if user.role == 'staff':
@@ -74,10 +122,22 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
         elif user.role == 'finance':
             queryset = queryset.filter(status='approved')
         
-        # Filter by status if provided
-        status_filter = self.request.query_params.get('status', None)
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
+        return queryset
+    
+    def get_queryset(self):
+        queryset = self._filter_visible(PurchaseRequest.objects.all())
+        
+        # Filter by extracted line item name if provided
+        item_filter = item_name_filter(self.request.query_params.get('item', ''))
+        if item_filter is not None:
+            queryset = queryset.filter(
+                id__in=LineItem.objects.filter(item_filter).values('request_id')
+            )
+        
+        # Full-text search over title, description, vendor and document text
+        search_query = self.request.query_params.get('q', None)
+        if search_query:
+            queryset = search_requests(queryset, search_query)
         
         return queryset
     
@@ -110,11 +170,26 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.action not in self.archive_fallback_actions:
+                raise
+        
+        queryset = self._filter_visible(ArchivedPurchaseRequest.objects.select_related('created_by'))
+        instance = get_object_or_404(queryset, pk=self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        self.check_object_permissions(self.request, instance)
+        return instance
+    
     def retrieve(self, request, *args, **kwargs):
         """Retrieve a single purchase request with custom response format"""
         try:
             instance = self.get_object()
-            serializer = self.get_serializer(instance)
+            if isinstance(instance, ArchivedPurchaseRequest):
+                serializer = ArchivedPurchaseRequestSerializer(instance, context=self.get_serializer_context())
+            else:
+                serializer = self.get_serializer(instance)
             return Response({
                 'success': True,
                 'message': 'Purchase request retrieved successfully',
@@ -135,6 +210,7 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_404_NOT_FOUND)
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         """Create purchase request with custom response format"""
         try:
@@ -142,7 +218,7 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
             return Response({
                 'success': True,
                 'message': 'Purchase request created successfully',
-                'data': response.data
+                'data': {**response.data, 'duplicates': getattr(self, '_duplicates', [])}
             }, status=status.HTTP_201_CREATED)
         except PermissionError as e:
             return Response({
@@ -162,17 +238,129 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
         if self.request.user.role != 'staff':
             raise PermissionError("Only staff members can create purchase requests")
         
-        request = serializer.save(created_by=self.request.user)
+        try:
+            request = serializer.save(created_by=self.request.user)
+            uploaded_proforma = serializer.validated_data.get('proforma')
+            
+            # The chunked upload's part file now lives in media storage
+            if getattr(serializer, 'upload_session', None):
+                discard_upload(serializer.upload_session)
+            
+            # Process proforma if uploaded
+            if request.proforma:
+                schedule_previews(request.proforma)
+                extracted_text = ''
+                try:
+                    extracted_data, _ = self._extract_proforma(request, uploaded_proforma)
+                    extracted_text = extracted_data.get('text', '')
+                except Exception as e:
+                    logger.exception('Error processing proforma for request %s', request.id)
+                self._duplicates = self._check_duplicates(request, 'proforma', extracted_text)
+        finally:
+            close_upload(serializer)
+        
+        self.idempotent_resource_id = request.id
+        update_search_vector(request.id)
+        record('created', request.id, self.request.user, self._audit_snapshot(request))
+    
+    def replay_idempotent(self, body, resource_id):
+        """
+        Rebuild the request in a replayed create/submit_receipt response from the
+        current row, so its file tokens are not the expired ones of the first response
+        Returns: response body
+        """
+        instance = (
+            PurchaseRequest.objects.filter(pk=resource_id).first()
+            or ArchivedPurchaseRequest.objects.filter(pk=resource_id).first()
+        )
+        data = (body or {}).get('data')
+        if instance is None or not isinstance(data, dict):
+            return body
         
-        # Process proforma if uploaded
-        if request.proforma:
-            try:
-                extracted_data = process_proforma(request.proforma.path)
-                request.vendor_name = extracted_data.get('vendor_name', '')
-                request.extracted_items = extracted_data.get('items', [])
-                request.save()
-            except Exception as e:
-                print(f"Error processing proforma: {e}")
+        context = self.get_serializer_context()
+        if isinstance(instance, ArchivedPurchaseRequest):
+            representation = ArchivedPurchaseRequestSerializer(instance, context=context).data
+        else:
+            representation = PurchaseRequestSerializer(instance, context=context).data
+        
+        if 'request' in data:
+            data = {**data, 'request': representation}
+        else:
+            data = {**representation, 'duplicates': data.get('duplicates', [])}
+        return {**body, 'data': data}
+    
+    def _audit_snapshot(self, purchase_request):
+        """Owner-editable fields as JSON-safe values, for audit diffs"""
+        return {
+            'title': purchase_request.title,
+            'description': purchase_request.description,
+            'amount': str(purchase_request.amount),
+            'proforma': purchase_request.proforma.name or None,
+        }
+    
+    def _check_duplicates(self, purchase_request, kind, text):
+        """Index a request document and return likely duplicates attached to other requests"""
+        try:
+            field_file = getattr(purchase_request, kind)
+            fingerprint = index_document(purchase_request, kind, text, digest=blob_digest(field_file.name))
+            if not fingerprint:
+                return []
+            # Matches on requests the user may not open are reported without id or title
+            return find_duplicates(fingerprint, self._scope_to_user(PurchaseRequest.objects.all()))
+        except Exception as e:
+            logger.exception('Error checking request %s for duplicate documents', purchase_request.id)
+            return []
+    
+    def _extract_proforma(self, purchase_request, uploaded=None):
+        """
+        Extract proforma data (cached by content hash) and store it on the request
+        Returns: (extracted data, line item changes from sync_line_items)
+        """
+        digest = blob_digest(purchase_request.proforma.name)
+        cache_key = f'proforma-extraction:{digest}' if digest else None
+        
+        extracted_data = cache.get(cache_key) if cache_key else None
+        if cache_key:
+            metrics.inc('cache_requests_total', cache='proforma_extraction', result='miss' if extracted_data is None else 'hit')
+        if extracted_data is None:
+            with document_stream(uploaded, purchase_request.proforma.path) as stream:
+                extracted_data = process_proforma(purchase_request.proforma.path, stream=stream)
+            
+            # Failed extractions carry no text, and time/memory cut-offs depend on load
+            # rather than the document; don't pin either in the cache
+            if cache_key and 'text' in extracted_data and extracted_data.get('truncated_reason') not in TRANSIENT_REASONS:
+                cache.set(cache_key, extracted_data, settings.EXTRACTION_CACHE_TIMEOUT)
+        
+        purchase_request.vendor_name = extracted_data.get('vendor_name', '')
+        purchase_request.extracted_items = extracted_data.get('items', [])
+        purchase_request.extracted_text = extracted_data.get('text', '')
+        purchase_request.proforma_truncated_reason = extracted_data.get('truncated_reason', '')
+        purchase_request.vendor = resolve_vendor(purchase_request.vendor_name)
+        purchase_request.save()
+        line_item_changes = sync_line_items(purchase_request)
+        
+        return extracted_data, line_item_changes
+    
+    def _reextract_proforma(self, purchase_request, uploaded=None):
+        """
+        Refresh extraction, line items and the duplicate index after the proforma was replaced
+        Returns: audit changes for the extracted fields
+        """
+        schedule_previews(purchase_request.proforma)
+        vendor_name = purchase_request.vendor_name
+        changes = {}
+        extracted_text = ''
+        try:
+            extracted_data, line_item_changes = self._extract_proforma(purchase_request, uploaded)
+            extracted_text = extracted_data.get('text', '')
+            changes['line_items'] = line_item_changes
+        except Exception as e:
+            logger.exception('Error processing proforma for request %s', purchase_request.id)
+        self._duplicates = self._check_duplicates(purchase_request, 'proforma', extracted_text)
+        
+        if purchase_request.vendor_name != vendor_name:
+            changes['vendor_name'] = [vendor_name, purchase_request.vendor_name]
+        return changes
     
     def update(self, request, *args, **kwargs):
         """Update purchase request with custom response format"""
@@ -196,10 +384,11 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
         
         try:
             response = super().update(request, *args, **kwargs)
+            update_search_vector(instance.id)
             return Response({
                 'success': True,
                 'message': 'Purchase request updated successfully',
-                'data': response.data
+                'data': {**response.data, 'duplicates': getattr(self, '_duplicates', [])}
             }, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({
@@ -208,6 +397,26 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    def perform_update(self, serializer):
+        before = self._audit_snapshot(serializer.instance)
+        digest = blob_digest(serializer.instance.proforma.name)
+        try:
+            instance = serializer.save()
+            changes = field_changes(before, self._audit_snapshot(instance))
+            
+            if getattr(serializer, 'upload_session', None):
+                discard_upload(serializer.upload_session)
+            
+            # Proformas are stored under their content hash, so re-uploading the same
+            # file changes nothing and skips extraction entirely
+            if instance.proforma and blob_digest(instance.proforma.name) != digest:
+                changes.update(self._reextract_proforma(instance, serializer.validated_data.get('proforma')))
+        finally:
+            close_upload(serializer)
+        
+        if changes:
+            record('updated', instance.id, self.request.user, changes)
+    
     def destroy(self, request, *args, **kwargs):
         """Delete a purchase request with custom response format"""
         try:
@@ -229,7 +438,9 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                     'error': 'invalid_status'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            request_id, snapshot = instance.id, {**self._audit_snapshot(instance), 'status': instance.status}
             instance.delete()
+            record('deleted', request_id, request.user, snapshot)
             return Response({
                 'success': True,
                 'message': 'Purchase request deleted successfully'
@@ -242,6 +453,142 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'])
+    def items(self, request):
+        """Aggregate spend per extracted line item across the visible requests"""
+        try:
+            line_items = LineItem.objects.filter(
+                request__in=self.get_queryset().values('id')
+            )
+            
+            name_filter = item_name_filter(request.query_params.get('name', ''))
+            if name_filter is not None:
+                line_items = line_items.filter(name_filter)
+            
+            summary = (
+                line_items
+                .values('normalized_name')
+                .annotate(
+                    request_count=Count('request', distinct=True),
+                    quantity=Sum('quantity'),
+                    total_spend=Sum('total')
+                )
+                .order_by('-total_spend')
+            )
+            
+            page = self.paginate_queryset(summary)
+            if page is not None:
+                return self.get_paginated_response({
+                    'success': True,
+                    'message': 'Line item summary retrieved successfully',
+                    'data': list(page)
+                })
+            
+            return Response({
+                'success': True,
+                'message': 'Line item summary retrieved successfully',
+                'data': list(summary)
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                'success': False,
+                'message': 'Failed to retrieve line item summary',
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the visible purchase requests as CSV (default) or XLSX
+        Archived requests follow the live ones unless include_archived=false, or an
+        item/q filter is given (archived rows keep no line items or search vector)
+        """
+        params = request.query_params
+        export_format = params.get('export_format', 'csv').lower()
+        filename = f"purchase-requests-{timezone.now().strftime('%Y%m%d-%H%M%S')}"
+        
+        try:
+            querysets = [self.get_queryset()]
+            include_archived = params.get('include_archived', 'true').lower() not in ('0', 'false')
+            if include_archived and item_name_filter(params.get('item', '')) is None and not params.get('q'):
+                querysets.append(self._filter_visible(ArchivedPurchaseRequest.objects.all()))
+            
+            # Bind the database now: the body is streamed after the request's routing has ended
+            querysets = [queryset.using(queryset.db) for queryset in querysets]
+            
+            if export_format == 'csv':
+                response = StreamingHttpResponse(stream_csv(*querysets), content_type='text/csv')
+                response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+                return response
+            
+            if export_format == 'xlsx':
+                try:
+                    output = write_xlsx(*querysets)
+                except ImportError:
+                    return Response({
+                        'success': False,
+                        'message': 'XLSX export requires openpyxl to be installed',
+                        'error': 'unsupported_format'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                return FileResponse(
+                    output,
+                    as_attachment=True,
+                    filename=f'{filename}.xlsx',
+                    content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                )
+            
+            return Response({
+                'success': False,
+                'message': 'Unsupported export format. Use csv or xlsx',
+                'error': 'unsupported_format'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        except Exception as e:
+            return Response({
+                'success': False,
+                'message': 'Failed to export purchase requests',
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path=r'files/(?P<field>proforma|purchase_order|receipt)',
+        url_name='files',
+        authentication_classes=api_settings.DEFAULT_AUTHENTICATION_CLASSES + [SignedFileTokenAuthentication],
+        permission_classes=[IsAuthenticated, CanViewRequest]
+    )
+    def files(self, request, pk=None, field=None):
+        """Download a request document (supports Range and conditional GET)"""
+        try:
+            purchase_request = self.get_object()
+            field_file = getattr(purchase_request, field)
+            
+            if not field_file:
+                return Response({
+                    'success': False,
+                    'message': f'No {field.replace("_", " ")} uploaded for this purchase request',
+                    'error': 'not_found'
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            # Blobs are named by hash; give the download a readable name
+            extension = os.path.splitext(field_file.name)[1]
+            if field == 'purchase_order':
+                filename = f"PO-{purchase_request.id:06d}{extension}"
+            else:
+                filename = f"{field}-{purchase_request.id}{extension}"
+            
+            return serve_file(request, field_file, filename=filename)
+        
+        except FileNotFoundError:
+            return Response({
+                'success': False,
+                'message': 'File is missing from storage',
+                'error': 'not_found'
+            }, status=status.HTTP_404_NOT_FOUND)
+    
     @action(detail=True, methods=['patch'], permission_classes=[IsAuthenticated, CanApproveRequest])
     def approve(self, request, pk=None):
         return self._handle_approval(request, pk, 'approve')
@@ -270,18 +617,20 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 level=level,
                 comments=serializer.validated_data.get('comments', '')
             )
+            record(approval.action, purchase_request.id, user, {'level': level, 'comments': approval.comments})
             
             # Update request status
             if action_type == 'reject':
                 purchase_request.status = 'rejected'
                 purchase_request.rejected_at = timezone.now()
                 purchase_request.save()
+                record('status_changed', purchase_request.id, user, {'status': ['pending', 'rejected']})
                 
                 return Response({
                     'success': True,
                     'message': f'Purchase request rejected by Level {level} approver',
                     'data': {
-                        'request': PurchaseRequestSerializer(purchase_request).data,
+                        'request': PurchaseRequestSerializer(purchase_request, context={'request': request}).data,
                         'approval': {
                             'level': level,
                             'action': 'rejected',
@@ -304,15 +653,22 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                     purchase_request.purchase_order = po_file
                     po_generated = True
                 except Exception as e:
-                    print(f"Error generating PO: {e}")
+                    logger.exception('Error generating PO for request %s', purchase_request.id)
                 
                 purchase_request.save()
+                record_approved_spend(purchase_request)
+                record('status_changed', purchase_request.id, user, {
+                    'status': ['pending', 'approved'],
+                    'purchase_order': purchase_request.purchase_order.name or None
+                })
+                if po_generated:
+                    schedule_previews(purchase_request.purchase_order)
                 
                 return Response({
                     'success': True,
                     'message': 'Purchase request fully approved. Purchase order has been generated',
                     'data': {
-                        'request': PurchaseRequestSerializer(purchase_request).data,
+                        'request': PurchaseRequestSerializer(purchase_request, context={'request': request}).data,
                         'approval': {
                             'level': level,
                             'action': 'approved',
@@ -329,7 +685,7 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 'success': True,
                 'message': f'Level {level} approval recorded successfully. Awaiting Level {3-level} approval',
                 'data': {
-                    'request': PurchaseRequestSerializer(purchase_request).data,
+                    'request': PurchaseRequestSerializer(purchase_request, context={'request': request}).data,
                     'approval': {
                         'level': level,
                         'action': 'approved',
@@ -353,8 +709,44 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, CanViewRequest])
+    def duplicates(self, request, pk=None):
+        """Requests whose proforma or receipt looks like a duplicate of this request's documents"""
+        purchase_request = self.get_object()
+        # Matches on requests the user may not open are reported without id or title
+        visible = self._scope_to_user(PurchaseRequest.objects.all())
+        
+        matches = {}
+        for fingerprint in purchase_request.fingerprints.all():
+            matches[fingerprint.kind] = find_duplicates(fingerprint, visible)
+        
+        return Response({
+            'success': True,
+            'message': 'Duplicate check completed',
+            'data': {
+                'proforma': matches.get('proforma', []),
+                'receipt': matches.get('receipt', [])
+            }
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, CanViewRequest])
+    def history(self, request, pk=None):
+        """Audit events of a request, newest first (cursor paginated)"""
+        purchase_request = self.get_object()
+        events = AuditEvent.objects.filter(request_id=purchase_request.id).select_related('actor')
+        
+        paginator = AuditEventPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        return paginator.get_paginated_response({
+            'success': True,
+            'message': 'History retrieved successfully',
+            'data': AuditEventSerializer(page, many=True).data
+        })
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent
     def submit_receipt(self, request, pk=None):
+        serializer = None
         try:
             purchase_request = self.get_object()
             
@@ -374,30 +766,47 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                     'error': 'invalid_status'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            serializer = ReceiptUploadSerializer(data=request.data)
+            serializer = ReceiptUploadSerializer(data=request.data, context={'request': request})
             serializer.is_valid(raise_exception=True)
             
             receipt_file = serializer.validated_data['receipt']
             purchase_request.receipt = receipt_file
             purchase_request.save()
+            self.idempotent_resource_id = purchase_request.id
+            
+            if getattr(serializer, 'upload_session', None):
+                discard_upload(serializer.upload_session)
+            
+            schedule_previews(purchase_request.receipt)
             
             # Validate receipt against PO
             try:
-                validation_result = validate_receipt(
-                    receipt_file.path,
-                    purchase_request
-                )
+                with document_stream(receipt_file, purchase_request.receipt.path) as stream:
+                    validation_result = validate_receipt(
+                        purchase_request.receipt.path,
+                        purchase_request,
+                        stream=stream
+                    )
                 purchase_request.receipt_validated = validation_result['is_valid']
                 purchase_request.validation_errors = validation_result.get('errors', [])
+                purchase_request.receipt_truncated_reason = validation_result.get('truncated_reason', '')
                 purchase_request.save()
                 
+                duplicates = self._check_duplicates(purchase_request, 'receipt', validation_result.pop('text', ''))
+                record('receipt_submitted', purchase_request.id, request.user, {
+                    'receipt': purchase_request.receipt.name,
+                    'receipt_validated': purchase_request.receipt_validated,
+                    'validation_errors': purchase_request.validation_errors
+                })
+                
                 if validation_result['is_valid']:
                     return Response({
                         'success': True,
                         'message': 'Receipt uploaded and validated successfully',
                         'data': {
-                            'request': PurchaseRequestSerializer(purchase_request).data,
-                            'validation': validation_result
+                            'request': PurchaseRequestSerializer(purchase_request, context={'request': request}).data,
+                            'validation': validation_result,
+                            'duplicates': duplicates
                         }
                     }, status=status.HTTP_200_OK)
                 else:
@@ -405,8 +814,9 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                         'success': False,
                         'message': 'Receipt uploaded but validation failed',
                         'data': {
-                            'request': PurchaseRequestSerializer(purchase_request).data,
-                            'validation': validation_result
+                            'request': PurchaseRequestSerializer(purchase_request, context={'request': request}).data,
+                            'validation': validation_result,
+                            'duplicates': duplicates
                         }
                     }, status=status.HTTP_400_BAD_REQUEST)
                     
@@ -416,7 +826,7 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                     'message': 'Receipt uploaded but validation process encountered an error',
                     'error': str(e),
                     'data': {
-                        'request': PurchaseRequestSerializer(purchase_request).data
+                        'request': PurchaseRequestSerializer(purchase_request, context={'request': request}).data
                     }
                 }, status=status.HTTP_206_PARTIAL_CONTENT)
         
@@ -425,4 +835,301 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 'success': False,
                 'message': 'Failed to upload receipt',
                 'error': str(e)
-            }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            }, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            close_upload(serializer)
+
+class VendorViewSet(viewsets.GenericViewSet):
+    queryset = Vendor.objects.all()
+    permission_classes = [IsAuthenticated]
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Autocomplete vendors by canonical name or any known alias"""
+        query = request.query_params.get('q', '')
+        
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+        
+        try:
+            return Response({
+                'success': True,
+                'message': 'Vendors retrieved successfully',
+                'data': search_vendors(query, limit=limit)
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                'success': False,
+                'message': 'Failed to search vendors',
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UploadSessionViewSet(viewsets.GenericViewSet):
+    """
+    Resumable chunked uploads for large proformas and receipts
+    POST creates a session, PATCH appends a raw chunk at Upload-Offset, GET reports the offset to resume from.
+    The completed session id is then sent as proforma_upload / receipt_upload.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+    
+    def create(self, request):
+        """Start a chunked upload"""
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Failed to start upload',
+                'error': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        session = serializer.save(user=request.user)
+        return Response({
+            'success': True,
+            'message': 'Upload started',
+            'data': self.get_serializer(session).data
+        }, status=status.HTTP_201_CREATED)
+    
+    def retrieve(self, request, pk=None):
+        """Report how much of the upload has been received"""
+        session = self.get_object()
+        return Response({
+            'success': True,
+            'message': 'Upload status retrieved successfully',
+            'data': self.get_serializer(session).data
+        }, status=status.HTTP_200_OK)
+    
+    def partial_update(self, request, pk=None):
+        """Append the raw request body as the next chunk"""
+        with transaction.atomic():
+            # Lock the session so concurrent chunks cannot interleave
+            session = self.get_queryset().select_for_update().filter(pk=pk).first()
+            if session is None:
+                return Response({
+                    'success': False,
+                    'message': 'Upload not found',
+                    'error': 'not_found'
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            if session.status == 'complete':
+                return Response({
+                    'success': False,
+                    'message': 'Upload is already complete',
+                    'error': 'invalid_status',
+                    'data': self.get_serializer(session).data
+                }, status=status.HTTP_409_CONFLICT)
+            
+            try:
+                offset = int(request.headers.get('Upload-Offset', ''))
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'message': 'Upload-Offset and Content-Length headers are required',
+                    'error': 'invalid_request'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            if offset != session.received_size:
+                return Response({
+                    'success': False,
+                    'message': f'Upload offset mismatch. Resume from byte {session.received_size}',
+                    'error': 'offset_mismatch',
+                    'data': self.get_serializer(session).data
+                }, status=status.HTTP_409_CONFLICT)
+            
+            if length <= 0 or offset + length > session.total_size:
+                return Response({
+                    'success': False,
+                    'message': 'Chunk is empty or exceeds the declared upload size',
+                    'error': 'invalid_chunk'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            session.received_size += append_upload_chunk(session, request.stream, length)
+            
+            if session.received_size == session.total_size:
+                finalize_upload(session)
+                session.status = 'complete'
+            
+            session.save()
+        
+        return Response({
+            'success': True,
+            'message': 'Upload complete' if session.status == 'complete' else 'Chunk received',
+            'data': self.get_serializer(session).data
+        }, status=status.HTTP_200_OK)
+
+
+class DocumentPreviewViewSet(viewsets.GenericViewSet):
+    """
+    Document previews keyed by content hash
+    Access needs the short-lived token from the request serializer (bound to user,
+    request and field), and the user must still be able to view that request
+    """
+    authentication_classes = [PreviewTokenAuthentication]
+    permission_classes = [IsAuthenticated, CanViewRequest]
+    lookup_field = 'digest'
+    lookup_value_regex = '[0-9a-f]{64}'
+    
+    def _check_document(self, request, digest):
+        """Returns: None if the token's request still holds this document and the user may view it, else an error response"""
+        payload = request.auth
+        purchase_request = (
+            PurchaseRequest.objects.filter(pk=payload.get('r')).first()
+            or ArchivedPurchaseRequest.objects.filter(pk=payload.get('r')).first()
+        )
+        field = payload.get('f')
+        if purchase_request is None or field not in PREVIEW_FIELDS:
+            return self._not_ready()
+        if blob_digest(getattr(purchase_request, field).name) != digest:
+            # The document was replaced since the token was issued
+            return self._not_ready()
+        self.check_object_permissions(request, purchase_request)
+        return None
+    
+    def _not_ready(self):
+        return Response({
+            'success': False,
+            'message': 'Preview is not available yet',
+            'error': 'not_found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    def retrieve(self, request, digest=None):
+        """List the rendered preview pages of a document"""
+        error = self._check_document(request, digest)
+        if error is not None:
+            return error
+        
+        manifest = load_manifest(digest)
+        if manifest is None:
+            return self._not_ready()
+        
+        # Page links reuse the caller's token, so they expire with it
+        token = request.query_params.get('token')
+        response = Response({
+            'success': True,
+            'message': 'Preview retrieved successfully',
+            'data': {
+                'page_count': manifest['page_count'],
+                'thumbnail': request.build_absolute_uri(preview_url(token, digest, 'thumb')),
+                'pages': [
+                    request.build_absolute_uri(preview_url(token, digest, f'page-{number}'))
+                    for number in range(1, manifest['page_count'] + 1)
+                ]
+            }
+        }, status=status.HTTP_200_OK)
+        response['Cache-Control'] = f'private, max-age={settings.MEDIA_TOKEN_MAX_AGE}'
+        return response
+    
+    @action(detail=True, methods=['get'], url_path=r'(?P<name>thumb|page-\d+)', url_name='image')
+    def image(self, request, digest=None, name=None):
+        """Serve one preview image"""
+        error = self._check_document(request, digest)
+        if error is not None:
+            return error
+        
+        path = preview_file_path(digest, name)
+        if not os.path.exists(path):
+            return self._not_ready()
+        
+        return serve_path(
+            request,
+            path,
+            os.path.relpath(path, settings.MEDIA_ROOT),
+            etag=f'"{digest}-{name}"',
+            cache_control='private, max-age=31536000, immutable'
+        )
+
+class AnalyticsViewSet(ReplicaReadMixin, viewsets.GenericViewSet):
+    """
+    Approved spend served from the monthly rollups (services.analytics), so the cost
+    does not grow with the number of requests
+    """
+    permission_classes = [IsAuthenticated, CanViewAnalytics]
+    replica_read_actions = ('list',)
+    
+    def list(self, request):
+        """Monthly spend series plus top vendors and requesters"""
+        params = request.query_params
+        try:
+            months = max(1, min(int(params.get('months', 12)), 60))
+            limit = max(1, min(int(params.get('top', 10)), 50))
+        except ValueError:
+            months, limit = 12, 10
+        
+        # Optional series for one vendor/requester instead of the overall total
+        dimension = params.get('dimension', 'total')
+        key = params.get('key', '') if dimension != 'total' else ''
+        if dimension not in DIMENSIONS:
+            return Response({
+                'success': False,
+                'message': f"dimension must be one of: {', '.join(DIMENSIONS)}",
+                'error': 'invalid_dimension'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            'message': 'Analytics retrieved successfully',
+            'data': {
+                'months': months,
+                'dimension': dimension,
+                'key': key,
+                'series': spend_series(dimension, key, months),
+                'top_vendors': top_spend('vendor', months, limit),
+                'top_requesters': top_spend('requester', months, limit)
+            }
+        }, status=status.HTTP_200_OK)
+
+class ProfileViewSet(viewsets.GenericViewSet):
+    """Download request profiles captured by ProfilingMiddleware (superusers only)"""
+    permission_classes = [IsAuthenticated, IsAdmin]
+    lookup_field = 'profile_id'
+    lookup_value_regex = PROFILE_ID_RE
+    
+    def list(self, request):
+        """List stored profiles, newest first"""
+        return Response({
+            'success': True,
+            'message': 'Profiles retrieved successfully',
+            'data': list_profiles()
+        }, status=status.HTTP_200_OK)
+    
+    def retrieve(self, request, profile_id=None):
+        """Download one profile as a pstats .prof file"""
+        if load_profile_meta(profile_id) is None:
+            return Response({
+                'success': False,
+                'message': 'Profile not found',
+                'error': 'not_found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        return FileResponse(
+            open(profile_path(profile_id), 'rb'),
+            as_attachment=True,
+            filename=f'{profile_id}.prof',
+            content_type='application/octet-stream'
+        )
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, summed across worker processes
+    Needs METRICS_TOKEN as a bearer token; without one it is only served with DEBUG on
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(
+                'Metrics are disabled: set METRICS_TOKEN\n',
+                status=status.HTTP_403_FORBIDDEN,
+                content_type='text/plain; charset=utf-8'
+            )
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
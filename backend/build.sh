@@ -2,7 +2,8 @@
 set -o errexit
 pip install -r requirements.txt
 python manage.py collectstatic --no-input
-python manage.py migrate
+DB_STATEMENT_TIMEOUT=0 python manage.py migrate
+python manage.py createcachetable
 python manage.py shell -c "
 from api.models import User
 users = [
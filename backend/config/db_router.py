@@ -0,0 +1,59 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA_PREFIX = 'replica_'
+
+# Database alias reads should use for the current request, or None for the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+def choose_replica():
+    """A random replica alias, or None when no replicas are configured"""
+    aliases = replica_aliases()
+    return random.choice(aliases) if aliases else None
+
+def set_read_alias(alias):
+    return _read_alias.set(alias)
+
+def reset_read_alias(token):
+    _read_alias.reset(token)
+
+def current_read_alias():
+    return _read_alias.get()
+
+@contextmanager
+def read_from_replica():
+    """Send reads in this block to one replica (the primary if none are configured)"""
+    token = set_read_alias(choose_replica())
+    try:
+        yield
+    finally:
+        reset_read_alias(token)
+
+class ReplicaRouter:
+    """
+    Reads go to the primary unless a replica was selected for the current request
+    (see api.mixins.ReplicaReadMixin); writes and migrations always use the primary
+    Returning None from db_for_read lets Django keep related lookups on the database
+    the parent object came from
+    """
+    def db_for_read(self, model, **hints):
+        # The database cache holds replica pins, which must never lag behind writes
+        if model._meta.app_label == 'django_cache':
+            return 'default'
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return not db.startswith(REPLICA_PREFIX)
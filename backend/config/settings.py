@@ -1,8 +1,10 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,6 +34,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.PerformanceTracingMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.AuditMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -63,12 +69,40 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Connection management, applied the same way to every database below
+# Connections persist across requests (DB_CONN_MAX_AGE seconds, 0 = close after each
+# request) and are health-checked before reuse. Statement timeouts (ms, 0 = none) are
+# shorter on the primary, which serves the request path, than on replicas, which serve
+# lists, reports and exports. Behind PgBouncer (transaction pooling) set DB_PGBOUNCER:
+# server-side cursors and startup options don't survive there, so set the timeout on
+# the database role instead (ALTER ROLE ... SET statement_timeout). Migrations run
+# with DB_STATEMENT_TIMEOUT=0; long maintenance commands lift the timeout themselves
+# (api.management.base.MaintenanceCommand)
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+DB_CONN_HEALTH_CHECKS = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+DB_CONNECT_TIMEOUT = config('DB_CONNECT_TIMEOUT', default=5, cast=int)
+DB_STATEMENT_TIMEOUT = config('DB_STATEMENT_TIMEOUT', default=30000, cast=int)
+DB_REPLICA_STATEMENT_TIMEOUT = config('DB_REPLICA_STATEMENT_TIMEOUT', default=120000, cast=int)
+DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
+
+def configure_connection(database, statement_timeout):
+    database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    database['CONN_HEALTH_CHECKS'] = DB_CONN_HEALTH_CHECKS
+    if database['ENGINE'] == 'django.db.backends.postgresql':
+        options = database.setdefault('OPTIONS', {})
+        options.setdefault('connect_timeout', DB_CONNECT_TIMEOUT)
+        if DB_PGBOUNCER:
+            database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        elif statement_timeout:
+            options['options'] = f'-c statement_timeout={statement_timeout}'
+    return database
+
 # Database - Use DATABASE_URL if available (for Render), else use individual settings (for Docker)
 DATABASE_URL = config('DATABASE_URL', default=None)
 
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL)
     }
 else:
     DATABASES = {
@@ -81,6 +115,42 @@ else:
             'PORT': config('DB_PORT', default='5432'),
         }
     }
+configure_connection(DATABASES['default'], DB_STATEMENT_TIMEOUT)
+
+# Read replicas (comma-separated database URLs). Safe list/retrieve/stats/export reads
+# of purchase requests use a replica, except for users who wrote in the last
+# REPLICA_PIN_SECONDS (read-your-writes). Tests mirror replicas to the default database
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+for index, replica_url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    DATABASES[f'replica_{index}'] = configure_connection(dj_database_url.parse(replica_url), DB_REPLICA_STATEMENT_TIMEOUT)
+    DATABASES[f'replica_{index}']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=15, cast=int)
+
+# Cache shared by every worker and host: replica pins, profiling rate limits and the
+# extraction cache only work if all processes see the same values, which the
+# per-process default (LocMemCache) does not give. REDIS_URL selects Redis;
+# otherwise the database cache table is used (manage.py createcachetable)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+# PostgreSQL-only lookups (trigram similarity, full-text search)
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -105,6 +175,16 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media is only served through /api/requests/{id}/files/{field}/ after a permission check.
+# Download links carry a signed token valid for this many seconds
+MEDIA_TOKEN_MAX_AGE = config('MEDIA_TOKEN_MAX_AGE', default=3600, cast=int)
+
+# Offload file transfer to the front proxy: '' (serve from Django), 'nginx'
+# (X-Accel-Redirect to an internal location aliasing MEDIA_ROOT) or 'sendfile'
+# (Apache/lighttpd X-Sendfile)
+MEDIA_ACCEL_REDIRECT = config('MEDIA_ACCEL_REDIRECT', default='')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -158,11 +238,99 @@ CORS_ALLOWED_ORIGINS = config(
 ).split(',')
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default='False', cast=bool)
 
 # OpenAI API Key (for document processing)
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 
+# Idempotency-Key support on request creation and receipt submission: stored responses
+# are replayed for IDEMPOTENCY_KEY_TTL seconds; an attempt still marked in progress after
+# IDEMPOTENCY_LOCK_TIMEOUT seconds is assumed dead and may be retried.
+# Expired keys are removed by the purge_idempotency_keys command
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 3600, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=600, cast=int)
+
+# Document previews (first-page thumbnail + low-resolution pages, WebP)
+PREVIEW_MAX_PAGES = config('PREVIEW_MAX_PAGES', default=10, cast=int)
+
+# Proforma extraction results are cached by the document's content hash
+EXTRACTION_CACHE_TIMEOUT = config('EXTRACTION_CACHE_TIMEOUT', default=7 * 24 * 3600, cast=int)
+
+# Per-document extraction budgets: PDF pages read, seconds and MB of memory growth.
+# Past a budget, extraction stops between pages and the result is flagged truncated.
+# EXTRACTION_MAX_PIXELS only limits rasterized images: uploads over it are downscaled
+# to fit before OCR (and flagged truncated) and preview pages are rendered within it
+EXTRACTION_MAX_PAGES = config('EXTRACTION_MAX_PAGES', default=50, cast=int)
+EXTRACTION_MAX_PIXELS = config('EXTRACTION_MAX_PIXELS', default=40_000_000, cast=int)  # A4 at 600 dpi is ~35M
+EXTRACTION_MAX_SECONDS = config('EXTRACTION_MAX_SECONDS', default=30, cast=int)
+EXTRACTION_MAX_MEMORY_MB = config('EXTRACTION_MAX_MEMORY_MB', default=256, cast=int)
+
+# Out-of-process document worker pool (manage.py run_document_service). With a socket
+# path set, proforma extraction, receipt validation and PO rendering are sent there
+# instead of running in the web worker; empty keeps them in-process. A job waits up
+# to DOCUMENT_SERVICE_QUEUE_WAIT seconds for a free slot before it is refused and may
+# run for DOCUMENT_SERVICE_TIMEOUT seconds before its worker is killed. With
+# DOCUMENT_SERVICE_FALLBACK, jobs run in-process while the service is down
+DOCUMENT_SERVICE_SOCKET = config('DOCUMENT_SERVICE_SOCKET', default='')
+DOCUMENT_SERVICE_TIMEOUT = config('DOCUMENT_SERVICE_TIMEOUT', default=120, cast=int)
+DOCUMENT_SERVICE_QUEUE_WAIT = config('DOCUMENT_SERVICE_QUEUE_WAIT', default=10, cast=int)
+DOCUMENT_SERVICE_FALLBACK = config('DOCUMENT_SERVICE_FALLBACK', default=True, cast=bool)
+
 # File Upload Settings
+# Uploads always stream to a temporary file (hashed and type-sniffed on the way),
+# so file bodies are never buffered in worker memory
+FILE_UPLOAD_HANDLERS = ['api.uploads.HashingTemporaryFileUploadHandler']
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
\ No newline at end of file
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
+
+# Resumable chunked uploads (/api/uploads/); kept under MEDIA_ROOT so finished
+# files are moved into storage with a rename rather than copied
+CHUNKED_UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'chunked_uploads')
+CHUNKED_UPLOAD_MAX_SIZE = config('CHUNKED_UPLOAD_MAX_SIZE', default=104857600, cast=int)  # 100MB
+# Request performance tracing: share of requests (0.0-1.0) that get a Server-Timing
+# header and a JSON timing line on the api.performance logger
+PERF_TRACE_SAMPLE_RATE = config('PERF_TRACE_SAMPLE_RATE', default=0.0, cast=float)
+
+# Prometheus metrics (/metrics). Each worker process writes its values to its own
+# file in METRICS_DIR and the endpoint sums them; files of exited processes are
+# folded into METRICS_DIR/archive.json, so the directory does not need clearing.
+# Scrapers must send "Authorization: Bearer <METRICS_TOKEN>"; with no token set the
+# endpoint is refused unless DEBUG is on
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'procure-to-pay-metrics'))
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Opt-in cProfile of single requests by superusers (X-Profile: 1 or ?profile=1).
+# Rate limited per user; oldest profiles are deleted beyond the file/byte limits
+PROFILING_DIR = config('PROFILING_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+PROFILING_RATE_LIMIT = config('PROFILING_RATE_LIMIT', default=10, cast=int)
+PROFILING_RATE_WINDOW = config('PROFILING_RATE_WINDOW', default=3600, cast=int)  # seconds
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=50, cast=int)
+PROFILING_MAX_BYTES = config('PROFILING_MAX_BYTES', default=104857600, cast=int)  # 100MB
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Error paths in the API and services log here (with tracebacks)
+        'api': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'services': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'api.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -1,12 +1,13 @@
 from django.contrib import admin
-from django.urls import path, include, re_path
+from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.views.static import serve
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from api.views import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Procurement API",
@@ -20,15 +21,13 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
-# Serve media files in both DEBUG and production
-# This ensures uploaded files (proformas, POs, receipts) are accessible
-urlpatterns += [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-]
+# Media files (proformas, POs, receipts) are not exposed here; they are
+# downloaded through the permission-checked /api/requests/{id}/files/ action
 
 # Serve static files
 if settings.DEBUG:
@@ -0,0 +1,172 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+DIMENSIONS = ('total', 'vendor', 'requester')
+
+# Request field each dimension is keyed by
+DIMENSION_FIELDS = {
+    'total': None,
+    'vendor': 'vendor_id',
+    'requester': 'created_by_id',
+}
+
+def month_start(moment):
+    """First day of moment's month in the current time zone (matches TruncMonth)"""
+    return timezone.localtime(moment).date().replace(day=1)
+
+def shift_month(period, months):
+    index = period.year * 12 + period.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _key(value):
+    return '' if value is None else str(value)
+
+def record_approved_spend(purchase_request):
+    """
+    Add a newly approved request to the monthly rollups
+    Must run in the transaction that approves the request; rows are always
+    touched in the same order so concurrent approvals cannot deadlock
+    """
+    from api.models import SpendRollup
+
+    period = month_start(purchase_request.approved_at)
+    amount = purchase_request.amount
+
+    for dimension in DIMENSIONS:
+        field = DIMENSION_FIELDS[dimension]
+        lookup = {
+            'dimension': dimension,
+            'key': _key(getattr(purchase_request, field)) if field else '',
+            'period': period,
+        }
+        increment = {
+            'total_amount': F('total_amount') + amount,
+            'request_count': F('request_count') + 1,
+        }
+        if SpendRollup.objects.filter(**lookup).update(**increment):
+            continue
+        try:
+            with transaction.atomic():
+                SpendRollup.objects.create(**lookup, total_amount=amount, request_count=1)
+        except IntegrityError:
+            # Another approval created the row first
+            SpendRollup.objects.filter(**lookup).update(**increment)
+
+def rebuild_rollups():
+    """
+    Recompute every rollup from approved requests, live and archived
+    Returns: number of rollup rows written
+    """
+    from api.models import ArchivedPurchaseRequest, PurchaseRequest, SpendRollup
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Approvals that commit after this point wait for the rebuild and then
+            # increment the new rows; earlier ones are included in the aggregate
+            with connection.cursor() as cursor:
+                cursor.execute('LOCK TABLE spend_rollups IN SHARE ROW EXCLUSIVE MODE')
+
+        # (dimension, key, period): [total, count], summed over both tables since
+        # archiving moves approved requests out of the live one
+        totals = {}
+        for model in (PurchaseRequest, ArchivedPurchaseRequest):
+            approved = (
+                model.objects
+                .filter(status='approved', approved_at__isnull=False)
+                .annotate(period=TruncMonth('approved_at', output_field=DateField()))
+                .order_by()
+            )
+            for dimension in DIMENSIONS:
+                field = DIMENSION_FIELDS[dimension]
+                columns = ['period', field] if field else ['period']
+                for row in approved.values(*columns).annotate(total=Sum('amount'), count=Count('id')):
+                    key = (dimension, _key(row[field]) if field else '', row['period'])
+                    entry = totals.setdefault(key, [Decimal('0'), 0])
+                    entry[0] += row['total']
+                    entry[1] += row['count']
+
+        rollups = [
+            SpendRollup(dimension=dimension, key=key, period=period, total_amount=total, request_count=count)
+            for (dimension, key, period), (total, count) in totals.items()
+        ]
+
+        SpendRollup.objects.all().delete()
+        SpendRollup.objects.bulk_create(rollups, batch_size=1000)
+
+    return len(rollups)
+
+def _labels(dimension, keys):
+    from api.models import User, Vendor
+
+    ids = [int(key) for key in keys if key]
+    if dimension == 'vendor':
+        labels = {str(pk): name for pk, name in Vendor.objects.filter(id__in=ids).values_list('id', 'name')}
+        labels[''] = 'Unknown vendor'
+    elif dimension == 'requester':
+        labels = {
+            str(user.pk): user.get_full_name() or user.username
+            for user in User.objects.filter(id__in=ids).only('username', 'first_name', 'last_name')
+        }
+    else:
+        labels = {'': 'All requests'}
+    return labels
+
+def spend_series(dimension='total', key='', months=12, until=None):
+    """
+    Monthly spend for one rollup key over the last `months` months, oldest first,
+    with empty months filled in
+    Returns: list of dicts with month (YYYY-MM), total, count
+    """
+    from api.models import SpendRollup
+
+    end = month_start(until or timezone.now())
+    start = shift_month(end, -(months - 1))
+    rows = {
+        row.period: row
+        for row in SpendRollup.objects.filter(dimension=dimension, key=key, period__gte=start, period__lte=end)
+    }
+
+    series = []
+    for offset in range(months):
+        period = shift_month(start, offset)
+        row = rows.get(period)
+        series.append({
+            'month': period.strftime('%Y-%m'),
+            'total': row.total_amount if row else Decimal('0'),
+            'count': row.request_count if row else 0,
+        })
+    return series
+
+def top_spend(dimension, months=12, limit=10, until=None):
+    """
+    Keys of a dimension with the highest spend over the last `months` months
+    Reads at most one rollup row per key and month, however many requests there are
+    Returns: list of dicts with key, label, total, count
+    """
+    from api.models import SpendRollup
+
+    end = month_start(until or timezone.now())
+    start = shift_month(end, -(months - 1))
+    rows = list(
+        SpendRollup.objects
+        .filter(dimension=dimension, period__gte=start, period__lte=end)
+        .values('key')
+        .annotate(total=Sum('total_amount'), count=Sum('request_count'))
+        .order_by('-total', 'key')[:limit]
+    )
+
+    labels = _labels(dimension, [row['key'] for row in rows])
+    return [
+        {
+            'key': row['key'],
+            'label': labels.get(row['key'], row['key']),
+            'total': row['total'],
+            'count': row['count'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,53 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+from django.db import close_old_connections
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Small in-process pool for work that should not hold up the HTTP response
+# (preview rendering etc.). Jobs must be idempotent: a worker restart drops the queue.
+MAX_WORKERS = config('BACKGROUND_WORKERS', default=2, cast=int)
+
+_executor = None
+_lock = threading.Lock()
+_pending = 0
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='background')
+        return _executor
+
+def _run(fn, args, kwargs):
+    global _pending
+    # Pool threads live across jobs, so treat each job like a request: drop
+    # connections past CONN_MAX_AGE or broken ones before and after it
+    close_old_connections()
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception('Background job %s failed', getattr(fn, '__name__', fn))
+        metrics.inc('background_jobs_failed_total', job=getattr(fn, '__name__', str(fn)))
+    finally:
+        close_old_connections()
+        with _lock:
+            _pending -= 1
+            metrics.set_gauge('background_queue_depth', _pending)
+
+def submit(fn, *args, **kwargs):
+    """Queue fn(*args, **kwargs) on the background pool"""
+    global _pending
+    with _lock:
+        _pending += 1
+        metrics.set_gauge('background_queue_depth', _pending)
+    return _get_executor().submit(_run, fn, args, kwargs)
+
+def queue_depth():
+    """Jobs queued or running in this process"""
+    return _pending
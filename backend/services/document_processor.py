@@ -1,73 +1,84 @@
 import os
-import pdfplumber
-import pytesseract
-from PIL import Image
 from decouple import config
+from services import metrics
+from services.extraction_budget import ExtractionBudget, extract_pdf_text, ocr_image
+from services.tracing import span, traced
 
-def process_proforma(file_path):
+def process_proforma(file_path, stream=None):
     """
     Extract key information from proforma invoice
-    Returns: dict with vendor_name, items (list of dicts with name, quantity, price)
+    stream: optional open file/memory map of the document, used instead of reopening file_path
+    Returns: dict with vendor_name, items (list of dicts with name, quantity, price),
+    text (the raw extracted text, kept for search) and truncated/truncated_reason
+    (set when the document ran past its extraction budget)
     """
     try:
         file_extension = os.path.splitext(file_path)[1].lower()
+        file_type = file_extension.lstrip('.') or 'unknown'
+        budget = ExtractionBudget()
         
-        if file_extension == '.pdf':
-            return process_pdf_proforma(file_path)
-        elif file_extension in ['.jpg', '.jpeg', '.png']:
-            return process_image_proforma(file_path)
-        else:
-            return {'vendor_name': '', 'items': []}
+        with span('process_proforma', 'document_extraction_seconds', kind='proforma', file_type=file_type):
+            if file_extension == '.pdf':
+                extracted_data = process_pdf_proforma(file_path, stream, budget)
+            elif file_extension in ['.jpg', '.jpeg', '.png']:
+                extracted_data = process_image_proforma(file_path, stream, budget)
+            else:
+                return {'vendor_name': '', 'items': []}
+        
+        extracted_data.update(budget.as_dict())
+        return extracted_data
     except Exception as e:
         print(f"Error processing proforma: {e}")
         return {'vendor_name': '', 'items': []}
 
-def process_pdf_proforma(file_path):
-    """Extract data from PDF proforma"""
+def process_pdf_proforma(file_path, stream=None, budget=None):
+    """Extract data from PDF proforma, stopping between pages once budget runs out"""
     extracted_data = {
         'vendor_name': '',
         'items': []
     }
     
     try:
-        with pdfplumber.open(file_path) as pdf:
-            text = ''
-            for page in pdf.pages:
-                text += page.extract_text() or ''
-            
-            # Use OpenAI for better extraction
-            if config('OPENAI_API_KEY', default=''):
-                extracted_data = extract_with_openai(text)
-            else:
-                # Simple text parsing fallback
-                extracted_data = simple_text_extraction(text)
+        text = extract_pdf_text(stream or file_path, budget or ExtractionBudget())
+        
+        # Use OpenAI for better extraction
+        if config('OPENAI_API_KEY', default=''):
+            extracted_data = extract_with_openai(text)
+        else:
+            # Simple text parsing fallback
+            extracted_data = simple_text_extraction(text)
+        
+        extracted_data['text'] = text
                 
     except Exception as e:
         print(f"Error processing PDF: {e}")
     
     return extracted_data
 
-def process_image_proforma(file_path):
-    """Extract data from image proforma using OCR"""
+def process_image_proforma(file_path, stream=None, budget=None):
+    """Extract data from image proforma using OCR, within budget"""
     extracted_data = {
         'vendor_name': '',
         'items': []
     }
     
     try:
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image)
+        file_type = os.path.splitext(file_path)[1].lower().lstrip('.')
+        text = ocr_image(stream or file_path, file_type, budget or ExtractionBudget())
         
         if config('OPENAI_API_KEY', default=''):
             extracted_data = extract_with_openai(text)
         else:
             extracted_data = simple_text_extraction(text)
+        
+        extracted_data['text'] = text
             
     except Exception as e:
         print(f"Error processing image: {e}")
     
     return extracted_data
 
+@traced('llm_extract', 'llm_request_seconds', operation='extract')
 def extract_with_openai(text):
     """Use OpenAI API to extract structured data from text"""
     try:
@@ -106,6 +117,7 @@ def extract_with_openai(text):
         
     except Exception as e:
         print(f"OpenAI extraction error: {e}")
+        metrics.inc('llm_errors_total', operation='extract')
         return simple_text_extraction(text)
 
 def simple_text_extraction(text):
@@ -0,0 +1,234 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+from django.utils.crypto import salted_hmac
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Out-of-process document worker pool (manage.py run_document_service).
+# Workers are forked from a forkserver that has already imported the document
+# libraries, handle at most max_tasks jobs each and are then replaced, so memory
+# pdfminer and Tesseract accumulate goes back to the OS. API workers send jobs over
+# a Unix socket, one connection per job; see services.documents for the routing.
+
+# Third-party libraries imported once in the forkserver and inherited by every worker
+FORKSERVER_PRELOAD = ['pdfplumber', 'pytesseract', 'PIL.Image', 'reportlab.platypus', 'pypdfium2']
+
+# Slack on top of queue wait + job timeout before a client gives up on the reply
+CLIENT_GRACE = 5
+
+class DocumentServiceError(Exception):
+    pass
+
+class DocumentServiceUnavailable(DocumentServiceError):
+    """The service is not running or the connection broke"""
+
+class DocumentServiceBusy(DocumentServiceError):
+    """Every worker and queue slot stayed taken for the whole queue wait"""
+
+class DocumentJobTimeout(DocumentServiceError):
+    pass
+
+class DocumentJobFailed(DocumentServiceError):
+    """The job raised inside the worker"""
+
+def _authkey():
+    return salted_hmac('services.document_service', 'authkey').digest()
+
+def call(job, *args, **kwargs):
+    """
+    Run a services.documents job on the document service and return its result
+    Arguments must be picklable (paths and model instances, not open files)
+    Raises DocumentServiceUnavailable, DocumentServiceBusy, DocumentJobTimeout or DocumentJobFailed
+    """
+    try:
+        conn = Client(settings.DOCUMENT_SERVICE_SOCKET, family='AF_UNIX', authkey=_authkey())
+    except OSError as e:
+        raise DocumentServiceUnavailable(str(e))
+
+    wait = settings.DOCUMENT_SERVICE_QUEUE_WAIT + settings.DOCUMENT_SERVICE_TIMEOUT + CLIENT_GRACE
+    with conn:
+        try:
+            conn.send((job, args, kwargs))
+            if not conn.poll(wait):
+                raise DocumentJobTimeout(f'No reply from the document service after {wait}s')
+            status, payload = conn.recv()
+        except (EOFError, OSError) as e:
+            raise DocumentServiceUnavailable(f'Connection to the document service lost: {e}')
+
+    if status == 'ok':
+        return payload
+    if status == 'busy':
+        raise DocumentServiceBusy(payload)
+    if status == 'timeout':
+        raise DocumentJobTimeout(payload)
+    raise DocumentJobFailed(payload)
+
+def _worker_main(conn, max_tasks):
+    """Worker process: set up Django, then run up to max_tasks jobs from conn and exit"""
+    import django
+    django.setup()
+
+    from django.db import close_old_connections
+    from services import documents
+    documents.preload()
+
+    for _ in range(max_tasks):
+        try:
+            job, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        close_old_connections()
+        try:
+            reply = ('ok', documents.run_local(job, *args, **kwargs))
+        except Exception as e:
+            reply = ('error', f'{type(e).__name__}: {e}')
+
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Unpicklable result
+            conn.send(('error', f'Could not return {job} result: {e}'))
+    close_old_connections()
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.jobs = 0
+        self.dead = False
+
+    def run(self, job, args, kwargs, timeout):
+        """Returns: (status, payload) reply for the client"""
+        self.jobs += 1
+        try:
+            self.conn.send((job, args, kwargs))
+            if not self.conn.poll(timeout):
+                self.dead = True
+                self.process.kill()
+                return 'timeout', f'{job} took longer than {timeout}s and was cancelled'
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.dead = True
+            return 'error', f'Document worker exited during {job} (exit code {self.process.exitcode}): {e}'
+
+    def stop(self):
+        self.conn.close()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+class WorkerPool:
+    """
+    Fixed number of worker processes plus a bounded queue in front of them
+    A job waits up to queue_wait seconds for a slot (worker or queue place) and is
+    refused as busy otherwise; running jobs are cut off after timeout seconds
+    """
+    def __init__(self, workers, max_tasks, queue_size, timeout, queue_wait):
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self.timeout = timeout
+        self.queue_wait = queue_wait
+        self.idle = queue.Queue()
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.waiting = 0
+        self.lock = threading.Lock()
+        self.context = multiprocessing.get_context('forkserver')
+        self.context.set_forkserver_preload(FORKSERVER_PRELOAD)
+
+    def start(self):
+        for _ in range(self.workers):
+            self.idle.put(self._spawn())
+
+    def _spawn(self):
+        parent, child = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, args=(child, self.max_tasks), daemon=True)
+        process.start()
+        child.close()
+        return _Worker(process, parent)
+
+    def _replace(self, worker):
+        worker.stop()
+        self.idle.put(self._spawn())
+
+    def _release(self, worker):
+        if worker.dead or worker.jobs >= self.max_tasks or not worker.process.is_alive():
+            # Off the request thread so the reply is not held up by the respawn
+            threading.Thread(target=self._replace, args=(worker,), daemon=True).start()
+        else:
+            self.idle.put(worker)
+
+    def _set_waiting(self, delta):
+        with self.lock:
+            self.waiting += delta
+            metrics.set_gauge('document_service_queue_depth', self.waiting)
+
+    def submit(self, job, args, kwargs):
+        """Returns: (status, payload) reply for the client"""
+        if not self.slots.acquire(timeout=self.queue_wait):
+            metrics.inc('document_service_jobs_total', job=job, result='busy')
+            return 'busy', f'Document service is at capacity; {job} was not queued'
+
+        self._set_waiting(1)
+        try:
+            worker = self.idle.get()
+            self._set_waiting(-1)
+            started = time.perf_counter()
+            try:
+                reply = worker.run(job, args, kwargs, self.timeout)
+            finally:
+                self._release(worker)
+            metrics.observe('document_service_job_seconds', time.perf_counter() - started, job=job)
+            metrics.inc('document_service_jobs_total', job=job, result=reply[0])
+            return reply
+        finally:
+            self.slots.release()
+
+    def shutdown(self):
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+def _handle(pool, conn):
+    from services.documents import JOBS
+
+    with conn:
+        try:
+            job, args, kwargs = conn.recv()
+            if job not in JOBS:
+                conn.send(('error', f'Unknown document job: {job}'))
+                return
+            conn.send(pool.submit(job, args, kwargs))
+        except (EOFError, OSError):
+            # Client went away; nothing to reply to
+            pass
+        except Exception:
+            logger.exception('Error handling document job')
+
+def serve(address, pool):
+    """Accept jobs on the Unix socket at address until interrupted, one thread per connection"""
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family='AF_UNIX', authkey=_authkey())
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, multiprocessing.AuthenticationError):
+                logger.exception('Error accepting document job')
+                continue
+            threading.Thread(target=_handle, args=(pool, conn), daemon=True).start()
+    finally:
+        listener.close()
@@ -0,0 +1,96 @@
+import importlib
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Entry points for document work (proforma extraction, receipt validation, PO and
+# preview rendering). The implementations use pdfplumber/pdfminer, pytesseract,
+# PIL, ReportLab and pypdfium2; importing them here on first call keeps those
+# libraries out of workers that only serve JSON.
+# With DOCUMENT_SERVICE_SOCKET set, the jobs in JOBS run on the separate document
+# worker pool (services.document_service) instead of in the calling process.
+
+PRELOAD_MODULES = (
+    'services.document_processor',
+    'services.receipt_validator',
+    'services.po_generator',
+    'services.preview_generator',
+    # These import their libraries inside the functions that use them
+    'services.extraction_budget',
+    'pdfplumber',
+    'pytesseract',
+    'pypdfium2',
+    'PIL.Image',
+)
+
+# job name: (module, function) of the in-process implementation
+JOBS = {
+    'process_proforma': ('document_processor', 'process_proforma'),
+    'validate_receipt': ('receipt_validator', 'validate_receipt'),
+    'generate_purchase_order': ('po_generator', 'generate_purchase_order'),
+}
+
+def _module(name):
+    # sys.modules makes every call after the first a dict lookup
+    return importlib.import_module(f'services.{name}')
+
+def preload():
+    """Import every document library now, e.g. before forking worker processes"""
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+def run_local(job, *args, **kwargs):
+    """Run a job in this process"""
+    module, function = JOBS[job]
+    return getattr(_module(module), function)(*args, **kwargs)
+
+def _run(job, *args, stream=None, **kwargs):
+    """
+    Run a job on the document service when one is configured, otherwise in-process
+    The service reopens files by path, so stream is only used in-process. When the
+    service is down the job runs here instead if DOCUMENT_SERVICE_FALLBACK is set;
+    DocumentServiceBusy and job timeouts are raised to the caller.
+    """
+    if stream is not None:
+        local_kwargs = {**kwargs, 'stream': stream}
+    else:
+        local_kwargs = kwargs
+    if not settings.DOCUMENT_SERVICE_SOCKET:
+        return run_local(job, *args, **local_kwargs)
+
+    from services import document_service
+    from services.tracing import span
+
+    try:
+        with span(f'document_service.{job}'):
+            return document_service.call(job, *args, **kwargs)
+    except document_service.DocumentServiceUnavailable as e:
+        if not settings.DOCUMENT_SERVICE_FALLBACK:
+            raise
+        logger.warning('Document service unavailable, running %s in-process: %s', job, e)
+        return run_local(job, *args, **local_kwargs)
+
+def process_proforma(file_path, stream=None):
+    return _run('process_proforma', file_path, stream=stream)
+
+def validate_receipt(receipt_path, purchase_request, stream=None):
+    return _run('validate_receipt', receipt_path, purchase_request, stream=stream)
+
+def extract_receipt_text(file_path, stream=None):
+    return _module('receipt_validator').extract_receipt_text(file_path, stream=stream)
+
+def generate_purchase_order(purchase_request):
+    # Read the approvals here: during approval the final one is not committed yet,
+    # so a document service worker (own connection) would not see it
+    approvals = list(
+        purchase_request.approvals
+        .filter(action='approved')
+        .select_related('approver')
+        .order_by('level')
+    )
+    return _run('generate_purchase_order', purchase_request, approvals=approvals)
+
+def generate_previews(digest, file_path):
+    return _module('preview_generator').generate_previews(digest, file_path)
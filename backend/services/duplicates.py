@@ -0,0 +1,255 @@
+import hashlib
+import logging
+import os
+import random
+import re
+
+logger = logging.getLogger(__name__)
+
+# Word shingles per text fingerprint
+SHINGLE_SIZE = 5
+
+# MinHash signature length, split into LSH bands of MINHASH_ROWS values each.
+# Documents become candidates when any band matches exactly, which happens with
+# probability 1 - (1 - J^4)^16: ~0.9998 at Jaccard 0.8, ~0.01 at 0.3
+MINHASH_PERMUTATIONS = 64
+MINHASH_ROWS = 4
+
+# 64-bit dHash split into 16-bit bands; by pigeonhole, hashes within
+# IMAGE_BANDS - 1 bits of each other always share a band
+IMAGE_BANDS = 4
+
+# Hashes with fewer set bits come from near-blank pages (typed text on white) and
+# say nothing about the document
+MIN_IMAGE_DETAIL_BITS = 8
+
+# Verified thresholds for flagging a candidate as a likely duplicate. Image matches
+# must not be contradicted by the text when both documents have some
+TEXT_THRESHOLD = 0.8
+IMAGE_MAX_DISTANCE = 3
+IMAGE_MIN_TEXT_SIMILARITY = 0.5
+
+# Upper bound on candidates pulled from the index per lookup, so very common
+# buckets (templated quotes) cannot turn a lookup into a table scan
+CANDIDATE_LIMIT = 200
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+# Fixed seed: signatures are stored, so every process must use the same permutations
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+def text_shingles(text):
+    """Set of SHINGLE_SIZE-word shingles of normalized text (the whole text if shorter)"""
+    words = re.findall(r'\w+', str(text or '').lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash(text):
+    """
+    MinHash signature of the text's shingles
+    Returns: list of MINHASH_PERMUTATIONS ints, or [] when the text has no words
+    """
+    hashes = [_hash64(shingle) & _MERSENNE_PRIME for shingle in text_shingles(text)]
+    if not hashes:
+        return []
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+def minhash_similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    if not signature_a or len(signature_a) != len(signature_b):
+        return 0.0
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
+
+def dhash(image, size=8):
+    """
+    Difference hash of an image: compares neighbouring pixels of a size+1 x size
+    grayscale thumbnail, so it survives re-encoding, rescaling and small edits
+    Returns: 16-character hex string
+    """
+    from PIL import Image
+
+    small = image.convert('L').resize((size + 1, size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        for column in range(size):
+            left = pixels[row * (size + 1) + column]
+            right = pixels[row * (size + 1) + column + 1]
+            value = (value << 1) | (left > right)
+    return f'{value:0{size * size // 4}x}'
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+def document_image_hash(file_path):
+    """dHash of an image, or of the first page of a PDF; '' for other files and blank pages"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    image_hash = ''
+
+    if file_extension == '.pdf':
+        from services.preview_generator import _render_pdf_pages
+        for page in _render_pdf_pages(file_path, 1):
+            image_hash = dhash(page)
+    elif file_extension in ['.jpg', '.jpeg', '.png']:
+        from PIL import Image
+        with Image.open(file_path) as image:
+            # Decode at reduced size; the hash only needs 9x8 pixels
+            image.draft('L', (64, 64))
+            image_hash = dhash(image)
+
+    if image_hash and bin(int(image_hash, 16)).count('1') < MIN_IMAGE_DETAIL_BITS:
+        return ''
+    return image_hash
+
+def lsh_buckets(minhash_signature, image_hash):
+    """
+    Index keys of a fingerprint: one per MinHash band ('t<band>:<hash>') and one
+    per 16-bit slice of the image hash ('i<band>:<bits>')
+    """
+    buckets = []
+    for band in range(len(minhash_signature) // MINHASH_ROWS):
+        rows = minhash_signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+        digest = hashlib.blake2b(','.join(map(str, rows)).encode(), digest_size=8).hexdigest()
+        buckets.append(f't{band}:{digest}')
+
+    if image_hash:
+        width = len(image_hash) // IMAGE_BANDS
+        for band in range(IMAGE_BANDS):
+            buckets.append(f'i{band}:{image_hash[band * width:(band + 1) * width]}')
+
+    return buckets
+
+def _file_digest(file_path):
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def index_document(purchase_request, kind, text, digest=None):
+    """
+    Store the fingerprint and LSH buckets of a request's proforma or receipt
+    text is what extraction already produced, so indexing never re-runs OCR;
+    documents with a known content hash reuse the earlier fingerprint outright
+    Returns: DocumentFingerprint, or None when the request has no such document
+    """
+    from django.db import transaction
+    from api.models import DocumentFingerprint, FingerprintBand
+
+    field_file = getattr(purchase_request, kind)
+    if not field_file:
+        DocumentFingerprint.objects.filter(request=purchase_request, kind=kind).delete()
+        return None
+
+    file_path = field_file.path
+    digest = digest or _file_digest(file_path)
+
+    existing = (
+        DocumentFingerprint.objects.filter(sha256=digest)
+        .exclude(request=purchase_request, kind=kind)
+        .only('minhash', 'image_hash')
+        .first()
+    )
+    if existing is not None:
+        signature, image_hash = existing.minhash, existing.image_hash
+    else:
+        signature = minhash(text)
+        try:
+            image_hash = document_image_hash(file_path)
+        except Exception:
+            logger.exception('Error hashing document image %s', file_path)
+            image_hash = ''
+
+    with transaction.atomic():
+        fingerprint, _ = DocumentFingerprint.objects.update_or_create(
+            request=purchase_request,
+            kind=kind,
+            defaults={'sha256': digest, 'minhash': signature, 'image_hash': image_hash}
+        )
+        # Re-indexing an edited document only rewrites the buckets that moved
+        buckets = set(lsh_buckets(signature, image_hash))
+        stored = set(fingerprint.bands.values_list('bucket', flat=True))
+        if stored - buckets:
+            fingerprint.bands.filter(bucket__in=stored - buckets).delete()
+        FingerprintBand.objects.bulk_create([
+            FingerprintBand(fingerprint=fingerprint, bucket=bucket)
+            for bucket in buckets - stored
+        ])
+
+    return fingerprint
+
+def find_duplicates(fingerprint, visible=None):
+    """
+    Documents on other requests that are likely the same document as fingerprint:
+    identical content, MinHash similarity >= TEXT_THRESHOLD, or an image hash within
+    IMAGE_MAX_DISTANCE bits. Candidates come from the bucket index, so the cost
+    depends on the number of near matches, not on the number of documents stored
+    visible: optional PurchaseRequest queryset the caller may see; matches on other
+    requests are still reported, but with request_id and title set to None
+    Returns: list of dicts (request_id, title, kind, match, similarity), best first
+    """
+    from django.db.models import Q
+    from api.models import DocumentFingerprint, FingerprintBand
+
+    buckets = lsh_buckets(fingerprint.minhash, fingerprint.image_hash)
+    candidate_ids = list(
+        FingerprintBand.objects.filter(bucket__in=buckets)
+        .exclude(fingerprint__request_id=fingerprint.request_id)
+        .values_list('fingerprint_id', flat=True)
+        .distinct()[:CANDIDATE_LIMIT]
+    )
+
+    candidates = (
+        DocumentFingerprint.objects
+        .filter(Q(id__in=candidate_ids) | Q(sha256=fingerprint.sha256))
+        .exclude(request_id=fingerprint.request_id)
+        .select_related('request')
+        .order_by('-created_at')[:CANDIDATE_LIMIT]
+    )
+
+    visible_ids = None
+    if visible is not None:
+        candidates = list(candidates)
+        visible_ids = set(
+            visible.filter(id__in={candidate.request_id for candidate in candidates})
+            .values_list('id', flat=True)
+        )
+
+    duplicates = []
+    for candidate in candidates:
+        if candidate.sha256 == fingerprint.sha256:
+            match, similarity = 'exact', 1.0
+        else:
+            match, similarity = None, 0.0
+            text_similarity = minhash_similarity(fingerprint.minhash, candidate.minhash)
+            if text_similarity >= TEXT_THRESHOLD:
+                match, similarity = 'text', text_similarity
+            has_text = fingerprint.minhash and candidate.minhash
+            if fingerprint.image_hash and candidate.image_hash and (
+                not has_text or text_similarity >= IMAGE_MIN_TEXT_SIMILARITY
+            ):
+                distance = hamming_distance(fingerprint.image_hash, candidate.image_hash)
+                image_similarity = 1 - distance / (len(fingerprint.image_hash) * 4)
+                if distance <= IMAGE_MAX_DISTANCE and image_similarity > similarity:
+                    match, similarity = 'image', image_similarity
+            if match is None:
+                continue
+
+        hidden = visible_ids is not None and candidate.request_id not in visible_ids
+        duplicates.append({
+            'request_id': None if hidden else candidate.request_id,
+            'title': None if hidden else candidate.request.title,
+            'kind': candidate.kind,
+            'match': match,
+            'similarity': round(similarity, 3),
+        })
+
+    duplicates.sort(key=lambda duplicate: (-duplicate['similarity'], -(duplicate['request_id'] or 0)))
+    return duplicates
@@ -0,0 +1,130 @@
+import os
+import time
+
+from django.conf import settings
+
+from services import metrics
+from services.tracing import span
+
+# Per-document limits for text extraction (settings.EXTRACTION_MAX_*). They are
+# checked between PDF pages and before OCR, so an oversized or hostile upload returns
+# the text read so far, flagged truncated, instead of holding a worker. A single page
+# pdfminer never finishes is only cut off by DOCUMENT_SERVICE_TIMEOUT.
+# pdfplumber, pytesseract and PIL are imported inside the functions that use them,
+# so views can import this module without loading them.
+
+# Cut-offs that depend on machine load rather than the document itself
+TRANSIENT_REASONS = ('time', 'memory')
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+def _rss_bytes():
+    """Resident memory of this process, or None where /proc is not available"""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class ExtractionBudget:
+    """
+    Page, wall-clock and memory allowance for extracting one document, plus the pixel
+    count an image may be decoded at for OCR
+    """
+    def __init__(self, max_pages=None, max_pixels=None, max_seconds=None, max_memory_mb=None):
+        self.max_pages = settings.EXTRACTION_MAX_PAGES if max_pages is None else max_pages
+        self.max_pixels = settings.EXTRACTION_MAX_PIXELS if max_pixels is None else max_pixels
+        self.max_seconds = settings.EXTRACTION_MAX_SECONDS if max_seconds is None else max_seconds
+        max_memory_mb = settings.EXTRACTION_MAX_MEMORY_MB if max_memory_mb is None else max_memory_mb
+        self.max_memory = max_memory_mb * 1024 * 1024
+        self.started = time.monotonic()
+        self.rss_start = _rss_bytes()
+        self.truncated = False
+        self.reason = ''
+
+    def remaining(self):
+        """Seconds left of the wall-clock budget"""
+        return self.max_seconds - (time.monotonic() - self.started)
+
+    def stop(self, reason):
+        """Mark the document truncated; the first reason recorded is kept"""
+        if not self.truncated:
+            self.truncated = True
+            self.reason = reason
+            metrics.inc('extraction_truncated_total', reason=reason)
+
+    def exhausted(self):
+        """Returns: True (marking the document truncated) once time or memory has run out"""
+        if self.remaining() <= 0:
+            self.stop('time')
+            return True
+        if self.rss_start is not None:
+            rss = _rss_bytes()
+            if rss is not None and rss - self.rss_start > self.max_memory:
+                self.stop('memory')
+                return True
+        return False
+
+    def as_dict(self):
+        return {'truncated': self.truncated, 'truncated_reason': self.reason}
+
+def extract_pdf_text(source, budget):
+    """
+    Extract the text of a PDF page by page within budget
+    Text layers are read without rasterizing, so only the page, time and memory
+    budgets apply here; the pixel budget limits OCR and preview images
+    source: path or open file/memory map
+    """
+    import pdfplumber
+
+    text = ''
+    with pdfplumber.open(source) as pdf:
+        pages = pdf.pages
+        if len(pages) > budget.max_pages:
+            budget.stop('pages')
+            pages = pages[:budget.max_pages]
+
+        for page in pages:
+            if budget.exhausted():
+                break
+            text += page.extract_text() or ''
+            # Drop the page's parsed layout objects before reading the next one
+            page.close()
+
+    return text
+
+def ocr_image(source, file_type, budget):
+    """
+    OCR an image within budget
+    Images over the pixel budget are downscaled to fit before OCR, and Tesseract is
+    killed when the remaining wall-clock budget runs out
+    """
+    import pytesseract
+    from PIL import Image
+
+    # Only reads the header; pixels are decoded on first use
+    image = Image.open(source)
+    pixels = image.width * image.height
+    if pixels > budget.max_pixels:
+        budget.stop('pixels')
+        scale = (budget.max_pixels / pixels) ** 0.5
+        # thumbnail() lets JPEG decode at reduced size instead of in full
+        image.thumbnail((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+
+    if budget.exhausted():
+        return ''
+
+    try:
+        with span('ocr', 'ocr_seconds', file_type=file_type):
+            return pytesseract.image_to_string(image, timeout=budget.remaining())
+    except RuntimeError as e:
+        # pytesseract kills Tesseract and raises RuntimeError('Tesseract process timeout')
+        if 'timeout' not in str(e).lower():
+            raise
+        budget.stop('time')
+        return ''
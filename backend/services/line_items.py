@@ -0,0 +1,135 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+MAX_NAME_LENGTH = 255
+# Keep values inside the line_items decimal columns
+MAX_VALUE = Decimal('1000000000')
+MAX_TOTAL = Decimal('1000000000000')
+
+def normalize_item_name(name):
+    """
+    Normalize an item name for indexed lookups
+    Lowercases, drops punctuation and collapses whitespace
+    """
+    text = re.sub(r'[^\w\s]', ' ', str(name or '').lower())
+    return ' '.join(text.split())[:MAX_NAME_LENGTH]
+
+def item_name_filter(name):
+    """
+    Match line items whose normalized name has a word starting with the normalized
+    query, so "laptop" finds "dell laptop" and "lap" finds "laptop stand"
+    Normalized names are single-space separated, so a word start is either the start
+    of the name or a space; on PostgreSQL line_item_name_trgm_idx serves the contains
+    Returns: Q for LineItem querysets, or None when nothing is left after normalizing
+    """
+    from django.db.models import Q
+
+    term = normalize_item_name(name)
+    if not term:
+        # "" would match every name, so punctuation-only queries don't filter at all
+        return None
+    return Q(normalized_name__startswith=term) | Q(normalized_name__contains=f' {term}')
+
+def _to_decimal(value, default):
+    try:
+        number = Decimal(str(value).replace(',', ''))
+    except (InvalidOperation, TypeError, ValueError):
+        return default
+    return number if number.is_finite() else default
+
+def parse_line_items(items):
+    """
+    Convert extracted_items JSON into line item field dicts
+    Returns: list of dicts with position, name, normalized_name, quantity, unit_price, total
+    """
+    rows = []
+
+    if not isinstance(items, list):
+        return rows
+
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+
+        name = str(item.get('name') or '').strip()[:MAX_NAME_LENGTH]
+        normalized_name = normalize_item_name(name)
+        if not normalized_name:
+            continue
+
+        quantity = _to_decimal(item.get('quantity', 1), Decimal('1')).quantize(Decimal('0.001'))
+        unit_price = _to_decimal(item.get('price', 0), Decimal('0')).quantize(Decimal('0.01'))
+        total = (quantity * unit_price).quantize(Decimal('0.01'))
+        if not (0 <= quantity < MAX_VALUE and 0 <= unit_price < MAX_VALUE and total < MAX_TOTAL):
+            continue
+
+        rows.append({
+            'position': position,
+            'name': name,
+            'normalized_name': normalized_name,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total': total,
+        })
+
+    return rows
+
+# Columns compared when deciding whether a stored line item's content changed
+LINE_ITEM_FIELDS = ['name', 'normalized_name', 'quantity', 'unit_price', 'total']
+
+def sync_line_items(purchase_request):
+    """
+    Bring the line items of a request in line with its extracted_items
+    Stored rows are matched to new ones by normalized name (same quantity and price
+    first), so inserting or dropping an item only writes that item; rows that merely
+    moved get a position-only update
+    Returns: dict with added, changed, moved and removed counts
+    """
+    from api.models import LineItem
+
+    rows = parse_line_items(purchase_request.extracted_items)
+    unmatched = list(purchase_request.line_items.all())
+
+    def take(row, exact):
+        for index, item in enumerate(unmatched):
+            if item.normalized_name != row['normalized_name']:
+                continue
+            if exact and (item.quantity, item.unit_price) != (row['quantity'], row['unit_price']):
+                continue
+            return unmatched.pop(index)
+        return None
+
+    # Exact matches first, so a changed duplicate name cannot steal an unchanged row
+    matches = {}
+    for exact in (True, False):
+        for index, row in enumerate(rows):
+            if index not in matches:
+                item = take(row, exact)
+                if item is not None:
+                    matches[index] = item
+
+    added = []
+    changed = []
+    moved = []
+    for index, row in enumerate(rows):
+        item = matches.get(index)
+        if item is None:
+            added.append(LineItem(request=purchase_request, **row))
+        elif any(getattr(item, field) != row[field] for field in LINE_ITEM_FIELDS):
+            for field in LINE_ITEM_FIELDS + ['position']:
+                setattr(item, field, row[field])
+            changed.append(item)
+        elif item.position != row['position']:
+            item.position = row['position']
+            moved.append(item)
+
+    # Whatever was not matched by a new row is gone
+    if unmatched:
+        LineItem.objects.filter(id__in=[item.id for item in unmatched]).delete()
+    if changed:
+        LineItem.objects.bulk_update(changed, LINE_ITEM_FIELDS + ['position'])
+    if moved:
+        LineItem.objects.bulk_update(moved, ['position'])
+    if added:
+        LineItem.objects.bulk_create(added)
+
+    return {'added': len(added), 'changed': len(changed), 'moved': len(moved), 'removed': len(unmatched)}
@@ -0,0 +1,305 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast API reads up to slow OCR / LLM calls
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name: (type, help, buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'API request latency by view and action', DURATION_BUCKETS),
+    'document_extraction_seconds': ('histogram', 'Proforma/receipt text extraction time by file type', DURATION_BUCKETS),
+    'ocr_seconds': ('histogram', 'Tesseract OCR time by file type', DURATION_BUCKETS),
+    'purchase_order_render_seconds': ('histogram', 'Purchase order PDF render time', DURATION_BUCKETS),
+    'extraction_truncated_total': ('counter', 'Documents only partly extracted, by exceeded budget (pages/pixels/time/memory)', None),
+    'llm_request_seconds': ('histogram', 'OpenAI request latency by operation', DURATION_BUCKETS),
+    'llm_errors_total': ('counter', 'OpenAI requests that failed and fell back', None),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result (hit/miss)', None),
+    'background_jobs_failed_total': ('counter', 'Background jobs that raised', None),
+    'background_queue_depth': ('gauge', 'Background jobs queued or running', None),
+    'document_service_job_seconds': ('histogram', 'Document service job time by job', DURATION_BUCKETS),
+    'document_service_jobs_total': ('counter', 'Document service jobs by job and result (ok/error/timeout/busy)', None),
+    'document_service_queue_depth': ('gauge', 'Document service jobs waiting for a free worker', None),
+}
+
+# How long recorded values may sit in memory before this process writes its file
+FLUSH_INTERVAL = 1.0
+
+# Counters and histograms of exited processes are folded into ARCHIVE_FILE at most
+# this often, so recycled workers do not leave an ever-growing number of files
+COMPACT_INTERVAL = 60.0
+ARCHIVE_FILE = 'archive.json'
+
+_lock = threading.Lock()
+_values = {}
+_pid = None
+_started = None
+_flush_timer = None
+_last_compact = 0.0
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f'Unknown metric: {name}')
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _check_fork():
+    # A forked worker must not re-export the values it inherited from its parent
+    global _pid, _started, _flush_timer
+    if _pid != os.getpid():
+        _values.clear()
+        _pid = os.getpid()
+        _started = time.time()
+        _flush_timer = None
+
+def _schedule_flush():
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(FLUSH_INTERVAL, flush)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+def inc(name, amount=1, **labels):
+    """Increment a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _check_fork()
+        _values[key] = _values.get(key, 0) + amount
+        _schedule_flush()
+
+def set_gauge(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _check_fork()
+        _values[key] = value
+        _schedule_flush()
+
+def observe(name, value, **labels):
+    """Record one histogram observation"""
+    key = _key(name, labels)
+    buckets = METRICS[name][2]
+    with _lock:
+        _check_fork()
+        state = _values.get(key)
+        if state is None:
+            state = _values[key] = [[0] * len(buckets), 0.0, 0]
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                state[0][index] += 1
+                break
+        state[1] += value
+        state[2] += 1
+        _schedule_flush()
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the wall time of a block in a histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def metrics_dir():
+    return settings.METRICS_DIR
+
+def flush():
+    """
+    Write this process's values to its own file in METRICS_DIR
+    One file per process means workers never contend; the endpoint sums them
+    """
+    global _flush_timer
+    with _lock:
+        _check_fork()
+        _flush_timer = None
+        snapshot = {
+            'pid': _pid,
+            'values': [[name, dict(labels), value] for (name, labels), value in _values.items()],
+        }
+        filename = f'{_pid}-{int(_started)}.json'
+
+    directory = metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as handle:
+        json.dump(snapshot, handle)
+    os.replace(temporary, path)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _merge(merged, name, labels, value):
+    key = (name, tuple(sorted(labels.items())))
+    if METRICS[name][0] == 'histogram':
+        state = merged.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+        state[0] = [a + b for a, b in zip(state[0], value[0])]
+        state[1] += value[1]
+        state[2] += value[2]
+    else:
+        merged[key] = merged.get(key, 0) + value
+
+def _read(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def _archive_lock(directory, mode):
+    """flock on a lock file next to the metrics files, shared by every process"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'archive.lock'), 'a') as lock:
+        fcntl.flock(lock, mode)
+        yield
+
+def compact():
+    """
+    Fold the counter and histogram values of exited processes into ARCHIVE_FILE and
+    delete their files (gauges of exited processes are dropped anyway)
+    The archive lists the files it already contains, so a crash between writing it
+    and deleting them cannot count anything twice
+    Returns: number of files folded
+    """
+    directory = metrics_dir()
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+
+    with _archive_lock(directory, fcntl.LOCK_EX):
+        archive = _read(archive_path) or {'pid': None, 'values': [], 'files': []}
+        folded = set(archive['files'])
+        merged = {}
+        for name, labels, value in archive['values']:
+            if name in METRICS:
+                _merge(merged, name, labels, value)
+
+        dead = []
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            filename = os.path.basename(path)
+            if filename == ARCHIVE_FILE or filename in folded:
+                continue
+            snapshot = _read(path)
+            if snapshot is None or _pid_alive(snapshot['pid']):
+                continue
+            for name, labels, value in snapshot['values']:
+                if name in METRICS and METRICS[name][0] != 'gauge':
+                    _merge(merged, name, labels, value)
+            dead.append(filename)
+
+        # Names of files already deleted no longer need to be remembered
+        leftover = [filename for filename in folded if os.path.exists(os.path.join(directory, filename))]
+        if dead or len(leftover) != len(folded):
+            archive = {
+                'pid': None,
+                'values': [[name, dict(labels), value] for (name, labels), value in merged.items()],
+                'files': leftover + dead,
+            }
+            temporary = f'{archive_path}.tmp'
+            with open(temporary, 'w') as handle:
+                json.dump(archive, handle)
+            os.replace(temporary, archive_path)
+
+        for filename in leftover + dead:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+
+    return len(dead)
+
+def collect():
+    """
+    Merge the files of all processes
+    Counters and histograms from exited workers are kept so totals stay monotonic
+    (folded into ARCHIVE_FILE every COMPACT_INTERVAL); gauges only count processes
+    that are still running
+    Returns: dict of (name, labels) -> value
+    """
+    global _last_compact
+    flush()
+
+    if time.time() - _last_compact >= COMPACT_INTERVAL:
+        _last_compact = time.time()
+        try:
+            compact()
+        except OSError:
+            logger.exception('Error compacting metrics files')
+
+    directory = metrics_dir()
+    merged = {}
+    # Shared lock: compaction must not move values between files mid-read, or a
+    # counter could briefly drop and look like a reset
+    with _archive_lock(directory, fcntl.LOCK_SH):
+        archive = _read(os.path.join(directory, ARCHIVE_FILE)) or {'values': [], 'files': []}
+        folded = set(archive['files'])
+        for name, labels, value in archive['values']:
+            if name in METRICS:
+                _merge(merged, name, labels, value)
+
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            filename = os.path.basename(path)
+            if filename == ARCHIVE_FILE or filename in folded:
+                continue
+            snapshot = _read(path)
+            if snapshot is None:
+                continue
+
+            alive = None
+            for name, labels, value in snapshot['values']:
+                if name not in METRICS:
+                    continue
+                if METRICS[name][0] == 'gauge':
+                    if alive is None:
+                        alive = _pid_alive(snapshot['pid'])
+                    if not alive:
+                        continue
+                _merge(merged, name, labels, value)
+    return merged
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render():
+    """Prometheus text exposition (format 0.0.4) of all processes' metrics"""
+    merged = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in merged.items() if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", str(bound))])} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+    return '\n'.join(lines) + '\n'
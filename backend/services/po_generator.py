@@ -7,10 +7,14 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.units import inch
 import io
+from services.tracing import traced
 
-def generate_purchase_order(purchase_request):
+@traced('generate_purchase_order', 'purchase_order_render_seconds')
+def generate_purchase_order(purchase_request, approvals=None):
     """
     Generate a Purchase Order PDF for an approved purchase request
+    approvals: optional approved Approval objects (with approver loaded) in level order;
+    read from the database when omitted
     Returns: ContentFile object to save to FileField
     """
     buffer = io.BytesIO()
@@ -121,7 +125,8 @@ def generate_purchase_order(purchase_request):
     story.append(approval_title)
     story.append(Spacer(1, 0.1 * inch))
     
-    approvals = purchase_request.approvals.filter(action='approved').order_by('level')
+    if approvals is None:
+        approvals = purchase_request.approvals.filter(action='approved').order_by('level')
     for approval in approvals:
         approval_text = f"Level {approval.level}: {approval.approver.get_full_name() or approval.approver.username} - {approval.created_at.strftime('%Y-%m-%d %H:%M')}"
         approval_para = Paragraph(approval_text, styles['Normal'])
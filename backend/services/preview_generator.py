@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+# pypdfium2 and PIL are imported where they are used, so manifest lookups
+# (served by every API worker) don't load the rendering libraries
+
+THUMBNAIL_WIDTH = 320
+PAGE_WIDTH = 800
+WEBP_QUALITY = 70
+
+MANIFEST_NAME = 'manifest.json'
+
+def preview_dir(digest):
+    """Directory holding the previews of one content hash"""
+    return os.path.join(settings.MEDIA_ROOT, 'previews', digest[:2], digest)
+
+def load_manifest(digest):
+    """Return the preview manifest for a content hash, or None if not rendered yet"""
+    try:
+        with open(os.path.join(preview_dir(digest), MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _save_webp(image, path, width):
+    from PIL import Image
+
+    image = image.convert('RGB')
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    image.save(path, 'WEBP', quality=WEBP_QUALITY, method=4)
+
+def _render_pdf_pages(file_path, max_pages):
+    """
+    Yield PIL images of the first max_pages pages, rendered at roughly PAGE_WIDTH
+    Pages with an extreme aspect ratio are rendered smaller to stay within EXTRACTION_MAX_PIXELS
+    """
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        for index in range(min(len(pdf), max_pages)):
+            page = pdf[index]
+            try:
+                width, height = max(page.get_width(), 1), max(page.get_height(), 1)
+                scale = min(PAGE_WIDTH / width, (settings.EXTRACTION_MAX_PIXELS / (width * height)) ** 0.5)
+                yield page.render(scale=scale).to_pil()
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+
+def generate_previews(digest, file_path):
+    """
+    Render a first-page thumbnail and low-resolution page previews (WebP) for a document
+    Output is keyed by content hash, so identical documents are rendered once
+    Returns: manifest dict with page_count
+    """
+    existing = load_manifest(digest)
+    if existing is not None:
+        return existing
+
+    file_extension = os.path.splitext(file_path)[1].lower()
+    max_pages = settings.PREVIEW_MAX_PAGES
+
+    if file_extension == '.pdf':
+        pages = _render_pdf_pages(file_path, max_pages)
+    elif file_extension in ['.jpg', '.jpeg', '.png']:
+        from PIL import Image
+        image = Image.open(file_path)
+        # Previews are at most PAGE_WIDTH wide, so decode no more than the pixel budget
+        if image.width * image.height > settings.EXTRACTION_MAX_PIXELS:
+            scale = (settings.EXTRACTION_MAX_PIXELS / (image.width * image.height)) ** 0.5
+            image.thumbnail((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+        pages = iter([image])
+    else:
+        return None
+
+    target = preview_dir(digest)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    # Render into a scratch directory and rename, so readers never see half a preview set
+    scratch = tempfile.mkdtemp(dir=os.path.dirname(target))
+    try:
+        page_count = 0
+        for page_count, image in enumerate(pages, start=1):
+            if page_count == 1:
+                _save_webp(image, os.path.join(scratch, 'thumb.webp'), THUMBNAIL_WIDTH)
+            _save_webp(image, os.path.join(scratch, f'page-{page_count}.webp'), PAGE_WIDTH)
+
+        manifest = {'page_count': page_count}
+        with open(os.path.join(scratch, MANIFEST_NAME), 'w') as handle:
+            json.dump(manifest, handle)
+
+        try:
+            os.rename(scratch, target)
+        except OSError:
+            # Another worker finished the same document first
+            shutil.rmtree(scratch, ignore_errors=True)
+        return manifest
+    except Exception:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
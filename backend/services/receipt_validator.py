@@ -1,22 +1,27 @@
 import os
-import pdfplumber
-import pytesseract
-from PIL import Image
 from decouple import config
+from services import metrics
+from services.extraction_budget import ExtractionBudget, extract_pdf_text, ocr_image
+from services.tracing import span, traced
 
-def validate_receipt(receipt_path, purchase_request):
+@traced('validate_receipt')
+def validate_receipt(receipt_path, purchase_request, stream=None):
     """
     Validate receipt against Purchase Order
-    Returns: dict with is_valid, errors list
+    stream: optional open file/memory map of the receipt, used instead of reopening receipt_path
+    Returns: dict with is_valid, errors list, the extracted text and truncated/truncated_reason
+    (set when the receipt ran past its extraction budget and was only partly read)
     """
     result = {
         'is_valid': True,
         'errors': []
     }
+    receipt_text = ''
+    budget = ExtractionBudget()
     
     try:
         # Extract text from receipt
-        receipt_text = extract_receipt_text(receipt_path)
+        receipt_text = extract_receipt_text(receipt_path, stream, budget)
         
         # Get expected data from PO
         expected_vendor = purchase_request.vendor_name
@@ -60,21 +65,23 @@ def validate_receipt(receipt_path, purchase_request):
         result['is_valid'] = False
         result['errors'].append(f"Validation error: {str(e)}")
     
+    result['text'] = receipt_text
+    result.update(budget.as_dict())
     return result
 
-def extract_receipt_text(file_path):
-    """Extract text from receipt (PDF or image)"""
+def extract_receipt_text(file_path, stream=None, budget=None):
+    """Extract text from receipt (PDF or image), within budget"""
     file_extension = os.path.splitext(file_path)[1].lower()
+    file_type = file_extension.lstrip('.') or 'unknown'
     text = ''
+    budget = budget or ExtractionBudget()
     
     try:
-        if file_extension == '.pdf':
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() or ''
-        elif file_extension in ['.jpg', '.jpeg', '.png']:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
+        with span('extract_receipt_text', 'document_extraction_seconds', kind='receipt', file_type=file_type):
+            if file_extension == '.pdf':
+                text = extract_pdf_text(stream or file_path, budget)
+            elif file_extension in ['.jpg', '.jpeg', '.png']:
+                text = ocr_image(stream or file_path, file_type, budget)
     except Exception as e:
         print(f"Error extracting receipt text: {e}")
     
@@ -102,6 +109,7 @@ def extract_amount_from_receipt(text):
     
     return None
 
+@traced('llm_validate', 'llm_request_seconds', operation='validate')
 def validate_with_openai(receipt_text, purchase_request):
     """Use OpenAI for detailed receipt validation"""
     try:
@@ -151,4 +159,5 @@ def validate_with_openai(receipt_text, purchase_request):
         
     except Exception as e:
         print(f"OpenAI validation error: {e}")
+        metrics.inc('llm_errors_total', operation='validate')
         return None
\ No newline at end of file
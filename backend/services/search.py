@@ -0,0 +1,70 @@
+from django.db import connection
+from django.db.models import Q
+
+SEARCH_CONFIG = 'english'
+
+# Fields searched on databases without full-text support (SQLite)
+FALLBACK_FIELDS = ['title', 'description', 'vendor_name', 'extracted_text', 'created_by__username']
+
+def _use_full_text():
+    return connection.vendor == 'postgresql'
+
+def build_search_vector():
+    """Weighted search document: title/vendor rank above description and document text"""
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('vendor_name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('description', weight='B', config=SEARCH_CONFIG) +
+        SearchVector('extracted_text', weight='C', config=SEARCH_CONFIG)
+    )
+
+def update_search_vector(purchase_request_ids):
+    """Recompute the stored search document for the given request ids"""
+    from api.models import PurchaseRequest
+
+    if not _use_full_text():
+        return 0
+
+    if not isinstance(purchase_request_ids, (list, tuple, set)):
+        purchase_request_ids = [purchase_request_ids]
+
+    return PurchaseRequest.objects.filter(id__in=purchase_request_ids).update(
+        search_vector=build_search_vector()
+    )
+
+def search_requests(queryset, query):
+    """
+    Filter a (role-scoped) PurchaseRequest queryset by a free-text query
+    Requests whose requester's username contains the query match as well
+    Results are ordered by relevance, newest first on ties
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    if _use_full_text():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        from api.models import User
+
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        # Usernames are matched through a subquery on the requester id rather than a
+        # join, so both sides of the OR stay on indexed purchase_requests columns
+        requesters = User.objects.filter(username__icontains=query).values('id')
+        return (
+            queryset
+            .filter(Q(search_vector=search_query) | Q(created_by__in=requesters))
+            .annotate(rank=SearchRank('search_vector', search_query))
+            .order_by('-rank', '-created_at')
+        )
+
+    # Fallback: every term must appear in at least one searched field
+    for term in query.split():
+        term_filter = Q()
+        for field in FALLBACK_FIELDS:
+            term_filter |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(term_filter)
+
+    return queryset
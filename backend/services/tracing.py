@@ -0,0 +1,84 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from services import metrics
+
+# Trace of the HTTP request being handled, or None when it was not sampled
+_current_trace = ContextVar('current_trace', default=None)
+
+class Trace:
+    """Timing breakdown of one request: spans by name plus database totals"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.db_queries = 0
+        self.db_time = 0.0
+
+    def add_span(self, name, duration):
+        total, count = self.spans.get(name, (0.0, 0))
+        self.spans[name] = (total + duration, count + 1)
+
+    def add_query(self, duration):
+        self.db_queries += 1
+        self.db_time += duration
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+def start_trace():
+    """Begin tracing the current context; returns a token for end_trace()"""
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+def current_trace():
+    return _current_trace.get()
+
+@contextmanager
+def span(name, metric=None, **labels):
+    """
+    Time a block and attribute it to name in the current trace
+    With metric, the duration is also observed in that histogram (labelled with labels)
+    on every request, sampled or not
+    """
+    trace = _current_trace.get()
+    if trace is None and metric is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        if trace is not None:
+            trace.add_span(name, duration)
+        if metric is not None:
+            metrics.observe(metric, duration, **labels)
+
+def traced(name, metric=None, **labels):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, metric, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def query_timer(execute, sql, params, many, context):
+    """connection.execute_wrapper hook counting and timing every query"""
+    trace = _current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.add_query(time.perf_counter() - started)
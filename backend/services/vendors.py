@@ -0,0 +1,157 @@
+import re
+from django.db import IntegrityError, connection, transaction
+
+MAX_NAME_LENGTH = 255
+
+# Minimum trigram similarity for an extracted name to join an existing vendor
+MATCH_THRESHOLD = 0.6
+
+# Candidate rows scanned by the pure-Python fallback (SQLite)
+FALLBACK_SCAN_LIMIT = 5000
+
+LEGAL_SUFFIXES = {
+    'co', 'company', 'corp', 'corporation', 'inc', 'incorporated',
+    'limited', 'llc', 'ltd', 'plc', 'sarl', 'gmbh',
+}
+
+def normalize_vendor_name(name):
+    """
+    Normalize a vendor name for alias lookups
+    Lowercases, drops punctuation and trailing legal suffixes (Ltd, Inc, ...)
+    """
+    words = re.sub(r'[^\w\s]', ' ', str(name or '').lower()).split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)[:MAX_NAME_LENGTH]
+
+def _trigrams(text):
+    """Trigram set computed the same way as pg_trgm"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def trigram_similarity(a, b):
+    """Pure-Python equivalent of pg_trgm similarity()"""
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+def _use_trigram_index():
+    return connection.vendor == 'postgresql'
+
+def find_similar_aliases(query, limit=10, threshold=0.3):
+    """
+    Find aliases similar to query, best match first
+    Returns: list of (VendorAlias, similarity) tuples
+    """
+    from api.models import VendorAlias
+
+    normalized = normalize_vendor_name(query)
+    if not normalized:
+        return []
+
+    aliases = VendorAlias.objects.select_related('vendor')
+
+    if _use_trigram_index():
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        # The % operator is answered from the GIN trigram index
+        matches = (
+            aliases
+            .filter(normalized_alias__trigram_similar=normalized)
+            .annotate(similarity=TrigramSimilarity('normalized_alias', normalized))
+            .filter(similarity__gte=threshold)
+            .order_by('-similarity', 'normalized_alias')[:limit]
+        )
+        return [(alias, alias.similarity) for alias in matches]
+
+    # Fallback: score aliases sharing the first word prefix in Python
+    prefix = normalized.split()[0][:3]
+    scored = []
+    for alias in aliases.filter(normalized_alias__contains=prefix)[:FALLBACK_SCAN_LIMIT]:
+        similarity = trigram_similarity(alias.normalized_alias, normalized)
+        if similarity >= threshold:
+            scored.append((alias, similarity))
+
+    scored.sort(key=lambda match: (-match[1], match[0].normalized_alias))
+    return scored[:limit]
+
+def resolve_vendor(name):
+    """
+    Resolve an extracted vendor name to a Vendor, creating one if needed
+    Returns: Vendor instance or None for blank names
+    """
+    from api.models import Vendor, VendorAlias
+
+    normalized = normalize_vendor_name(name)
+    if not normalized:
+        return None
+
+    display_name = str(name).strip()[:MAX_NAME_LENGTH]
+
+    # Exact alias hit: a single unique-index lookup
+    alias = VendorAlias.objects.select_related('vendor').filter(normalized_alias=normalized).first()
+    if alias:
+        return alias.vendor
+
+    # Near match: remember the spelling as a new alias of that vendor
+    matches = find_similar_aliases(normalized, limit=1, threshold=MATCH_THRESHOLD)
+    if matches:
+        vendor = matches[0][0].vendor
+    else:
+        vendor, _ = Vendor.objects.get_or_create(
+            normalized_name=normalized,
+            defaults={'name': display_name}
+        )
+
+    try:
+        with transaction.atomic():
+            VendorAlias.objects.create(vendor=vendor, alias=display_name, normalized_alias=normalized)
+    except IntegrityError:
+        # Another worker registered the same spelling first
+        return VendorAlias.objects.select_related('vendor').get(normalized_alias=normalized).vendor
+
+    return vendor
+
+def search_vendors(query, limit=10):
+    """
+    Autocomplete vendors by canonical name or any known alias
+    Prefix matches come first, then trigram matches by similarity
+    Returns: list of dicts with id, name, matched_alias, similarity
+    """
+    from api.models import VendorAlias
+
+    normalized = normalize_vendor_name(query)
+    if not normalized:
+        return []
+
+    prefix_matches = (
+        VendorAlias.objects
+        .select_related('vendor')
+        .filter(normalized_alias__startswith=normalized)
+        .order_by('normalized_alias')[:limit * 3]
+    )
+    candidates = [
+        (alias, trigram_similarity(alias.normalized_alias, normalized))
+        for alias in prefix_matches
+    ]
+    candidates.extend(find_similar_aliases(normalized, limit=limit * 3))
+
+    # Several aliases can point at the same vendor; keep the first (best) one
+    results = {}
+    for alias, similarity in candidates:
+        if alias.vendor_id in results:
+            continue
+        results[alias.vendor_id] = {
+            'id': alias.vendor_id,
+            'name': alias.vendor.name,
+            'matched_alias': alias.alias,
+            'similarity': round(similarity, 3),
+        }
+        if len(results) == limit:
+            break
+
+    return list(results.values())
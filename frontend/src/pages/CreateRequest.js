@@ -1,6 +1,6 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { requestsAPI } from '../services/api';
+import { newIdempotencyKey, requestsAPI } from '../services/api';
 import Header from '../components/common/Header';
 import { FormSkeleton } from '../components/common/Skeleton';
 import { toast } from 'react-toastify';
@@ -16,15 +16,19 @@ const CreateRequest = () => {
   const [loading, setLoading] = useState(false);
   const [initialLoading, setInitialLoading] = useState(false);
   const [error, setError] = useState('');
+  // Re-submitting unchanged data (e.g. after a network error) reuses the key
+  const idempotencyKey = useRef(newIdempotencyKey());
   const navigate = useNavigate();
 
   const handleChange = (e) => {
     const { name, value } = e.target;
     setFormData((prev) => ({ ...prev, [name]: value }));
+    idempotencyKey.current = newIdempotencyKey();
   };
 
   const handleFileChange = (e) => {
     setFormData((prev) => ({ ...prev, proforma: e.target.files[0] }));
+    idempotencyKey.current = newIdempotencyKey();
   };
 
   const handleSubmit = async (e) => {
@@ -32,7 +36,7 @@ const CreateRequest = () => {
     setError('');
     setLoading(true);
     try {
-      await requestsAPI.create(formData);
+      await requestsAPI.create(formData, idempotencyKey.current);
       toast.success('Request created successfully!');
       navigate('/dashboard');
     } catch (err) {
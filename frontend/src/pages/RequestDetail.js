@@ -1,6 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { requestsAPI } from '../services/api';
+import { newIdempotencyKey, requestsAPI } from '../services/api';
 import { useAuth } from '../context/AuthContext';
 import Header from '../components/common/Header';
 import { RequestDetailSkeleton } from '../components/common/Skeleton';
@@ -17,6 +17,7 @@ const RequestDetail = () => {
   const [actionLoading, setActionLoading] = useState(false);
   const [comments, setComments] = useState('');
   const [receiptFile, setReceiptFile] = useState(null);
+  const receiptIdempotencyKey = useRef(newIdempotencyKey());
   const [showApprovalModal, setShowApprovalModal] = useState(false);
   const [approvalAction, setApprovalAction] = useState(null);
 
@@ -73,7 +74,7 @@ const RequestDetail = () => {
     }
     setActionLoading(true);
     try {
-      await requestsAPI.submitReceipt(id, receiptFile);
+      await requestsAPI.submitReceipt(id, receiptFile, receiptIdempotencyKey.current);
       setReceiptFile(null);
       fetchRequest();
       toast.success('Receipt uploaded successfully!');
@@ -174,17 +175,32 @@ const RequestDetail = () => {
                 <div className="space-y-2">
                   {request.proforma && (
                     <a href={request.proforma} target="_blank" rel="noopener noreferrer" className="flex items-center gap-2 px-4 py-2 text-sm text-[#5B4002] dark:text-[#c9a227] hover:bg-gray-50 dark:hover:bg-gray-800 rounded-lg transition font-medium">
-                      <span>📄</span><span>View Proforma Invoice</span>
+                      {request.previews?.proforma ? (
+                        <img src={request.previews.proforma.thumbnail} alt="" loading="lazy" className="w-8 h-10 object-cover rounded border border-gray-200 dark:border-gray-700" onError={(e) => { e.currentTarget.style.display = 'none'; }} />
+                      ) : (
+                        <span>📄</span>
+                      )}
+                      <span>View Proforma Invoice</span>
                     </a>
                   )}
                   {request.purchase_order && (
                     <a href={request.purchase_order} target="_blank" rel="noopener noreferrer" className="flex items-center gap-2 px-4 py-2 text-sm text-[#5B4002] dark:text-[#c9a227] hover:bg-gray-50 dark:hover:bg-gray-800 rounded-lg transition font-medium">
-                      <span>📋</span><span>Download Purchase Order</span>
+                      {request.previews?.purchase_order ? (
+                        <img src={request.previews.purchase_order.thumbnail} alt="" loading="lazy" className="w-8 h-10 object-cover rounded border border-gray-200 dark:border-gray-700" onError={(e) => { e.currentTarget.style.display = 'none'; }} />
+                      ) : (
+                        <span>📋</span>
+                      )}
+                      <span>Download Purchase Order</span>
                     </a>
                   )}
                   {request.receipt && (
                     <a href={request.receipt} target="_blank" rel="noopener noreferrer" className="flex items-center gap-2 px-4 py-2 text-sm text-[#5B4002] dark:text-[#c9a227] hover:bg-gray-50 dark:hover:bg-gray-800 rounded-lg transition font-medium">
-                      <span>🧾</span><span>View Receipt</span>
+                      {request.previews?.receipt ? (
+                        <img src={request.previews.receipt.thumbnail} alt="" loading="lazy" className="w-8 h-10 object-cover rounded border border-gray-200 dark:border-gray-700" onError={(e) => { e.currentTarget.style.display = 'none'; }} />
+                      ) : (
+                        <span>🧾</span>
+                      )}
+                      <span>View Receipt</span>
                     </a>
                   )}
                   {!request.proforma && !request.purchase_order && !request.receipt && (
@@ -253,7 +269,10 @@ const RequestDetail = () => {
                 <form onSubmit={handleReceiptUpload} className="space-y-4">
                   <div>
                     <label className="block text-sm font-medium text-gray-700 dark:text-gray-300 mb-2">Select receipt file</label>
-                    <input type="file" onChange={(e) => setReceiptFile(e.target.files[0])} accept=".pdf,.jpg,.jpeg,.png"
+                    <input type="file" onChange={(e) => {
+                      setReceiptFile(e.target.files[0]);
+                      receiptIdempotencyKey.current = newIdempotencyKey();
+                    }} accept=".pdf,.jpg,.jpeg,.png"
                       className="block w-full text-sm text-gray-500 dark:text-gray-400 file:mr-4 file:py-2 file:px-4 file:rounded-lg file:border-0 file:text-sm file:font-semibold file:bg-[#5B4002] file:text-white hover:file:bg-[#4a3302] file:cursor-pointer" />
                     <p className="mt-2 text-xs text-gray-500 dark:text-gray-400">PDF, JPG, JPEG, or PNG (Max 10MB)</p>
                   </div>
@@ -10,17 +10,26 @@ const Requests = () => {
   const [loading, setLoading] = useState(true);
   const [filter, setFilter] = useState('all');
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchQuery, setSearchQuery] = useState('');
   const navigate = useNavigate();
   const { user } = useAuth();
 
+  // Debounce typing before hitting the server-side search
+  useEffect(() => {
+    const timer = setTimeout(() => setSearchQuery(searchTerm.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
   useEffect(() => {
     fetchRequests();
-  }, [filter]);
+  }, [filter, searchQuery]);
 
   const fetchRequests = async () => {
     setLoading(true);
     try {
-      const params = filter !== 'all' ? { status: filter } : {};
+      const params = {};
+      if (filter !== 'all') params.status = filter;
+      if (searchQuery) params.q = searchQuery;
       const response = await requestsAPI.getAll(params);
       setRequests(response.data.results.data || []);
     } catch (error) {
@@ -30,11 +39,6 @@ const Requests = () => {
     setLoading(false);
   };
 
-  const filteredRequests = requests.filter((request) =>
-    request.title?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    request.created_by?.username?.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
   const getStats = () => {
     return {
       total: requests.length,
@@ -201,7 +205,7 @@ const Requests = () => {
         {/* Requests List */}
         {loading ? (
           <TableSkeleton />
-        ) : filteredRequests.length === 0 ? (
+        ) : requests.length === 0 ? (
           <div className="bg-gray-50 dark:bg-[#1e2936] rounded-lg shadow-sm p-12 text-center border border-gray-200 dark:border-gray-700">
             <svg className="mx-auto h-12 w-12 text-gray-400 dark:text-gray-600 mb-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
               <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z" />
@@ -224,7 +228,7 @@ const Requests = () => {
                   </tr>
                 </thead>
                 <tbody className="divide-y divide-gray-200 dark:divide-gray-700 bg-white dark:bg-transparent">
-                  {filteredRequests.map((request) => (
+                  {requests.map((request) => (
                     <tr key={request.id} className="hover:bg-gray-50 dark:hover:bg-[#364A5E]/30 transition">
                       <td className="px-6 py-4">
                         <div className="text-sm font-medium text-gray-900 dark:text-white">{request.title}</div>
@@ -267,7 +271,7 @@ const Requests = () => {
 
             {/* Mobile Cards */}
             <div className="md:hidden divide-y divide-gray-200 dark:divide-gray-700">
-              {filteredRequests.map((request) => (
+              {requests.map((request) => (
                 <div key={request.id} className="p-4 hover:bg-gray-50 dark:hover:bg-[#364A5E]/30 bg-white dark:bg-transparent">
                   <div className="flex justify-between items-start mb-2">
                     <h3 className="text-sm font-semibold text-gray-900 dark:text-white">{request.title}</h3>
@@ -62,10 +62,17 @@ export const authAPI = {
 };
 
 
+// One key per logical submission: retries of the same submission reuse it so the
+// server replays its first response instead of creating duplicates
+export const newIdempotencyKey = () =>
+  (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 export const requestsAPI = {
   getAll: (params) => api.get('/requests/', { params }),
   getById: (id) => api.get(`/requests/${id}/`),
-  create: (data) => {
+  create: (data, idempotencyKey = newIdempotencyKey()) => {
     const formData = new FormData();
     Object.keys(data).forEach(key => {
       if (data[key] !== null && data[key] !== undefined) {
@@ -73,17 +80,17 @@ export const requestsAPI = {
       }
     });
     return api.post('/requests/', formData, {
-      headers: { 'Content-Type': 'multipart/form-data' },
+      headers: { 'Content-Type': 'multipart/form-data', 'Idempotency-Key': idempotencyKey },
     });
   },
   update: (id, data) => api.put(`/requests/${id}/`, data),
   approve: (id, comments) => api.patch(`/requests/${id}/approve/`, { comments }),
   reject: (id, comments) => api.patch(`/requests/${id}/reject/`, { comments }),
-  submitReceipt: (id, receiptFile) => {
+  submitReceipt: (id, receiptFile, idempotencyKey = newIdempotencyKey()) => {
     const formData = new FormData();
     formData.append('receipt', receiptFile);
     return api.post(`/requests/${id}/submit_receipt/`, formData, {
-      headers: { 'Content-Type': 'multipart/form-data' },
+      headers: { 'Content-Type': 'multipart/form-data', 'Idempotency-Key': idempotencyKey },
     });
   },
 };